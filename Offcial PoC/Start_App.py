@@ -1,130 +1,90 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import sqlite3
-import subprocess
-import sys
+
+import auth
+from admin_app import AdminDashboard
+from database import get_connection
+from provider_app import ProviderApp
+from senior_app import SeniorApp
 
 # -------------------------
 # Database Setup
 # -------------------------
-conn = sqlite3.connect("elderly_care.db")
-c = conn.cursor()
-
-# Create tables (schema)
-c.executescript("""
-CREATE TABLE IF NOT EXISTS seniors (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT NOT NULL,
-    age INTEGER,
-    email TEXT UNIQUE NOT NULL,
-    password TEXT NOT NULL
-);
-
-CREATE TABLE IF NOT EXISTS providers (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT NOT NULL,
-    age INTEGER,
-    service_type TEXT CHECK(service_type IN ('Nursing', 'Transportation', 'Food and Dinery', 'Companion')),
-    rating REAL DEFAULT 0,
-    email TEXT UNIQUE NOT NULL,
-    password TEXT NOT NULL
-);
-
-CREATE TABLE IF NOT EXISTS ratings (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    senior_id INTEGER,
-    provider_id INTEGER,
-    rating INTEGER CHECK(rating BETWEEN 1 AND 5),
-    FOREIGN KEY (senior_id) REFERENCES seniors(id),
-    FOREIGN KEY (provider_id) REFERENCES providers(id)
-);
-
-CREATE TABLE IF NOT EXISTS services (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    service_name TEXT NOT NULL,
-    provider_id INTEGER,
-    provider_overall_rating REAL DEFAULT 0,
-    service_description TEXT,
-    payment_amount REAL,
-    FOREIGN KEY (provider_id) REFERENCES providers(id)
-);
-
-CREATE TABLE IF NOT EXISTS bills (
-    bill_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    status TEXT CHECK(status IN ('Pending', 'Paid', 'Cancelled')),
-    senior_id INTEGER,
-    provider_id INTEGER,
-    amount REAL,
-    FOREIGN KEY (senior_id) REFERENCES seniors(id),
-    FOREIGN KEY (provider_id) REFERENCES providers(id)
-);
-
-CREATE TABLE IF NOT EXISTS admin (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    email TEXT UNIQUE NOT NULL,
-    password TEXT NOT NULL,
-    admin_key TEXT NOT NULL
-);
-                CREATE TABLE IF NOT EXISTS bookings (
-    booking_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    senior_id INTEGER NOT NULL,
-    service_id INTEGER NOT NULL,
-    day INTEGER NOT NULL CHECK(day BETWEEN 1 AND 31),
-    month INTEGER NOT NULL CHECK(month BETWEEN 1 AND 12),
-    year INTEGER NOT NULL,
-    FOREIGN KEY (senior_id) REFERENCES seniors(id),
-    FOREIGN KEY (service_id) REFERENCES services(id)
-);
-""")
-conn.commit()
+# Opening the shared connection also creates or upgrades the schema
+conn = get_connection()
 
 # -------------------------
 # Helper Functions
 # -------------------------
+def when_done(future, callback):
+    # Hashing runs on auth's worker threads; poll from the Tk loop so the
+    # window keeps responding while it works.
+    if future.done():
+        callback(future)
+    else:
+        root.after(20, when_done, future, callback)
+
 def signup_user(role, name, age, email, password, service_type=None, admin_key=None):
-    try:
-        if role == "Senior":
-            c.execute("INSERT INTO seniors (name, age, email, password) VALUES (?, ?, ?, ?)",
-                      (name, age, email, password))
-        elif role == "Provider":
-            c.execute("INSERT INTO providers (name, age, service_type, email, password) VALUES (?, ?, ?, ?, ?)",
-                      (name, age, service_type, email, password))
-        elif role == "Admin":
-            c.execute("INSERT INTO admin (email, password, admin_key) VALUES (?, ?, ?)",
-                      (email, password, admin_key))
-        else:
-            messagebox.showerror("Error", "Invalid user type!")
+    if role not in auth.ROLE_TABLES:
+        messagebox.showerror("Error", "Invalid user type!")
+        return
+
+    signup_button.config(state="disabled")
+
+    def finish(future):
+        # The hash and the insert both ran on auth's worker threads
+        signup_button.config(state="normal")
+        try:
+            future.result()
+        except sqlite3.IntegrityError:
+            messagebox.showerror("Error", "Email already exists!")
+            return
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
             return
-        conn.commit()
         messagebox.showinfo("Success", f"{role} registered successfully!")
-    except sqlite3.IntegrityError:
-        messagebox.showerror("Error", "Email already exists!")
+
+    when_done(auth.signup_async(role, name, age, email, password, service_type, admin_key), finish)
 
 def login_user(role, email, password):
+    if role not in auth.ROLE_TABLES:
+        messagebox.showerror("Error", "Invalid role selected!")
+        return
+
+    login_button.config(state="disabled")
+    login_status.config(text="Checking...")
+
+    def finish(future):
+        login_button.config(state="normal")
+        login_status.config(text="")
+        try:
+            user_id = future.result()
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+            return
+        if user_id is not None:
+            messagebox.showinfo("Login Success", f"Welcome, {role}!")
+            open_dashboard(role, user_id)
+        else:
+            messagebox.showerror("Login Failed", "Incorrect email or password.")
+
+    when_done(auth.login_async(role, email, password), finish)
+
+def open_dashboard(role, user_id):
+    # The dashboard replaces the login screen in this same window: no new
+    # interpreter, Tk instance or database connection, and the logged-in
+    # user's id is handed straight to the app.
+    for widget in root.winfo_children():
+        widget.destroy()
+
     if role == "Senior":
-        c.execute("SELECT * FROM seniors WHERE email=? AND password=?", (email, password))
+        SeniorApp(root, user_id)
     elif role == "Provider":
-        c.execute("SELECT * FROM providers WHERE email=? AND password=?", (email, password))
+        ProviderApp(root, user_id)
     elif role == "Admin":
-        c.execute("SELECT * FROM admin WHERE email=? AND password=?", (email, password))
-    else:
-        messagebox.showerror("Error", "Invalid role selected!")
-        return
+        AdminDashboard(root)
 
-    user = c.fetchone()
-    if user:
-        messagebox.showinfo("Login Success", f"Welcome, {role}!")
-        root.destroy()  # Close the main login/signup window
-
-        # Launch the corresponding app
-        if role == "Senior":
-            subprocess.Popen([sys.executable, "senior_app.py"])
-        elif role == "Provider":
-            subprocess.Popen([sys.executable, "provider_app.py"])
-        elif role == "Admin":
-            subprocess.Popen([sys.executable, "admin_app.py"])
-    else:
-        messagebox.showerror("Login Failed", "Incorrect email or password.")
 
 # -------------------------
 # Tkinter UI
@@ -157,9 +117,11 @@ tk.Label(login_frame, text="Password:").pack(pady=5)
 password_login = tk.Entry(login_frame, show="*")
 password_login.pack()
 
-tk.Button(login_frame, text="Login", width=20, command=lambda: 
-           login_user(role_var_login.get(), email_login.get(), password_login.get())
-          ).pack(pady=20)
+login_button = tk.Button(login_frame, text="Login", width=20, command=lambda:
+                         login_user(role_var_login.get(), email_login.get(), password_login.get()))
+login_button.pack(pady=20)
+login_status = tk.Label(login_frame, text="")
+login_status.pack()
 
 # -------------------------
 # Signup Tab
@@ -202,11 +164,11 @@ def update_fields(*args):
 
 role_var_signup.trace("w", update_fields)
 
-tk.Button(signup_frame, text="Signup", width=20, command=lambda:
-           signup_user(role_var_signup.get(), name_entry.get(), age_entry.get(),
-                       email_entry.get(), password_entry.get(),
-                       service_type_entry.get() if role_var_signup.get() == "Provider" else None,
-                       admin_key_entry.get() if role_var_signup.get() == "Admin" else None)
-          ).pack(pady=20)
+signup_button = tk.Button(signup_frame, text="Signup", width=20, command=lambda:
+                          signup_user(role_var_signup.get(), name_entry.get(), age_entry.get(),
+                                      email_entry.get(), password_entry.get(),
+                                      service_type_entry.get() if role_var_signup.get() == "Provider" else None,
+                                      admin_key_entry.get() if role_var_signup.get() == "Admin" else None))
+signup_button.pack(pady=20)
 
 root.mainloop()
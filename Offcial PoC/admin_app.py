@@ -1,28 +1,83 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
-import sqlite3
+from tkinter import ttk, messagebox, filedialog
+
+import analytics
+import bulk_import
+import tracing
+from database import DB_PATH, get_read_connection
+from executor import QueryExecutor
+from paging import KeysetPager, count_rows, fetch_page
+from writer import get_writer
+
+CHART_COLORS = ["#4e79a7", "#f28e2b", "#59a14f", "#e15759", "#b07aa1"]  # analytics chart, by service type
+KEY_COLUMNS = ("id", "bill_id", "booking_id")
+# Shown in the grids but never written from them: the migration 3 triggers
+# derive providers.rating from rating_sum / rating_count
+DERIVED_COLUMNS = {"providers": ("rating",)}
+# The grids sort and filter only where an index answers (see paging.py), so a
+# refresh reads one page off an index however large the table grows.
+# Sorting needs an index on the column alone; the primary key always sorts.
+SORTABLE_COLUMNS = {
+    "seniors": ("email",),
+    "providers": ("rating", "email"),
+    "services": ("provider_id", "payment_amount"),
+    "bookings": ("bill_id",),
+}
+FILTERABLE_COLUMNS = {
+    "seniors": ("id", "email"),
+    "providers": ("id", "service_type", "rating", "email"),
+    "services": ("id", "provider_id", "payment_amount"),
+    "ratings": ("id", "provider_id"),
+    "bills": ("bill_id", "senior_id"),
+    "bookings": ("booking_id", "senior_id", "service_id", "bill_id"),
+}
 
 # -------------------------
-# Database Connection
+# Worker Queries
 # -------------------------
-conn = sqlite3.connect("elderly_care.db")
-c = conn.cursor()
+# These run on the executor's threads, each with its own connection.
+def fetch_analytics(period, path=DB_PATH):
+    return analytics.report(get_read_connection(path), *analytics.period_range(period))
+
+
+def rebuild_analytics(path=DB_PATH):
+    get_writer(path).call(analytics.rebuild_rollups)
+
+
+def run_sql(conn, sql, params):
+    conn.execute(sql, params)
+
+
+def execute_write(sql, params, row_query=None, path=DB_PATH):
+    # Optionally re-reads one row after committing, for single-row refreshes
+    get_writer(path).call(run_sql, sql, params)
+    return get_read_connection(path).execute(*row_query).fetchone() if row_query else None
 
 
 # -------------------------
 # Admin Dashboard Class
 # -------------------------
 class AdminDashboard:
-    def __init__(self):
-        self.root = tk.Tk()
+    def __init__(self, root=None):
+        # Start_App.py passes in its window after login; run directly we own one
+        self.root = root or tk.Tk()
         self.root.title("Elderly Care Admin Dashboard")
         self.root.geometry("1100x600")
 
         ttk.Label(self.root, text="Admin Dashboard", font=("Arial", 20, "bold")).pack(pady=10)
+        status = ttk.Label(self.root, text="", anchor="w")
+        status.pack(side="bottom", fill="x")
+        self.executor = QueryExecutor(self.root, status)
 
-        notebook = ttk.Notebook(self.root)
+        self.notebook = notebook = ttk.Notebook(self.root)
         notebook.pack(expand=True, fill="both")
 
+        self.pagers = {}       # table name -> KeysetPager
+        self.tabs = {}         # tab widget name -> table name
+        self.views = {}        # table name -> (tree, title label)
+        self.loading = set()   # tables with a page request in flight
+        self.loaded = set()    # tables whose first page has been shown
+
         # Tabs for each table
         self.seniors_tab = ttk.Frame(notebook)
         self.providers_tab = ttk.Frame(notebook)
@@ -37,29 +92,123 @@ class AdminDashboard:
         notebook.add(self.ratings_tab, text="Ratings")
         notebook.add(self.bills_tab, text="Bills")
         notebook.add(self.bookings_tab, text="Bookings")
+        self.analytics_tab = ttk.Frame(notebook)
+        notebook.add(self.analytics_tab, text="Analytics")
+        self.diagnostics_tab = ttk.Frame(notebook)
+        notebook.add(self.diagnostics_tab, text="Diagnostics")
 
-        # Load CRUD for each table
-        self.create_crud_tab(self.seniors_tab, "seniors", ["id", "name", "age", "email", "password"])
-        self.create_crud_tab(self.providers_tab, "providers", ["id", "name", "age", "service_type", "rating", "email", "password"])
-        self.create_crud_tab(self.services_tab, "services", ["id", "service_name", "provider_id", "provider_overall_rating", "service_description", "payment_amount"])
+        # Build CRUD for each table; rows are loaded when a tab is first opened
+        self.create_crud_tab(self.seniors_tab, "seniors", ["id", "name", "age", "email", "password", "latitude", "longitude"])
+        self.create_crud_tab(self.providers_tab, "providers", ["id", "name", "age", "service_type", "rating", "email", "password", "daily_capacity",
+                                                             "latitude", "longitude", "service_radius_km"])
+        self.create_crud_tab(self.services_tab, "services", ["id", "service_name", "provider_id", "service_description", "payment_amount"])
         self.create_crud_tab(self.ratings_tab, "ratings", ["id", "senior_id", "provider_id", "rating"])
         self.create_crud_tab(self.bills_tab, "bills", ["bill_id", "status", "senior_id", "provider_id", "amount"])
-        self.create_crud_tab(self.bookings_tab, "bookings", ["booking_id", "senior_id", "service_id", "day", "month", "year"])
+        self.create_crud_tab(self.bookings_tab, "bookings", ["booking_id", "senior_id", "service_id", "day", "month", "year", "bill_id"])
+        self.create_analytics_tab(self.analytics_tab)
+        self.create_diagnostics_tab(self.diagnostics_tab)
+
+        notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+        self.root.after_idle(self.on_tab_changed)
 
-        self.root.mainloop()
+        if root is None:
+            self.root.mainloop()
+
+    # -------------------------
+    # Lazy Tab Loading
+    # -------------------------
+    def on_tab_changed(self, event=None):
+        if self.notebook.select() == str(self.diagnostics_tab):
+            self.refresh_diagnostics()
+            return
+        if self.notebook.select() == str(self.analytics_tab):
+            self.refresh_analytics()
+            return
+        table = self.tabs[self.notebook.select()]
+        if table not in self.loaded and table not in self.loading:
+            self.load_data(self.views[table][0], table)
+
+    def show_page(self, table, rows):
+        # Only the newest request per table gets here; pages from before a
+        # sort, filter or refresh are dropped by the executor.
+        self.loading.discard(table)
+        tree, title = self.views[table]
+        pager = self.pagers[table]
+        if pager.last_row is None:
+            tree.delete(*tree.get_children())
+            title.config(text=f"{table.capitalize()} Table")
+        pk_index = pager.columns.index(pager.pk)
+        for r in pager.accept(rows):
+            # A row edited between two pages can come back on the next one
+            if tree.exists(str(r[pk_index])):
+                tree.item(str(r[pk_index]), values=r)
+            else:
+                tree.insert("", tk.END, iid=str(r[pk_index]), values=r)
+        self.loaded.add(table)
+
+    def show_count(self, table):
+        _, title = self.views[table]
+        self.executor.run(count_rows, table, key=("count", table),
+                          on_done=lambda count: title.config(text=f"{table.capitalize()} Table ({count:,} rows)"),
+                          action=f"AdminDashboard.count_rows ({table})")
 
     # -------------------------
     # CRUD Table Generator
     # -------------------------
     def create_crud_tab(self, frame, table_name, columns):
-        label = ttk.Label(frame, text=f"{table_name.capitalize()} Table", font=("Arial", 14, "bold"))
+        label = ttk.Label(frame, text=f"{table_name.capitalize()} Table (not loaded)", font=("Arial", 14, "bold"))
         label.pack(pady=10)
 
-        tree = ttk.Treeview(frame, columns=columns, show="headings")
+        pk = next(col for col in KEY_COLUMNS if col in columns)
+        # Queries are built here but run on the executor's connections
+        self.pagers[table_name] = KeysetPager(None, table_name, columns, pk, SORTABLE_COLUMNS.get(table_name, ()),
+                                              FILTERABLE_COLUMNS[table_name])
+
+        # Filter bar: matching happens in SQL, not in the tree
+        filter_frame = tk.Frame(frame)
+        filter_frame.pack(pady=5)
+        ttk.Label(filter_frame, text="Filter:").grid(row=0, column=0, padx=5)
+        filter_col = ttk.Combobox(filter_frame, values=FILTERABLE_COLUMNS[table_name], state="readonly", width=18)
+        filter_col.set(FILTERABLE_COLUMNS[table_name][1])
+        filter_col.grid(row=0, column=1, padx=5)
+        filter_text = ttk.Entry(filter_frame)
+        filter_text.grid(row=0, column=2, padx=5)
+
+        table_frame = tk.Frame(frame)
+        table_frame.pack(expand=True, fill="both", pady=10)
+        tree = ttk.Treeview(table_frame, columns=columns, show="headings")
+        scrollbar = ttk.Scrollbar(table_frame, orient="vertical", command=tree.yview)
         for col in columns:
-            tree.heading(col, text=col)
+            if col in self.pagers[table_name].sortable:
+                tree.heading(col, text=col, command=lambda col=col: self.sort_by(tree, table_name, col))
+            else:
+                tree.heading(col, text=col)
             tree.column(col, width=120)
-        tree.pack(expand=True, fill="both", pady=10)
+        self.tabs[str(frame)] = table_name
+        self.views[table_name] = (tree, label)
+
+        # Fetch the next page once the user scrolls close to the bottom
+        def on_scroll(first, last):
+            scrollbar.set(first, last)
+            if float(last) > 0.9 and table_name in self.loaded:
+                self.load_more(tree, table_name)
+
+        tree.configure(yscrollcommand=on_scroll)
+        scrollbar.pack(side="right", fill="y")
+        tree.pack(side="left", expand=True, fill="both")
+
+        def apply_filter():
+            pager = self.pagers[table_name]
+            pager.reset(pager.sort_col, pager.descending, filter_col.get(), filter_text.get())
+            self.show_first_page(tree, table_name)
+
+        def clear_filter():
+            filter_text.delete(0, tk.END)
+            apply_filter()
+
+        filter_text.bind("<Return>", lambda event: apply_filter())
+        ttk.Button(filter_frame, text="Apply", command=apply_filter).grid(row=0, column=3, padx=5)
+        ttk.Button(filter_frame, text="Clear", command=clear_filter).grid(row=0, column=4, padx=5)
 
         # Buttons
         button_frame = tk.Frame(frame)
@@ -69,22 +218,205 @@ class AdminDashboard:
         ttk.Button(button_frame, text="Add", command=lambda: self.add_record(table_name, columns, tree)).grid(row=0, column=1, padx=5)
         ttk.Button(button_frame, text="Update", command=lambda: self.update_record(table_name, columns, tree)).grid(row=0, column=2, padx=5)
         ttk.Button(button_frame, text="Delete", command=lambda: self.delete_record(table_name, tree)).grid(row=0, column=3, padx=5)
+        if table_name in bulk_import.IMPORTS:
+            ttk.Button(button_frame, text="Import CSV", command=lambda: self.import_csv(table_name, tree)).grid(row=0, column=4, padx=5)
+        ttk.Button(button_frame, text="Count Rows", command=lambda: self.show_count(table_name)).grid(row=0, column=5, padx=5)
+
+    # -------------------------
+    # Analytics Tab
+    # -------------------------
+    # KPIs from the rollup tables (analytics.py), read in a few milliseconds
+    # whatever the length of the history; refreshed when the tab is opened.
+    def create_analytics_tab(self, frame):
+        top = tk.Frame(frame)
+        top.pack(pady=5)
+        ttk.Label(top, text="Period:").grid(row=0, column=0, padx=5)
+        self.analytics_period = ttk.Combobox(top, values=list(analytics.PERIODS), state="readonly", width=15)
+        self.analytics_period.set("Last 12 months")
+        self.analytics_period.grid(row=0, column=1, padx=5)
+        self.analytics_period.bind("<<ComboboxSelected>>", lambda event: self.refresh_analytics())
+        ttk.Button(top, text="Refresh", command=self.refresh_analytics).grid(row=0, column=2, padx=5)
+        ttk.Button(top, text="Rebuild Rollups", command=self.rebuild_analytics).grid(row=0, column=3, padx=5)
+
+        kpi_frame = tk.Frame(frame)
+        kpi_frame.pack(pady=5)
+        self.kpi_labels = {}
+        kpis = [("bookings", "Bookings"), ("revenue", "Revenue"), ("paid", "Paid"), ("pending", "Pending"),
+                ("cancelled", "Cancelled"), ("receivable_due", "Receivables due"),
+                ("receivable_upcoming", "Not yet due")]
+        for column, (key, text) in enumerate(kpis):
+            ttk.Label(kpi_frame, text=text).grid(row=0, column=column, padx=12)
+            self.kpi_labels[key] = ttk.Label(kpi_frame, text="-", font=("Arial", 14, "bold"))
+            self.kpi_labels[key].grid(row=1, column=column, padx=12)
+
+        # Bookings per month, stacked by service type
+        self.chart = tk.Canvas(frame, height=170, background="white")
+        self.chart.pack(fill="x", padx=10, pady=5)
+
+        tables = tk.Frame(frame)
+        tables.pack(expand=True, fill="both", padx=10)
+        self.monthly_tree = ttk.Treeview(tables, columns=("month", "service type", "bookings", "revenue", "paid"),
+                                         show="headings", height=8)
+        self.top_provider_tree = ttk.Treeview(tables, columns=("provider", "name", "bookings", "revenue", "paid", "pending"),
+                                              show="headings", height=8)
+        for tree in (self.monthly_tree, self.top_provider_tree):
+            for col in tree["columns"]:
+                tree.heading(col, text=col)
+                tree.column(col, width=90)
+            tree.pack(side="left", expand=True, fill="both", padx=5)
+
+    def refresh_analytics(self):
+        self.executor.run(fetch_analytics, self.analytics_period.get(), key="analytics",
+                          on_done=self.show_analytics)
+
+    def show_analytics(self, report):
+        values = {**report, "revenue": report["pending"] + report["paid"]}
+        for key, label in self.kpi_labels.items():
+            label.config(text=f"{values[key]:,}" if key == "bookings" else f"${values[key]:,.2f}")
+        self.monthly_tree.delete(*self.monthly_tree.get_children())
+        for month, service_type, count, revenue, paid in report["monthly"]:
+            self.monthly_tree.insert("", tk.END, values=(month, service_type, count, f"{revenue:,.2f}", f"{paid:,.2f}"))
+        self.top_provider_tree.delete(*self.top_provider_tree.get_children())
+        for provider_id, name, count, revenue, paid, pending in report["top_providers"]:
+            self.top_provider_tree.insert("", tk.END, values=(
+                provider_id, name, count, f"{revenue:,.2f}", f"{paid:,.2f}", f"{pending:,.2f}"))
+        self.draw_chart(report["monthly"])
+
+    def draw_chart(self, monthly):
+        self.chart.delete("all")
+        months = sorted({row[0] for row in monthly})
+        types = sorted({row[1] for row in monthly})
+        if not months:
+            self.chart.create_text(10, 10, anchor="nw", text="No bookings in this period")
+            return
+        counts = {(month, service_type): count for month, service_type, count, revenue, paid in monthly}
+        totals = [sum(counts.get((month, t), 0) for t in types) for month in months]
+        width = max(self.chart.winfo_width(), 400)
+        height = int(self.chart["height"])
+        legend = 20
+        bar = (width - 20) / len(months)
+        scale = (height - legend - 25) / max(max(totals), 1)
+        for i, month in enumerate(months):
+            x, y = 10 + i * bar, height - 15
+            for j, service_type in enumerate(types):
+                h = counts.get((month, service_type), 0) * scale
+                if h > 0:
+                    self.chart.create_rectangle(x + 2, y - h, x + bar - 2, y,
+                                                fill=CHART_COLORS[j % len(CHART_COLORS)], width=0)
+                    y -= h
+            if len(months) <= 24:
+                self.chart.create_text(x + bar / 2, height - 2, anchor="s", text=month[2:], font=("Arial", 7))
+        for j, service_type in enumerate(types):
+            self.chart.create_rectangle(10 + j * 140, 5, 20 + j * 140, 15,
+                                        fill=CHART_COLORS[j % len(CHART_COLORS)], width=0)
+            self.chart.create_text(25 + j * 140, 10, anchor="w", text=service_type, font=("Arial", 8))
+
+    def rebuild_analytics(self):
+        if not messagebox.askyesno("Rebuild Rollups", "Recompute the analytics rollups from all bookings and bills?"):
+            return
 
-        self.load_data(tree, table_name)
+        def rebuilt(result):
+            messagebox.showinfo("Rebuild Rollups", "Analytics rollups rebuilt.")
+            self.refresh_analytics()
+
+        self.executor.run(rebuild_analytics, write=True, on_done=rebuilt)
 
     # -------------------------
-    # Load Data Function
+    # Diagnostics Tab
+    # -------------------------
+    # Latency of UI actions and SQL statements, and the slow-query log, from
+    # tracing.py. Collected only when started with ELDERLY_CARE_TRACE=1.
+    def create_diagnostics_tab(self, frame):
+        if tracing.enabled:
+            text = f"Tracing on; statements slower than {tracing.SLOW_MS:g} ms are logged"
+        else:
+            text = "Tracing is off. Start the app with ELDERLY_CARE_TRACE=1 to collect query timings."
+        ttk.Label(frame, text=text).pack(pady=5)
+
+        def make_tree(title, columns, widths):
+            ttk.Label(frame, text=title, font=("Arial", 12, "bold")).pack(anchor="w", padx=10)
+            tree = ttk.Treeview(frame, columns=columns, show="headings", height=6)
+            for col, width in zip(columns, widths):
+                tree.heading(col, text=col)
+                tree.column(col, width=width, stretch=(col in ("action", "sql")))
+            tree.pack(expand=True, fill="both", padx=10, pady=5)
+            return tree
+
+        stats_columns = ["count", "p50 ms", "p95 ms", "p99 ms", "max ms", "rows"]
+        self.action_tree = make_tree("UI actions", ["action"] + stats_columns, [300] + [80] * 6)
+        self.statement_tree = make_tree("SQL statements", ["sql"] + stats_columns, [500] + [80] * 6)
+        self.slow_tree = make_tree("Slow queries", ["at", "action", "ms", "rows", "sql"], [170, 220, 80, 60, 500])
+
+        button_frame = tk.Frame(frame)
+        button_frame.pack(pady=5)
+        ttk.Button(button_frame, text="Refresh", command=self.refresh_diagnostics).grid(row=0, column=0, padx=5)
+        ttk.Button(button_frame, text="Save Report...", command=self.save_diagnostics).grid(row=0, column=1, padx=5)
+        ttk.Button(button_frame, text="Reset", command=lambda: (tracing.reset(), self.refresh_diagnostics())).grid(row=0, column=2, padx=5)
+
+    def refresh_diagnostics(self):
+        report = tracing.snapshot()
+
+        def fill(tree, stats):
+            tree.delete(*tree.get_children())
+            # Slowest at the top, by p95
+            for name, s in sorted(stats.items(), key=lambda item: item[1]["p95_ms"], reverse=True):
+                tree.insert("", tk.END, values=(name, s["count"], s["p50_ms"], s["p95_ms"], s["p99_ms"], s["max_ms"], s["rows"]))
+
+        fill(self.action_tree, report["actions"])
+        fill(self.statement_tree, report["statements"])
+        self.slow_tree.delete(*self.slow_tree.get_children())
+        for entry in reversed(report["slow_queries"]):
+            self.slow_tree.insert("", tk.END, values=(entry["at"], entry["action"], entry["ms"], entry["rows"], entry["sql"]))
+
+    def save_diagnostics(self):
+        path = filedialog.asksaveasfilename(title="Save diagnostics report", defaultextension=".json",
+                                            filetypes=[("JSON files", "*.json")])
+        if path:
+            tracing.dump(path)
+            messagebox.showinfo("Saved", f"Diagnostics report saved to {path}")
+
+    # -------------------------
+    # Load Data Functions
     # -------------------------
     def load_data(self, tree, table):
-        for row in tree.get_children():
-            tree.delete(row)
-        try:
-            c.execute(f"SELECT * FROM {table}")
-            rows = c.fetchall()
-            for r in rows:
-                tree.insert("", tk.END, values=r)
-        except Exception as e:
-            messagebox.showerror("Error", f"Could not load data: {e}")
+        # Start over from the first page, keeping the current sort and filter
+        pager = self.pagers[table]
+        pager.reset(pager.sort_col, pager.descending, pager.filter_col, pager.filter_text)
+        self.show_first_page(tree, table)
+
+    def show_first_page(self, tree, table):
+        # The old rows stay visible until the new first page arrives
+        if table not in self.loaded:
+            _, title = self.views[table]
+            title.config(text=f"{table.capitalize()} Table (loading...)")
+        self.request_page(table)
+
+    def load_more(self, tree, table):
+        if self.pagers[table].exhausted or table in self.loading:
+            return
+        self.request_page(table)
+
+    def request_page(self, table):
+        self.loading.add(table)
+        sql, params = self.pagers[table].page_query()
+
+        def failed(error):
+            self.loading.discard(table)
+            messagebox.showerror("Error", f"Could not load data: {error}")
+
+        self.executor.run(fetch_page, sql, params, key=("page", table),
+                          on_done=lambda result: self.show_page(table, result), on_error=failed,
+                          action=f"AdminDashboard.load_page ({table})")
+
+    def sort_by(self, tree, table, col):
+        # Clicking the same heading again flips the direction
+        pager = self.pagers[table]
+        descending = not pager.descending if pager.sort_col == col else False
+        pager.reset(col, descending, pager.filter_col, pager.filter_text)
+        for heading in pager.columns:
+            arrow = (" \u25bc" if descending else " \u25b2") if heading == col else ""
+            tree.heading(heading, text=heading + arrow)
+        self.show_first_page(tree, table)
 
     # -------------------------
     # Add Record
@@ -93,25 +425,28 @@ class AdminDashboard:
         popup = tk.Toplevel()
         popup.title(f"Add Record to {table}")
 
+        fixed = KEY_COLUMNS + DERIVED_COLUMNS.get(table, ())
         entries = {}
         for i, col in enumerate(columns):
             ttk.Label(popup, text=col).grid(row=i, column=0, padx=5, pady=5)
             e = ttk.Entry(popup)
             e.grid(row=i, column=1, padx=5, pady=5)
+            if col in DERIVED_COLUMNS.get(table, ()):
+                e.config(state="readonly")
             entries[col] = e
 
         def save_record():
-            values = [entries[col].get() for col in columns if col not in ("id", "bill_id", "booking_id")]
-            cols = [col for col in columns if col not in ("id", "bill_id", "booking_id")]
+            values = [entries[col].get() for col in columns if col not in fixed]
+            cols = [col for col in columns if col not in fixed]
             placeholders = ", ".join("?" * len(values))
-            try:
-                c.execute(f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({placeholders})", values)
-                conn.commit()
+
+            def added(result):
                 messagebox.showinfo("Success", "Record added successfully!")
                 popup.destroy()
                 self.load_data(tree, table)
-            except Exception as e:
-                messagebox.showerror("Error", str(e))
+
+            self.executor.run(execute_write, f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({placeholders})",
+                              values, write=True, on_done=added)
 
         ttk.Button(popup, text="Save", command=save_record).grid(row=len(columns), column=0, columnspan=2, pady=10)
 
@@ -128,17 +463,20 @@ class AdminDashboard:
         popup = tk.Toplevel()
         popup.title(f"Update Record in {table}")
 
+        fixed = KEY_COLUMNS + DERIVED_COLUMNS.get(table, ())
         entries = {}
         for i, col in enumerate(columns):
             ttk.Label(popup, text=col).grid(row=i, column=0, padx=5, pady=5)
             e = ttk.Entry(popup)
             e.grid(row=i, column=1, padx=5, pady=5)
             e.insert(0, old_values[i])
+            if col in DERIVED_COLUMNS.get(table, ()):
+                e.config(state="readonly")
             entries[col] = e
 
         def save_changes():
-            set_clause = ", ".join(f"{col}=?" for col in columns if col not in ("id", "bill_id", "booking_id"))
-            values = [entries[col].get() for col in columns if col not in ("id", "bill_id", "booking_id")]
+            set_clause = ", ".join(f"{col}=?" for col in columns if col not in fixed)
+            values = [entries[col].get() for col in columns if col not in fixed]
             record_id = old_values[0]
             if "id" in columns:
                 id_col = "id"
@@ -146,14 +484,17 @@ class AdminDashboard:
                 id_col = "bill_id"
             else:
                 id_col = "booking_id"
-            try:
-                c.execute(f"UPDATE {table} SET {set_clause} WHERE {id_col}=?", (*values, record_id))
-                conn.commit()
+
+            def updated(row):
                 messagebox.showinfo("Success", "Record updated successfully!")
                 popup.destroy()
-                self.load_data(tree, table)
-            except Exception as e:
-                messagebox.showerror("Error", str(e))
+                # Refresh just this row instead of reloading the table
+                if row and tree.exists(selected):
+                    tree.item(selected, values=row)
+
+            self.executor.run(execute_write, f"UPDATE {table} SET {set_clause} WHERE {id_col}=?",
+                              (*values, record_id), self.pagers[table].row_query(record_id),
+                              write=True, on_done=updated)
 
         ttk.Button(popup, text="Save", command=save_changes).grid(row=len(columns), column=0, columnspan=2, pady=10)
 
@@ -175,13 +516,40 @@ class AdminDashboard:
             id_col = "booking_id"
 
         if messagebox.askyesno("Confirm Delete", "Are you sure you want to delete this record?"):
-            try:
-                c.execute(f"DELETE FROM {table} WHERE {id_col}=?", (record_id,))
-                conn.commit()
-                self.load_data(tree, table)
+            def deleted(result):
+                if tree.exists(selected):
+                    tree.delete(selected)
                 messagebox.showinfo("Success", "Record deleted successfully!")
-            except Exception as e:
-                messagebox.showerror("Error", str(e))
+
+            self.executor.run(execute_write, f"DELETE FROM {table} WHERE {id_col}=?", (record_id,),
+                              write=True, on_done=deleted)
+
+    # -------------------------
+    # Bulk CSV Import
+    # -------------------------
+    def import_csv(self, table, tree):
+        path = filedialog.askopenfilename(title=f"Import {table} from CSV",
+                                          filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
+        if not path:
+            return
+
+        def run_import():
+            with open(path, newline="", encoding="utf-8") as f:
+                return bulk_import.import_csv(table, f)
+
+        def imported(result):
+            inserted, errors = result
+            message = f"{inserted} rows imported, {len(errors)} skipped."
+            if errors:
+                message += "\n\n" + "\n".join(f"line {line}: {error}" for line, error in errors[:20])
+                if len(errors) > 20:
+                    message += f"\n... and {len(errors) - 20} more"
+                messagebox.showwarning("Import", message)
+            else:
+                messagebox.showinfo("Import", message)
+            self.load_data(tree, table)
+
+        self.executor.run(run_import, write=True, on_done=imported)
 
 
 # -------------------------
@@ -189,5 +557,3 @@ class AdminDashboard:
 # -------------------------
 if __name__ == "__main__":
     AdminDashboard()
-
-
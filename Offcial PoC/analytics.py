@@ -0,0 +1,200 @@
+import datetime
+import sys
+
+# -------------------------
+# Admin Analytics
+# -------------------------
+# KPIs for the admin dashboard, read from the rollups of migration 12:
+# daily_type_stats (day, service type), daily_provider_stats (day, provider)
+# and provider_stats (provider, all time). Each holds bookings, bills and
+# billed cents by status, so a period's figures are a range read of a few
+# rows per day instead of a GROUP BY over bookings, bills, services and
+# providers.
+#
+# python analytics.py [db] --check      compare the rollups with the history
+# python analytics.py [db] --rebuild    recompute them from the history
+
+TOP_PROVIDERS = 10
+STATUSES = ("pending", "paid", "cancelled")
+
+# name -> (first, last) day offsets from today; None is unbounded
+PERIODS = {
+    "Last 30 days": (-29, 0),
+    "Last 90 days": (-89, 0),
+    "Last 12 months": (-364, 0),
+    "Next 30 days": (1, 30),
+    "All time": (None, None),
+}
+MIN_DAY = "0001-01-01"
+MAX_DAY = "9999-12-31"
+
+PERIOD_TOTALS = """
+    SELECT COALESCE(SUM(bookings), 0), COALESCE(SUM(bills), 0), COALESCE(SUM(pending_cents), 0),
+           COALESCE(SUM(paid_cents), 0), COALESCE(SUM(cancelled_cents), 0)
+    FROM daily_type_stats
+    WHERE day BETWEEN ? AND ?
+"""
+
+# Pending bills for services still to come (upcoming), read as the key
+# range of days after today, and already given (due): the all-time total
+# kept in analytics_totals (migration 18) less the upcoming part, so the
+# past is never summed however long the history
+RECEIVABLES = """
+    SELECT (SELECT pending_cents FROM analytics_totals WHERE id = 1),
+           (SELECT COALESCE(SUM(pending_cents), 0) FROM daily_type_stats WHERE day > ?)
+"""
+
+MONTHLY_BY_TYPE = """
+    SELECT substr(day, 1, 7) AS month, service_type, SUM(bookings),
+           SUM(pending_cents + paid_cents), SUM(paid_cents)
+    FROM daily_type_stats
+    WHERE day BETWEEN ? AND ?
+    GROUP BY month, service_type
+    ORDER BY month, service_type
+"""
+
+# Revenue is what was billed and not cancelled. A period sums the days of
+# each provider in it; all time is one row per provider.
+TOP_PROVIDERS_BY_REVENUE = """
+    SELECT t.provider_id, p.name, t.bookings, t.revenue, t.paid, t.pending
+    FROM (
+        SELECT provider_id, SUM(bookings) AS bookings, SUM(pending_cents + paid_cents) AS revenue,
+               SUM(paid_cents) AS paid, SUM(pending_cents) AS pending
+        FROM daily_provider_stats
+        WHERE day BETWEEN ? AND ?
+        GROUP BY provider_id
+        ORDER BY revenue DESC
+        LIMIT ?
+    ) t
+    LEFT JOIN providers p ON p.id = t.provider_id
+    ORDER BY t.revenue DESC
+"""
+
+TOP_PROVIDERS_ALL_TIME = """
+    SELECT t.provider_id, p.name, t.bookings, t.pending_cents + t.paid_cents AS revenue, t.paid_cents, t.pending_cents
+    FROM provider_stats t
+    LEFT JOIN providers p ON p.id = t.provider_id
+    ORDER BY revenue DESC
+    LIMIT ?
+"""
+
+
+def period_range(name, today=None):
+    today = today or datetime.date.today()
+    first, last = PERIODS[name]
+    return (MIN_DAY if first is None else (today + datetime.timedelta(days=first)).isoformat(),
+            MAX_DAY if last is None else (today + datetime.timedelta(days=last)).isoformat())
+
+
+def report(conn, first=MIN_DAY, last=MAX_DAY, today=None, top=TOP_PROVIDERS):
+    # Everything the analytics tab shows for one period; amounts in dollars
+    today = (today or datetime.date.today()).isoformat()
+    bookings, bills, *cents = conn.execute(PERIOD_TOTALS, (first, last)).fetchone()
+    pending, upcoming = conn.execute(RECEIVABLES, (today,)).fetchone()
+    if first == MIN_DAY and last == MAX_DAY:
+        top_providers = conn.execute(TOP_PROVIDERS_ALL_TIME, (top,))
+    else:
+        top_providers = conn.execute(TOP_PROVIDERS_BY_REVENUE, (first, last, top))
+    return {
+        "first": first,
+        "last": last,
+        "bookings": bookings,
+        "bills": bills,
+        **{status: amount / 100 for status, amount in zip(STATUSES, cents)},
+        "receivable_due": (pending - upcoming) / 100,
+        "receivable_upcoming": upcoming / 100,
+        "monthly": [(month, service_type or "(none)", count, revenue / 100, paid / 100)
+                    for month, service_type, count, revenue, paid in conn.execute(MONTHLY_BY_TYPE, (first, last))],
+        "top_providers": [(provider_id, name or "(deleted)", count, revenue / 100, paid / 100, pending / 100)
+                          for provider_id, name, count, revenue, paid, pending in top_providers],
+    }
+
+
+# -------------------------
+# Consistency
+# -------------------------
+# The rollups recomputed from bookings and bills, as migration 12 filled them
+FROM_HISTORY = """
+    SELECT {keys}, SUM(bookings), SUM(bills), SUM(pending_cents), SUM(paid_cents), SUM(cancelled_cents)
+    FROM (
+        SELECT {booking_keys}, 1 AS bookings, 0 AS bills, 0 AS pending_cents, 0 AS paid_cents, 0 AS cancelled_cents
+        FROM bookings b
+        JOIN services s ON s.id = b.service_id
+        LEFT JOIN providers p ON p.id = s.provider_id
+        UNION ALL
+        SELECT {bill_keys}, 0, 1,
+               CASE COALESCE(bl.status, 'Pending') WHEN 'Pending' THEN {cents} ELSE 0 END,
+               CASE bl.status WHEN 'Paid' THEN {cents} ELSE 0 END,
+               CASE bl.status WHEN 'Cancelled' THEN {cents} ELSE 0 END
+        FROM bills bl
+        LEFT JOIN providers p ON p.id = bl.provider_id
+        WHERE bl.service_date IS NOT NULL
+    )
+    WHERE {not_null}
+    GROUP BY {keys}
+"""
+
+CENTS = "CAST(round(COALESCE(bl.amount, 0) * 100) AS INTEGER)"
+SERVICE_TYPE = "COALESCE(p.service_type, '')"
+
+# table -> {key column: (its value for a booking, for a bill)}
+ROLLUPS = {
+    "daily_provider_stats": {"day": ("b.booking_date", "bl.service_date"),
+                             "provider_id": ("s.provider_id", "bl.provider_id")},
+    "daily_type_stats": {"day": ("b.booking_date", "bl.service_date"),
+                         "service_type": (SERVICE_TYPE, SERVICE_TYPE)},
+    "provider_stats": {"provider_id": ("s.provider_id", "bl.provider_id")},
+}
+
+COLUMNS = "bookings, bills, pending_cents, paid_cents, cancelled_cents"
+
+
+def history(keys):
+    return FROM_HISTORY.format(
+        keys=", ".join(keys), cents=CENTS,
+        booking_keys=", ".join(f"{booking} AS {key}" for key, (booking, bill) in keys.items()),
+        bill_keys=", ".join(bill for booking, bill in keys.values()),
+        not_null=" AND ".join(f"{key} IS NOT NULL" for key in keys))
+
+
+def check_rollups(conn):
+    # Returns {table: [(key, rollup row, recomputed row)]} where they differ
+    problems = {}
+    for table, keys in ROLLUPS.items():
+        n = len(keys)
+        stored = {row[:n]: row[n:] for row in conn.execute(f"SELECT {', '.join(keys)}, {COLUMNS} FROM {table}")}
+        expected = {row[:n]: row[n:] for row in conn.execute(history(keys))}
+        diffs = [(k, stored.get(k), expected.get(k))
+                 for k in stored.keys() | expected.keys() if stored.get(k) != expected.get(k)]
+        if diffs:
+            problems[table] = sorted(diffs, key=repr)
+    total = conn.execute("SELECT pending_cents FROM analytics_totals WHERE id = 1").fetchone()
+    expected = conn.execute("SELECT COALESCE(SUM(pending_cents), 0) FROM daily_type_stats").fetchone()
+    if total != expected:
+        problems["analytics_totals"] = [(("pending_cents",), total, expected)]
+    return problems
+
+
+def rebuild_rollups(conn):
+    # One write queue operation, so readers see the old totals or the new ones
+    for table, keys in ROLLUPS.items():
+        conn.execute(f"DELETE FROM {table}")
+        conn.execute(f"INSERT INTO {table} ({', '.join(keys)}, {COLUMNS}) " + history(keys))
+
+
+if __name__ == "__main__":
+    from database import DB_PATH, get_connection
+    from writer import get_writer
+
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    path = args[0] if args else DB_PATH
+    conn = get_connection(path)
+    if "--rebuild" in sys.argv:
+        get_writer(path).call(rebuild_rollups)
+        print("analytics rollups rebuilt")
+    problems = check_rollups(conn)
+    for table, diffs in problems.items():
+        print(f"{table}: {len(diffs)} rows differ from the history, e.g. {diffs[:3]}")
+    if not problems:
+        print("analytics rollups match the history")
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,241 @@
+import datetime
+import json
+import os
+import urllib.error
+import urllib.request
+from urllib.parse import urlencode
+
+import billing
+import bookings
+import catalog
+import changes
+import ledger
+import matching
+import ratings
+import statements
+from catalog_cache import get_cache
+from database import DB_PATH, get_read_connection
+from writer import get_writer
+
+# -------------------------
+# Dashboard Backends
+# -------------------------
+# The senior and provider dashboards talk to one of two interchangeable
+# backends: LocalBackend uses the SQLite file directly, ApiClient goes
+# through api_server.py. Set ELDERLY_CARE_API=http://127.0.0.1:8080 to make
+# the dashboards use the API.
+
+API_URL_ENV = "ELDERLY_CARE_API"
+
+
+class LocalBackend:
+    # Connections are looked up per call, so any thread may use the backend.
+    # Writes go through the process's write queue (writer.py).
+    def __init__(self, path=DB_PATH):
+        self.path = path
+
+    def search_services(self, text="", **filters):
+        return get_cache(self.path).search_services(text, **filters)
+
+    def nearby_services(self, senior_id, radius_km, text="", **filters):
+        # Not cached: the results depend on where the senior is
+        return matching.nearby_services(get_read_connection(self.path), senior_id, radius_km, text, **filters)
+
+    def book_service(self, senior_id, service_id, day, month, year):
+        return get_writer(self.path).call(bookings.book_service, senior_id, service_id, day, month, year)
+
+    def next_available_dates(self, service_id, count=5):
+        return bookings.next_available_dates(get_read_connection(self.path), service_id, count)
+
+    def senior_bookings(self, senior_id, view="All", start=None, end=None, booking_ids=None, bill_ids=None):
+        start, end, descending = bookings.view_range(view, start, end)
+        return bookings.senior_bookings(get_read_connection(self.path), senior_id, start, end, descending,
+                                        booking_ids, bill_ids)
+
+    def submit_rating(self, senior_id, provider_id, rating):
+        get_writer(self.path).call(ratings.submit_rating, senior_id, provider_id, rating)
+
+    def senior_bills(self, senior_id, bill_ids=None):
+        if bill_ids is not None:
+            return billing.senior_bills(get_read_connection(self.path), senior_id, bill_ids=bill_ids)
+        return billing.senior_bills(get_read_connection(self.path), senior_id, get_cache(self.path).provider_names())
+
+    def senior_statements(self, senior_id, first=None, last=None):
+        return statements.senior_statements(get_read_connection(self.path), senior_id, first, last)
+
+    def senior_balance(self, senior_id):
+        return ledger.senior_balance(get_read_connection(self.path), senior_id)
+
+    def pay_bill(self, senior_id, bill_id):
+        get_writer(self.path).call(billing.pay_bill, senior_id, bill_id)
+
+    def pay_bills(self, senior_id, bill_ids):
+        return get_writer(self.path).call(billing.pay_bills, senior_id, bill_ids)
+
+    def provider_services(self, provider_id, service_ids=None):
+        if service_ids is not None:
+            return catalog.provider_services(get_read_connection(self.path), provider_id, service_ids)
+        return get_cache(self.path).provider_services(provider_id)
+
+    def add_service(self, provider_id, name, description, price):
+        return get_writer(self.path).call(catalog.add_service, provider_id, name, description, price)
+
+    def delete_service(self, provider_id, service_id):
+        get_writer(self.path).call(catalog.delete_service, provider_id, service_id)
+
+    def provider_bookings(self, provider_id, view="All", start=None, end=None, booking_ids=None, bill_ids=None):
+        start, end, descending = bookings.view_range(view, start, end)
+        return bookings.provider_bookings(get_read_connection(self.path), provider_id, start, end, descending,
+                                          booking_ids, bill_ids)
+
+    def provider_payouts(self, provider_id, first=None, last=None):
+        return statements.provider_payouts(get_read_connection(self.path), provider_id, first, last)
+
+    def provider_balance(self, provider_id):
+        return ledger.provider_balance(get_read_connection(self.path), provider_id)
+
+    def mark_booking_paid(self, provider_id, booking_id):
+        return get_writer(self.path).call(billing.mark_booking_paid, provider_id, booking_id)
+
+    def mark_bookings_paid(self, provider_id, booking_ids):
+        return get_writer(self.path).call(billing.mark_bookings_paid, provider_id, booking_ids)
+
+    def changes_since(self, seq=None):
+        return changes.changes_since(get_read_connection(self.path), seq)
+
+
+class ApiError(Exception):
+    pass
+
+
+class ApiClient:
+    def __init__(self, base_url, timeout=10):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def request(self, method, path, query=None, body=None):
+        url = self.base_url + path
+        if query:
+            url += "?" + urlencode({key: value for key, value in query.items() if value is not None})
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(url, data=data, method=method,
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read() or b"{}").get("error", e.reason)
+            except (ValueError, AttributeError):
+                # Not our JSON error body, e.g. a proxy's or the stdlib's HTML page
+                message = e.reason
+            # Same exception types as the local operations raise
+            if e.code == 404:
+                raise LookupError(message)
+            if e.code in (400, 409):
+                raise ValueError(message)
+            raise ApiError(message)
+        except OSError as e:
+            # Server down or unreachable, or no answer within the timeout
+            raise ApiError(f"API at {self.base_url} is not reachable: {getattr(e, 'reason', e)}")
+
+    @staticmethod
+    def _range_query(view, start, end):
+        return {"view": view,
+                "from": start.isoformat() if start else None,
+                "to": end.isoformat() if end else None}
+
+    @staticmethod
+    def _ids(ids):
+        return ",".join(str(i) for i in ids) if ids is not None else None
+
+    def search_services(self, text="", service_type=None, min_price=None, max_price=None,
+                        min_rating=None, limit=catalog.TOP_K):
+        result = self.request("GET", "/services", {
+            "q": text, "type": service_type, "min_price": min_price, "max_price": max_price,
+            "min_rating": min_rating, "limit": limit})
+        return [tuple(row) for row in result["services"]]
+
+    def nearby_services(self, senior_id, radius_km, text="", service_type=None, min_price=None,
+                        max_price=None, min_rating=None, limit=catalog.TOP_K):
+        result = self.request("GET", f"/seniors/{senior_id}/services/nearby", {
+            "km": radius_km, "q": text, "type": service_type, "min_price": min_price, "max_price": max_price,
+            "min_rating": min_rating, "limit": limit})
+        if result["services"] is None:
+            return None
+        return [tuple(row) for row in result["services"]]
+
+    def book_service(self, senior_id, service_id, day, month, year):
+        result = self.request("POST", "/bookings", body={
+            "senior_id": senior_id, "service_id": service_id, "day": day, "month": month, "year": year})
+        return result["booking_id"], result["bill_id"]
+
+    def next_available_dates(self, service_id, count=5):
+        result = self.request("GET", f"/services/{service_id}/availability", {"count": count})
+        return [datetime.date.fromisoformat(day) for day in result["dates"]]
+
+    def senior_bookings(self, senior_id, view="All", start=None, end=None, booking_ids=None, bill_ids=None):
+        result = self.request("GET", f"/seniors/{senior_id}/bookings", {
+            **self._range_query(view, start, end),
+            "booking_ids": self._ids(booking_ids), "bill_ids": self._ids(bill_ids)})
+        return [tuple(row) for row in result["bookings"]]
+
+    def submit_rating(self, senior_id, provider_id, rating):
+        self.request("POST", "/ratings", body={"senior_id": senior_id, "provider_id": provider_id, "rating": rating})
+
+    def senior_bills(self, senior_id, bill_ids=None):
+        result = self.request("GET", f"/seniors/{senior_id}/bills", {"bill_ids": self._ids(bill_ids)})
+        return [tuple(row) for row in result["bills"]]
+
+    def senior_statements(self, senior_id, first=None, last=None):
+        result = self.request("GET", f"/seniors/{senior_id}/statements", {"from": first, "to": last})
+        return [tuple(row) for row in result["statements"]]
+
+    def senior_balance(self, senior_id):
+        return self.request("GET", f"/seniors/{senior_id}/balance")["balance"]
+
+    def pay_bill(self, senior_id, bill_id):
+        self.request("POST", f"/bills/{bill_id}/pay", body={"senior_id": senior_id})
+
+    def pay_bills(self, senior_id, bill_ids):
+        return self.request("POST", "/bills/pay", body={"senior_id": senior_id, "bill_ids": list(bill_ids)})["paid"]
+
+    def provider_services(self, provider_id, service_ids=None):
+        result = self.request("GET", f"/providers/{provider_id}/services", {"service_ids": self._ids(service_ids)})
+        return [tuple(row) for row in result["services"]]
+
+    def add_service(self, provider_id, name, description, price):
+        result = self.request("POST", f"/providers/{provider_id}/services",
+                              body={"name": name, "description": description, "price": price})
+        return result["service_id"]
+
+    def delete_service(self, provider_id, service_id):
+        self.request("DELETE", f"/providers/{provider_id}/services/{service_id}")
+
+    def provider_bookings(self, provider_id, view="All", start=None, end=None, booking_ids=None, bill_ids=None):
+        result = self.request("GET", f"/providers/{provider_id}/bookings", {
+            **self._range_query(view, start, end),
+            "booking_ids": self._ids(booking_ids), "bill_ids": self._ids(bill_ids)})
+        return [tuple(row) for row in result["bookings"]]
+
+    def provider_payouts(self, provider_id, first=None, last=None):
+        result = self.request("GET", f"/providers/{provider_id}/payouts", {"from": first, "to": last})
+        return [tuple(row) for row in result["payouts"]]
+
+    def provider_balance(self, provider_id):
+        return self.request("GET", f"/providers/{provider_id}/balance")["balance"]
+
+    def mark_booking_paid(self, provider_id, booking_id):
+        return self.request("POST", f"/providers/{provider_id}/bookings/{booking_id}/mark_paid")["bill_id"]
+
+    def mark_bookings_paid(self, provider_id, booking_ids):
+        return self.request("POST", f"/providers/{provider_id}/bookings/mark_paid",
+                            body={"booking_ids": list(booking_ids)})["paid"]
+
+    def changes_since(self, seq=None):
+        return self.request("GET", "/changes", {"since": seq})
+
+
+def get_backend():
+    url = os.environ.get(API_URL_ENV)
+    return ApiClient(url) if url else LocalBackend()
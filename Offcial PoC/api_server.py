@@ -0,0 +1,540 @@
+import argparse
+import asyncio
+import concurrent.futures
+import datetime
+import json
+import queue
+import re
+import sqlite3
+import threading
+import zlib
+from urllib.parse import parse_qs, urlsplit
+
+import billing
+import bookings
+import catalog
+import changes
+import export
+import ledger
+import matching
+import ratings
+import statements
+import tracing
+from catalog_cache import get_cache
+from database import DB_PATH, get_connection, get_read_connection
+from writer import get_writer
+
+# -------------------------
+# Headless JSON API
+# -------------------------
+# A small asyncio HTTP server exposing the dashboard operations as JSON, so
+# clients do not need their own handle on the SQLite file and the system can
+# be load-tested without a display.
+#
+# Every write is handed to the write queue (writer.py), whose one thread owns
+# the only write connection and commits concurrent requests together. Write
+# handlers wait for their result on a small pool of threads, so that requests
+# arriving together reach the queue together. Reads run on a pool of threads,
+# each with its own read-only connection (WAL lets them proceed while the
+# writer commits).
+#
+# The API has no authentication: the senior or provider a write acts for is
+# whatever id the request names. It is meant for the dashboards and load tests
+# on the same machine, so it listens on 127.0.0.1 only by default; every
+# client that can reach it is trusted. Do not expose it with --host on a
+# shared network.
+
+READ_WORKERS = 4
+WRITE_WORKERS = 8
+MAX_BODY_BYTES = 64 * 1024
+STREAM_BUFFER_CHUNKS = 8  # chunks a streamed response may run ahead of the client
+
+STATUS_TEXT = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found",
+               405: "Method Not Allowed", 409: "Conflict", 500: "Internal Server Error"}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Stream:
+    # A response body sent with chunked encoding as make_chunks() yields text;
+    # the generator runs on a reader thread.
+    def __init__(self, content_type, make_chunks, gzipped=False):
+        self.content_type = content_type
+        self.make_chunks = make_chunks
+        self.gzipped = gzipped
+
+    def encoded_chunks(self):
+        compressor = zlib.compressobj(wbits=31) if self.gzipped else None  # 31: gzip container
+        for chunk in self.make_chunks():
+            data = chunk.encode()
+            if compressor:
+                data = compressor.compress(data)
+            if data:
+                yield data
+        if compressor:
+            yield compressor.flush()
+
+
+# -------------------------
+# Operations
+# -------------------------
+# Each handler gets the database path, path parameters, query string and JSON
+# body, and runs on a worker thread.
+
+def _int(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise HttpError(400, f"{name} must be an integer")
+
+
+def _float(value, name):
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise HttpError(400, f"{name} must be a number")
+
+
+def _ids(query, name):
+    # "1,2,3" -> [1, 2, 3]; an absent parameter is None, an empty one []
+    if name not in query:
+        return None
+    return [_int(value, name) for value in query[name].split(",") if value]
+
+
+def list_services(path, params, query, body):
+    rows = get_cache(path).search_services(
+        query.get("q", ""),
+        service_type=query.get("type") or None,
+        min_price=_float(query.get("min_price"), "min_price"),
+        max_price=_float(query.get("max_price"), "max_price"),
+        min_rating=_float(query.get("min_rating"), "min_rating"),
+        limit=_int(query.get("limit", catalog.TOP_K), "limit"))
+    return 200, {"services": rows}
+
+
+def list_nearby_services(path, params, query, body):
+    # "services": null when the senior has no location on file
+    radius_km = _float(query.get("km"), "km")
+    if radius_km is None:
+        raise HttpError(400, "km is required")
+    rows = matching.nearby_services(
+        get_read_connection(path), params["senior_id"], radius_km, query.get("q", ""),
+        service_type=query.get("type") or None,
+        min_price=_float(query.get("min_price"), "min_price"),
+        max_price=_float(query.get("max_price"), "max_price"),
+        min_rating=_float(query.get("min_rating"), "min_rating"),
+        limit=_int(query.get("limit", catalog.TOP_K), "limit"))
+    return 200, {"services": rows}
+
+
+def create_booking(path, params, query, body):
+    booking_id, bill_id = get_writer(path).call(
+        bookings.book_service, _int(body.get("senior_id"), "senior_id"),
+        _int(body.get("service_id"), "service_id"), _int(body.get("day"), "day"),
+        _int(body.get("month"), "month"), _int(body.get("year"), "year"))
+    return 201, {"booking_id": booking_id, "bill_id": bill_id}
+
+
+def create_rating(path, params, query, body):
+    get_writer(path).call(ratings.submit_rating, _int(body.get("senior_id"), "senior_id"),
+                          _int(body.get("provider_id"), "provider_id"), _int(body.get("rating"), "rating"))
+    return 201, {"ok": True}
+
+
+def service_availability(path, params, query, body):
+    dates = bookings.next_available_dates(get_read_connection(path), params["service_id"],
+                                          _int(query.get("count", 5), "count"))
+    return 200, {"dates": dates}
+
+
+def list_senior_bookings(path, params, query, body):
+    start, end, descending = _view_range(query)
+    rows = bookings.senior_bookings(get_read_connection(path), params["senior_id"], start, end, descending,
+                                    _ids(query, "booking_ids"), _ids(query, "bill_ids"))
+    return 200, {"bookings": rows}
+
+
+def list_senior_bills(path, params, query, body):
+    bill_ids = _ids(query, "bill_ids")
+    names = get_cache(path).provider_names() if bill_ids is None else None
+    rows = billing.senior_bills(get_read_connection(path), params["senior_id"], names, bill_ids)
+    return 200, {"bills": rows}
+
+
+def pay_bill(path, params, query, body):
+    get_writer(path).call(billing.pay_bill, _int(body.get("senior_id"), "senior_id"), params["bill_id"])
+    return 200, {"ok": True}
+
+
+def pay_bills(path, params, query, body):
+    bill_ids = [_int(bill_id, "bill_ids") for bill_id in body.get("bill_ids") or []]
+    if not bill_ids:
+        raise HttpError(400, "bill_ids is required")
+    paid = get_writer(path).call(billing.pay_bills, _int(body.get("senior_id"), "senior_id"), bill_ids)
+    return 200, {"paid": paid}
+
+
+def list_provider_services(path, params, query, body):
+    service_ids = _ids(query, "service_ids")
+    if service_ids is not None:
+        return 200, {"services": catalog.provider_services(get_read_connection(path), params["provider_id"], service_ids)}
+    return 200, {"services": get_cache(path).provider_services(params["provider_id"])}
+
+
+def create_service(path, params, query, body):
+    if not body.get("name") or body.get("price") in (None, ""):
+        raise HttpError(400, "Service name and price are required.")
+    service_id = get_writer(path).call(catalog.add_service, params["provider_id"], body["name"],
+                                     body.get("description", ""), _float(body["price"], "price"))
+    return 201, {"service_id": service_id}
+
+
+def remove_service(path, params, query, body):
+    get_writer(path).call(catalog.delete_service, params["provider_id"], params["service_id"])
+    return 200, {"ok": True}
+
+
+def _view_range(query):
+    start = bookings.parse_date(query["from"]) if query.get("from") else None
+    end = bookings.parse_date(query["to"]) if query.get("to") else None
+    return bookings.view_range(query.get("view", "All"), start, end)
+
+
+def list_provider_bookings(path, params, query, body):
+    start, end, descending = _view_range(query)
+    rows = bookings.provider_bookings(get_read_connection(path), params["provider_id"], start, end, descending,
+                                      _ids(query, "booking_ids"), _ids(query, "bill_ids"))
+    return 200, {"bookings": rows}
+
+
+def mark_booking_paid(path, params, query, body):
+    bill_id = get_writer(path).call(billing.mark_booking_paid, params["provider_id"], params["booking_id"])
+    return 200, {"bill_id": bill_id}
+
+
+def mark_bookings_paid(path, params, query, body):
+    booking_ids = [_int(booking_id, "booking_ids") for booking_id in body.get("booking_ids") or []]
+    if not booking_ids:
+        raise HttpError(400, "booking_ids is required")
+    paid = get_writer(path).call(billing.mark_bookings_paid, params["provider_id"], booking_ids)
+    return 200, {"paid": paid}
+
+
+def stream_export(path, params, query, body):
+    # GET /exports/bills?since=123&format=csv&gzip=1 streams rows with a larger id
+    name, fmt = params["name"], query.get("format", "jsonl")
+    if name not in export.EXPORTS:
+        raise HttpError(404, f"Unknown export {name!r}")
+    if fmt not in export.FORMATS:
+        raise HttpError(400, f"format must be one of {', '.join(export.FORMATS)}")
+    since = _int(query.get("since", 0), "since")
+    gzipped = query.get("gzip") in ("1", "true")
+    content_type = "application/gzip" if gzipped else ("text/csv" if fmt == "csv" else "application/x-ndjson")
+    return 200, Stream(content_type, lambda: export.stream_text(get_read_connection(path), name, fmt, since), gzipped)
+
+
+def _month_range(query):
+    # ?from=2024-01&to=2024-12; either end may be left open
+    first = statements.parse_month(query["from"]) if query.get("from") else None
+    last = statements.parse_month(query["to"]) if query.get("to") else None
+    return first, last
+
+
+def list_senior_statements(path, params, query, body):
+    rows = statements.senior_statements(get_read_connection(path), params["senior_id"], *_month_range(query))
+    return 200, {"statements": rows}
+
+
+def list_provider_payouts(path, params, query, body):
+    rows = statements.provider_payouts(get_read_connection(path), params["provider_id"], *_month_range(query))
+    return 200, {"payouts": rows}
+
+
+def senior_balance(path, params, query, body):
+    return 200, {"balance": ledger.senior_balance(get_read_connection(path), params["senior_id"])}
+
+
+def provider_balance(path, params, query, body):
+    return 200, {"balance": ledger.provider_balance(get_read_connection(path), params["provider_id"])}
+
+
+def bill_history(path, params, query, body):
+    events = ledger.bill_history(get_read_connection(path), params["bill_id"])
+    if not events:
+        raise HttpError(404, "Bill not found")
+    return 200, {"events": events}
+
+
+def list_changes(path, params, query, body):
+    since = _int(query["since"], "since") if query.get("since") else None
+    return 200, changes.changes_since(get_read_connection(path), since)
+
+
+def health(path, params, query, body):
+    return 200, {"ok": True}
+
+
+def cache_stats(path, params, query, body):
+    return 200, get_cache(path).stats()
+
+
+def writer_stats(path, params, query, body):
+    return 200, get_writer(path).stats()
+
+
+# (method, path pattern, handler, is_write)
+ROUTES = [
+    ("GET", r"/health", health, False),
+    ("GET", r"/stats/cache", cache_stats, False),
+    ("GET", r"/stats/writer", writer_stats, False),
+    ("GET", r"/services", list_services, False),
+    ("GET", r"/services/(?P<service_id>\d+)/availability", service_availability, False),
+    ("POST", r"/bookings", create_booking, True),
+    ("POST", r"/ratings", create_rating, True),
+    ("GET", r"/seniors/(?P<senior_id>\d+)/bookings", list_senior_bookings, False),
+    ("GET", r"/seniors/(?P<senior_id>\d+)/bills", list_senior_bills, False),
+    ("GET", r"/seniors/(?P<senior_id>\d+)/statements", list_senior_statements, False),
+    ("GET", r"/seniors/(?P<senior_id>\d+)/balance", senior_balance, False),
+    ("GET", r"/seniors/(?P<senior_id>\d+)/services/nearby", list_nearby_services, False),
+    ("POST", r"/bills/(?P<bill_id>\d+)/pay", pay_bill, True),
+    ("POST", r"/bills/pay", pay_bills, True),
+    ("GET", r"/bills/(?P<bill_id>\d+)/history", bill_history, False),
+    ("GET", r"/providers/(?P<provider_id>\d+)/services", list_provider_services, False),
+    ("POST", r"/providers/(?P<provider_id>\d+)/services", create_service, True),
+    ("DELETE", r"/providers/(?P<provider_id>\d+)/services/(?P<service_id>\d+)", remove_service, True),
+    ("GET", r"/providers/(?P<provider_id>\d+)/bookings", list_provider_bookings, False),
+    ("GET", r"/providers/(?P<provider_id>\d+)/payouts", list_provider_payouts, False),
+    ("GET", r"/providers/(?P<provider_id>\d+)/balance", provider_balance, False),
+    ("POST", r"/providers/(?P<provider_id>\d+)/bookings/(?P<booking_id>\d+)/mark_paid", mark_booking_paid, True),
+    ("POST", r"/providers/(?P<provider_id>\d+)/bookings/mark_paid", mark_bookings_paid, True),
+    ("GET", r"/exports/(?P<name>[a-z]+)", stream_export, False),
+    ("GET", r"/changes", list_changes, False),
+]
+ROUTES = [(method, re.compile(pattern + "$"), handler, is_write) for method, pattern, handler, is_write in ROUTES]
+
+
+def _json_default(value):
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+# -------------------------
+# Server
+# -------------------------
+class ApiServer:
+    def __init__(self, path=DB_PATH, read_workers=READ_WORKERS, write_workers=WRITE_WORKERS):
+        self.path = path
+        get_connection(path)  # create / migrate the schema before serving
+        get_writer(path)
+        self.writer = concurrent.futures.ThreadPoolExecutor(max_workers=write_workers, thread_name_prefix="api-writer")
+        self.readers = concurrent.futures.ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix="db-reader")
+
+    def route(self, method, target):
+        url = urlsplit(target)
+        allowed = False
+        for route_method, pattern, handler, is_write in ROUTES:
+            match = pattern.match(url.path)
+            if match:
+                if route_method != method:
+                    allowed = True
+                    continue
+                params = {key: int(value) if value.isdigit() else value
+                          for key, value in match.groupdict().items()}
+                query = {key: values[-1] for key, values in parse_qs(url.query, keep_blank_values=True).items()}
+                return handler, params, query, is_write
+        raise HttpError(405 if allowed else 404, "Method not allowed" if allowed else "Not found")
+
+    async def dispatch(self, method, target, body):
+        try:
+            handler, params, query, is_write = self.route(method, target)
+            payload = json.loads(body) if body else {}
+            if not isinstance(payload, dict):
+                raise HttpError(400, "Request body must be a JSON object")
+            pool = self.writer if is_write else self.readers
+            loop = asyncio.get_running_loop()
+            if tracing.enabled:
+                return await loop.run_in_executor(pool, tracing.traced_call, f"api.{handler.__name__}",
+                                                  handler, self.path, params, query, payload)
+            return await loop.run_in_executor(pool, handler, self.path, params, query, payload)
+        except HttpError as e:
+            return e.status, {"error": str(e)}
+        except json.JSONDecodeError:
+            return 400, {"error": "Request body is not valid JSON"}
+        except LookupError as e:
+            return 404, {"error": str(e)}
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        except sqlite3.IntegrityError as e:
+            return 409, {"error": str(e)}
+        except Exception as e:
+            return 500, {"error": str(e)}
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = headers.get("content-length", "0") or "0"
+                # Without a valid length the body cannot be skipped, so the
+                # connection is closed after the error
+                if not length.isdecimal():
+                    status, payload = 400, {"error": "Content-Length must be a non-negative integer"}
+                    keep_alive = False
+                elif int(length) > MAX_BODY_BYTES:
+                    status, payload = 400, {"error": "Request body too large"}
+                    keep_alive = False
+                else:
+                    length = int(length)
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload = await self.dispatch(method.upper(), target, body)
+                    keep_alive = (version == "HTTP/1.1" and headers.get("connection", "").lower() != "close")
+
+                if isinstance(payload, Stream):
+                    keep_alive = await self.send_stream(writer, status, payload, keep_alive)
+                    if not keep_alive:
+                        break
+                    continue
+
+                data = json.dumps(payload, default=_json_default).encode()
+                writer.write((f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                              f"Content-Type: application/json\r\n"
+                              f"Content-Length: {len(data)}\r\n"
+                              f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode() + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def send_stream(self, writer, status, stream, keep_alive):
+        # The reader thread fills a bounded queue and the event loop drains it,
+        # so a slow client holds back the cursor instead of buffering the
+        # export in memory. Returns whether the connection can be reused.
+        writer.write((f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+                      f"Content-Type: {stream.content_type}\r\n"
+                      f"Transfer-Encoding: chunked\r\n"
+                      f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode())
+        chunks = queue.Queue(maxsize=STREAM_BUFFER_CHUNKS)
+        stopped = threading.Event()
+
+        def offer(item):
+            while not stopped.is_set():
+                try:
+                    chunks.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce():
+            try:
+                for data in stream.encoded_chunks():
+                    if not offer(data):
+                        return
+                offer(None)
+            except Exception as e:
+                offer(e)
+
+        loop = asyncio.get_running_loop()
+        loop.run_in_executor(self.readers, produce)
+        try:
+            while True:
+                item = await loop.run_in_executor(None, chunks.get)
+                if isinstance(item, Exception):
+                    return False  # headers are gone; cut the body short so the client sees an error
+                if item is None:
+                    writer.write(b"0\r\n\r\n")
+                    await writer.drain()
+                    return keep_alive
+                writer.write(f"{len(item):x}\r\n".encode() + item + b"\r\n")
+                await writer.drain()
+        finally:
+            stopped.set()
+            try:
+                chunks.put_nowait(None)  # wakes a get() left waiting if we were cancelled
+            except queue.Full:
+                pass
+
+    async def start(self, host="127.0.0.1", port=8080):
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    def shutdown(self):
+        self.writer.shutdown(wait=True)
+        self.readers.shutdown(wait=True)
+
+
+def serve_in_thread(path=DB_PATH, host="127.0.0.1", port=0):
+    # Runs the server on a background event loop, e.g. for tests and benchmarks.
+    # Port 0 picks a free port. Returns (base_url, stop).
+    api = ApiServer(path)
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    state = {}
+
+    def run():
+        asyncio.set_event_loop(loop)
+        state["server"] = loop.run_until_complete(api.start(host, port))
+        started.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    started.wait()
+    bound_port = state["server"].sockets[0].getsockname()[1]
+
+    def stop():
+        async def close():
+            state["server"].close()
+            await state["server"].wait_closed()
+        asyncio.run_coroutine_threadsafe(close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        api.shutdown()
+
+    return f"http://{host}:{bound_port}", stop
+
+
+async def main(args):
+    api = ApiServer(args.db)
+    server = await api.start(args.host, args.port)
+    print(f"Serving elderly care API on http://{args.host}:{args.port} (database {args.db})")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        api.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless JSON API for the elderly care database")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="address to listen on; the API is unauthenticated, keep it on localhost")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--db", default=DB_PATH)
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
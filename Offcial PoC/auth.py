@@ -0,0 +1,172 @@
+import base64
+import concurrent.futures
+import hashlib
+import hmac
+import os
+import sys
+import time
+
+from database import get_read_connection
+from writer import get_writer
+
+# -------------------------
+# Password Hashing
+# -------------------------
+# Passwords are stored as "pbkdf2_sha256$<iterations>$<salt>$<hash>".
+# HASH_ITERATIONS is the cost knob: raising it makes every guess (and every
+# login) slower. Hashes made with an older cost, and plaintext passwords from
+# before hashing existed, are upgraded the next time that user logs in.
+
+HASH_ALGORITHM = "pbkdf2_sha256"
+HASH_ITERATIONS = 200_000
+SALT_BYTES = 16
+
+LOGIN_WORKERS = 4  # logins verified in parallel; hashlib releases the GIL while hashing
+
+ROLE_TABLES = {"Senior": "seniors", "Provider": "providers", "Admin": "admin"}
+
+# Only id and hash, looked up through the UNIQUE email index
+CREDENTIAL_QUERIES = {role: f"SELECT id, password FROM {table} WHERE email=?"
+                      for role, table in ROLE_TABLES.items()}
+
+
+def hash_password(password, iterations=HASH_ITERATIONS):
+    salt = os.urandom(SALT_BYTES)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+    return "$".join([HASH_ALGORITHM, str(iterations),
+                     base64.b64encode(salt).decode(), base64.b64encode(digest).decode()])
+
+
+def verify_password(password, stored, iterations=HASH_ITERATIONS):
+    # Returns (matches, needs_rehash)
+    parts = stored.split("$")
+    if len(parts) != 4 or parts[0] != HASH_ALGORITHM:
+        # Legacy plaintext row
+        return hmac.compare_digest(password.encode(), stored.encode()), True
+    try:
+        stored_iterations = int(parts[1])
+        salt, expected = base64.b64decode(parts[2]), base64.b64decode(parts[3])
+        digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, stored_iterations)
+    except ValueError:
+        # A damaged hash (binascii.Error is a ValueError) matches nothing; it
+        # is still hashed against so it takes as long as a wrong password
+        verify_password(password, dummy_hash())
+        return False, False
+    return hmac.compare_digest(digest, expected), stored_iterations != iterations
+
+
+_dummy_hash = None
+
+
+def dummy_hash():
+    # Unknown emails are checked against this so they take as long as a wrong
+    # password; made on first use so importing auth stays cheap.
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = hash_password("not-a-real-password")
+    return _dummy_hash
+
+
+# -------------------------
+# Login Verification
+# -------------------------
+def check_login(role, email, password):
+    # Runs on a worker thread; each thread has its own connections
+    row = get_read_connection().execute(CREDENTIAL_QUERIES[role], (email,)).fetchone()
+    if row is None:
+        verify_password(password, dummy_hash())
+        return None
+
+    user_id, stored = row
+    matches, needs_rehash = verify_password(password, stored)
+    if not matches:
+        return None
+    if needs_rehash:
+        # Hashed here, so the writer thread only runs the update
+        get_writer().call(save_password, role, user_id, hash_password(password))
+    return user_id
+
+
+def save_password(conn, role, user_id, password_hash):
+    conn.execute(f"UPDATE {ROLE_TABLES[role]} SET password=? WHERE id=?", (password_hash, user_id))
+
+
+# -------------------------
+# Sign-up
+# -------------------------
+def create_user(role, name, age, email, password, service_type=None, admin_key=None):
+    # Runs on a worker thread like check_login; raises sqlite3.IntegrityError
+    # for an email that is already registered
+    get_writer().call(insert_user, role, name, age, email, hash_password(password), service_type, admin_key)
+
+
+def insert_user(conn, role, name, age, email, password_hash, service_type, admin_key):
+    # Runs on the write queue
+    if role == "Senior":
+        conn.execute("INSERT INTO seniors (name, age, email, password) VALUES (?, ?, ?, ?)",
+                     (name, age, email, password_hash))
+    elif role == "Provider":
+        conn.execute("INSERT INTO providers (name, age, service_type, email, password) VALUES (?, ?, ?, ?, ?)",
+                     (name, age, service_type, email, password_hash))
+    elif role == "Admin":
+        conn.execute("INSERT INTO admin (email, password, admin_key) VALUES (?, ?, ?)",
+                     (email, password_hash, admin_key))
+
+
+_pool = None
+
+
+def _login_pool():
+    global _pool
+    if _pool is None:
+        _pool = concurrent.futures.ThreadPoolExecutor(max_workers=LOGIN_WORKERS,
+                                                      thread_name_prefix="login")
+    return _pool
+
+
+def login_async(role, email, password):
+    # Returns a Future resolving to the user id, or None for bad credentials
+    if role not in ROLE_TABLES:
+        raise ValueError("Invalid role selected!")
+    return _login_pool().submit(check_login, role, email, password)
+
+
+def signup_async(role, name, age, email, password, service_type=None, admin_key=None):
+    # Returns a Future that resolves once the user is saved
+    if role not in ROLE_TABLES:
+        raise ValueError("Invalid user type!")
+    return _login_pool().submit(create_user, role, name, age, email, password, service_type, admin_key)
+
+
+def hash_many(passwords):
+    # Bulk imports hash on all the login workers at once
+    return list(_login_pool().map(hash_password, passwords))
+
+
+# -------------------------
+# Login Benchmark
+# -------------------------
+# python auth.py --bench [iterations ...]
+# Reports single-login latency and parallel throughput for each cost setting.
+def benchmark(iteration_settings, logins=32, workers=LOGIN_WORKERS):
+    print(f"{'iterations':>10} {'latency ms':>11} {'logins/s':>9}  ({workers} workers, {logins} logins)")
+    for iterations in iteration_settings:
+        stored = hash_password("benchmark-password", iterations)
+
+        started = time.perf_counter()
+        verify_password("benchmark-password", stored, iterations)
+        latency = time.perf_counter() - started
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            started = time.perf_counter()
+            list(pool.map(lambda _: verify_password("benchmark-password", stored, iterations), range(logins)))
+            throughput = logins / (time.perf_counter() - started)
+        print(f"{iterations:>10} {latency * 1000:>11.1f} {throughput:>9.1f}")
+
+
+if __name__ == "__main__":
+    if "--bench" in sys.argv:
+        settings = [int(arg) for arg in sys.argv[2:]] or [50_000, 100_000, 200_000, 400_000]
+        benchmark(settings)
+    else:
+        print("usage: python auth.py --bench [iterations ...]")
@@ -0,0 +1,326 @@
+import argparse
+import concurrent.futures
+import datetime
+import json
+import math
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+
+import analytics
+import catalog
+import matching
+import seed
+import statements
+from api_client import LocalBackend
+from database import get_connection, get_read_connection
+from paging import KeysetPager, fetch_page
+
+# -------------------------
+# Benchmark Suite
+# -------------------------
+# python bench.py [--scales 1000 10000 100000 1000000] [--providers 100000] [--out report.json] [--compare old.json]
+#
+# Times each real data path the dashboards use, headlessly, against seeded
+# databases (seed.py) of each scale, where scale is the number of bookings.
+# --providers times location matching (matching.py) against databases of that
+# many providers, with their services and ratings but no bookings, next to
+# the same search done by measuring the distance to every provider.
+# The seeded databases are kept in DATA_DIR and reused by later runs. The
+# write paths (bookings, ratings, mark_paid) would grow them, so each run
+# times a fresh copy of the seeded database and every run measures the same
+# data. The 1M scale takes several minutes to seed the first time. After the
+# writes, which end by deleting services, the analytics rollups of the copy
+# are checked against a recomputation (analytics.py --check), and the run
+# exits 1 if they differ. The report is JSON with one entry per (scale,
+# path); --compare checks it against an earlier report and exits 1 if any
+# path's median got more than --threshold slower, so runs from two commits
+# can be compared directly.
+
+DATA_DIR = "bench_data"
+DEFAULT_SCALES = [1_000, 10_000, 100_000, 1_000_000]
+RUNS = 10
+THRESHOLD = 0.25
+MIN_DELTA_MS = 0.5  # smaller changes are timer noise, whatever the percentage
+CONCURRENT_WRITERS = 8
+MATCHING_RADII_KM = [10, 25, 50]
+MATCHING_SENIORS = 1_000
+
+
+def bench_db(scale, random_seed=0):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f"bench_{scale}_seed{random_seed}.db")
+    if not os.path.exists(path):
+        started = time.perf_counter()
+        seed.seed_file(path, seed.default_sizes(scale), random_seed)
+        print(f"seeded {path} in {time.perf_counter() - started:.1f}s")
+    return path
+
+
+def work_copy(path):
+    # A copy of the seeded database for this run to write to; any copy left
+    # by an earlier run is replaced. The seeded database is brought up to the
+    # current schema first, so new migrations run once rather than per copy.
+    get_connection(path)
+    copy = path[:-len(".db")] + "-run.db"
+    for stale in (copy, copy + "-wal", copy + "-shm"):
+        if os.path.exists(stale):
+            os.remove(stale)
+    source, target = sqlite3.connect(path), sqlite3.connect(copy)
+    source.backup(target)
+    source.close()
+    target.close()
+    return copy
+
+
+def matching_db(providers, random_seed=0):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f"providers_{providers}_seed{random_seed}.db")
+    if not os.path.exists(path):
+        started = time.perf_counter()
+        seed.seed_file(path, {"seniors": MATCHING_SENIORS, "providers": providers, "services": providers * 3,
+                              "bookings": 0, "ratings": providers}, random_seed)
+        print(f"seeded {path} in {time.perf_counter() - started:.1f}s")
+    return path
+
+
+def pick_subjects(conn):
+    # The busiest senior and provider are the worst case for their dashboards
+    senior_id = conn.execute("SELECT senior_id FROM bills GROUP BY senior_id ORDER BY COUNT(*) DESC LIMIT 1").fetchone()[0]
+    provider_id = conn.execute("SELECT provider_id FROM bills GROUP BY provider_id ORDER BY COUNT(*) DESC LIMIT 1").fetchone()[0]
+    service_id = conn.execute("SELECT id FROM services WHERE provider_id=? LIMIT 1", (provider_id,)).fetchone()[0]
+    last_day = conn.execute("SELECT MAX(booking_date) FROM bookings").fetchone()[0]
+    return senior_id, provider_id, service_id, datetime.date.fromisoformat(last_day)
+
+
+def data_paths(path):
+    # name -> function(run number) returning the rows it produced (or 1 for a write)
+    backend = LocalBackend(path)
+    senior_id, provider_id, service_id, last_day = pick_subjects(get_connection(path))
+    booked = []
+
+    def book_service(run):
+        # A fresh day for every run, after everything already booked
+        day = last_day + datetime.timedelta(days=len(booked) + 1)
+        booked.append(backend.book_service(senior_id, service_id, day.day, day.month, day.year)[0])
+        return 1
+
+    pool = concurrent.futures.ThreadPoolExecutor(max_workers=CONCURRENT_WRITERS)
+
+    def book_concurrently(run):
+        # CONCURRENT_WRITERS seniors booking at the same moment
+        days = [last_day + datetime.timedelta(days=len(booked) + 1 + i) for i in range(CONCURRENT_WRITERS)]
+        booked.extend(booking_id for booking_id, bill_id in pool.map(
+            lambda day: backend.book_service(senior_id, service_id, day.day, day.month, day.year), days))
+        return CONCURRENT_WRITERS
+
+    def mark_paid(run):
+        backend.mark_booking_paid(provider_id, booked[run % len(booked)])
+        return 1
+
+    # The most booked services go first, one per run; their bookings stay
+    busiest = get_connection(path).execute("""
+        SELECT s.provider_id, s.id FROM services s
+        JOIN service_rank r ON r.service_id = s.id
+        ORDER BY r.bookings DESC, s.id
+    """).fetchall()
+
+    def delete_service(run):
+        backend.delete_service(*busiest[run + 1])
+        return 1
+
+    # A dashboard patching 20 changed bookings, and polling with nothing new
+    changed = [booking_id for booking_id, *rest in backend.provider_bookings(provider_id)[:20]]
+    latest = []
+
+    def live_poll(run):
+        if run < 0:  # the warm-up run, after the writes above
+            latest.append(backend.changes_since()["seq"])
+        return len(backend.changes_since(latest[-1])["bookings"])
+
+    def admin_first_page(table, columns, pk, sort_col=None, filter_col=None, filter_text=""):
+        pager = KeysetPager(None, table, columns, pk, [sort_col] if sort_col else (), [filter_col] if filter_col else ())
+        pager.reset(sort_col, filter_col=filter_col, filter_text=filter_text)
+        return lambda run: len(fetch_page(*pager.page_query(), path))
+
+    return {
+        "load_services (browse)": lambda run: len(backend.search_services("")),
+        "load_services (search)": lambda run: len(backend.search_services("nurs")),
+        "load_services (facets)": lambda run: len(backend.search_services(
+            "", service_type="Nursing", min_price=50, max_price=300, min_rating=3)),
+        "top services by type (uncached)": lambda run: len(catalog.search_services(
+            get_read_connection(path), "", service_type="Nursing", limit=10)),
+        "load_services (nearby 25 km)": lambda run: len(backend.nearby_services(senior_id, 25)),
+        "load_bills": lambda run: len(backend.senior_bills(senior_id)),
+        "load_bookings (senior, upcoming)": lambda run: len(backend.senior_bookings(senior_id, "Upcoming")),
+        "load_bookings (provider, all)": lambda run: len(backend.provider_bookings(provider_id, "All")),
+        "show_available_dates": lambda run: len(backend.next_available_dates(service_id)),
+        "book_service": book_service,
+        f"book_service ({CONCURRENT_WRITERS} concurrent)": book_concurrently,
+        "submit_rating": lambda run: backend.submit_rating(senior_id, provider_id, 5) or 1,
+        "mark_paid": mark_paid,
+        "live poll (idle)": live_poll,
+        "live patch (provider, 20 rows)": lambda run: len(backend.provider_bookings(
+            provider_id, "All", booking_ids=changed, bill_ids=[])),
+        "monthly statements (senior)": lambda run: len(backend.senior_statements(senior_id)),
+        "balance (senior)": lambda run: len([backend.senior_balance(senior_id)]),
+        "balance (provider)": lambda run: len([backend.provider_balance(provider_id)]),
+        "payouts (provider, 12 months)": lambda run: len(backend.provider_payouts(
+            provider_id, *statements.recent_months(today=last_day))),
+        "admin analytics (last 12 months)": lambda run: len(analytics.report(
+            get_read_connection(path), *analytics.period_range("Last 12 months", last_day))["monthly"]),
+        "admin analytics (all time)": lambda run: len(analytics.report(get_read_connection(path))["monthly"]),
+        "admin load bills": admin_first_page("bills", ["bill_id", "status", "senior_id", "provider_id", "amount"], "bill_id"),
+        "admin load bookings": admin_first_page(
+            "bookings", ["booking_id", "senior_id", "service_id", "day", "month", "year", "bill_id"], "booking_id"),
+        "admin services sorted by price": admin_first_page(
+            "services", ["id", "service_name", "provider_id", "service_description", "payment_amount"], "id",
+            "payment_amount"),
+        "admin seniors filtered by email": admin_first_page(
+            "seniors", ["id", "name", "age", "email", "password", "latitude", "longitude"], "id",
+            filter_col="email", filter_text="senior1"),
+        # Last, so the paths above all see every service
+        "delete_service": delete_service,
+    }
+
+
+# What the grid index saves: every provider of the type is read and its
+# distance measured, with the same formula as matching.NEARBY_SERVICES
+EVERY_PROVIDER = """
+    SELECT s.id, s.service_name, p.name, p.rating, s.payment_amount,
+           p.latitude, p.longitude, p.service_radius_km, r.score
+    FROM providers p
+    JOIN services s ON s.provider_id = p.id
+    JOIN service_rank r ON r.service_id = s.id
+    WHERE p.service_type = ? AND p.latitude IS NOT NULL
+"""
+
+
+def scan_nearby(conn, latitude, longitude, radius_km, service_type, limit=catalog.TOP_K):
+    scale = math.cos(math.radians(latitude)) ** 2
+    found = []
+    for *row, lat, lon, radius, score in conn.execute(EVERY_PROVIDER, (service_type,)):
+        km = math.sqrt((lat - latitude) ** 2 + (lon - longitude) ** 2 * scale) * matching.KM_PER_DEGREE
+        if km <= radius_km and (radius is None or km <= radius):
+            found.append((-score, km, row))
+    return [row for score, km, row in sorted(found)[:limit]]
+
+
+def matching_paths(path):
+    senior_id = 1
+    latitude, longitude = matching.senior_location(get_connection(path), senior_id)
+
+    def nearby(radius_km, text="", service_type=None):
+        return lambda run: len(matching.nearby_services(get_read_connection(path), senior_id, radius_km, text,
+                                                        service_type=service_type))
+
+    paths = {f"nearby {km} km (Nursing)": nearby(km, service_type="Nursing") for km in MATCHING_RADII_KM}
+    paths["nearby 25 km (any type)"] = nearby(25)
+    paths["nearby 25 km (search)"] = nearby(25, "nurs")
+    paths["distance to every provider (25 km)"] = lambda run: len(scan_nearby(
+        get_read_connection(path), latitude, longitude, 25, "Nursing"))
+    return paths
+
+
+def time_path(fn, runs):
+    fn(-1)  # warm the page cache and statement cache
+    timings, rows = [], 0
+    for run in range(runs):
+        started = time.perf_counter()
+        rows = fn(run)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "rows": rows,
+        "median_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        "min_ms": round(timings[0], 3),
+        "max_ms": round(timings[-1], 3),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(scales, runs=RUNS, random_seed=0, providers=()):
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "runs": runs,
+        "results": [],
+        "rollup_problems": {},
+    }
+    for scale in scales:
+        path = work_copy(bench_db(scale, random_seed))
+        print(f"\n{scale:,} bookings ({path})")
+        print(f"  {'path':<34} {'rows':>7} {'median ms':>10} {'p95 ms':>9}")
+        for name, fn in data_paths(path).items():
+            result = time_path(fn, runs)
+            report["results"].append({"scale": scale, "path": name, **result})
+            print(f"  {name:<34} {result['rows']:>7} {result['median_ms']:>10.2f} {result['p95_ms']:>9.2f}")
+        problems = analytics.check_rollups(get_connection(path))
+        for table, diffs in problems.items():
+            print(f"  {table}: {len(diffs)} rows differ from the history after the writes")
+            report["rollup_problems"][f"{scale}/{table}"] = len(diffs)
+    for count in providers:
+        path = matching_db(count, random_seed)
+        print(f"\n{count:,} providers ({path})")
+        print(f"  {'path':<34} {'rows':>7} {'median ms':>10} {'p95 ms':>9}")
+        for name, fn in matching_paths(path).items():
+            result = time_path(fn, runs)
+            report["results"].append({"scale": count, "path": name, **result})
+            print(f"  {name:<34} {result['rows']:>7} {result['median_ms']:>10.2f} {result['p95_ms']:>9.2f}")
+    return report
+
+
+def compare(report, baseline, threshold=THRESHOLD):
+    # Returns the (scale, path, old ms, new ms) entries that got slower
+    old = {(r["scale"], r["path"]): r["median_ms"] for r in baseline["results"]}
+    slower = []
+    print(f"\ncompared with {baseline.get('commit') or 'baseline'} ({baseline.get('created')})")
+    for r in report["results"]:
+        before = old.get((r["scale"], r["path"]))
+        if before is None:
+            continue
+        change = (r["median_ms"] - before) / before if before else 0
+        flag = "SLOWER" if change > threshold and r["median_ms"] - before > MIN_DELTA_MS else ""
+        if flag:
+            slower.append((r["scale"], r["path"], before, r["median_ms"]))
+        print(f"  {r['scale']:>9,} {r['path']:<34} {before:>9.2f} -> {r['median_ms']:>9.2f} ms {change:>+7.0%} {flag}")
+    return slower
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the dashboard data paths at several scales")
+    parser.add_argument("--scales", type=int, nargs="*", default=DEFAULT_SCALES, help="bookings per database")
+    parser.add_argument("--providers", type=int, nargs="*", default=[],
+                        help="providers per location matching database")
+    parser.add_argument("--runs", type=int, default=RUNS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench_report.json")
+    parser.add_argument("--compare", help="an earlier report to compare against")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="fractional slowdown of a median that counts as a regression")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.scales, args.runs, args.seed, args.providers)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nwrote {args.out}")
+    if report["rollup_problems"]:
+        sys.exit(1)
+    if args.compare:
+        with open(args.compare) as f:
+            if compare(report, json.load(f), args.threshold):
+                sys.exit(1)
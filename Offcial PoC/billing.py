@@ -0,0 +1,85 @@
+import bookings
+from changes import id_list
+
+# -------------------------
+# Bill Operations
+# -------------------------
+# Reads and status changes on bills, shared by the dashboards and the API
+# server. Seniors can only pay their own bills and providers can only settle
+# bills for bookings on their own services.
+
+SENIOR_BILLS = """
+    SELECT b.bill_id, p.name AS provider_name, b.amount, b.status
+    FROM bills b
+    JOIN providers p ON b.provider_id = p.id
+    WHERE b.senior_id = ?
+"""
+
+
+# The same bills without the join, for callers that already hold the
+# provider names (catalog_cache.py); idx_bills_senior covers it.
+SENIOR_BILL_ROWS = """
+    SELECT b.bill_id, b.provider_id, b.amount, b.status
+    FROM bills b
+    WHERE b.senior_id = ?
+"""
+
+# Only the given bills (a JSON array) of the senior, looked up by key, for
+# patching the dashboard after a change (changes.py)
+SENIOR_BILL_CHANGES = """
+    SELECT b.bill_id, p.name AS provider_name, b.amount, b.status
+    FROM json_each(?) changed
+    CROSS JOIN bills b ON b.bill_id = changed.value
+    JOIN providers p ON b.provider_id = p.id
+    WHERE b.senior_id = ?
+"""
+
+
+def senior_bills(conn, senior_id, provider_names=None, bill_ids=None):
+    if bill_ids is not None:
+        # A handful of rows, where the join costs no more than the name map
+        return conn.execute(SENIOR_BILL_CHANGES, (id_list(bill_ids), senior_id)).fetchall()
+    if provider_names is None:
+        return conn.execute(SENIOR_BILLS, (senior_id,)).fetchall()
+    rows = conn.execute(SENIOR_BILL_ROWS, (senior_id,)).fetchall()
+    # Each distinct provider is looked up once. Bills of providers that no
+    # longer exist are left out, as the join does.
+    names = {provider_id: provider_names.get(provider_id) for provider_id in {row[1] for row in rows}}
+    return [(bill_id, names[provider_id], amount, status)
+            for bill_id, provider_id, amount, status in rows if names[provider_id] is not None]
+
+
+def pay_bills(conn, senior_id, bill_ids):
+    # All the selected bills are paid, or none are: raising undoes the
+    # updates on the write queue (writer.py)
+    bill_ids = sorted(set(bill_ids))
+    cur = conn.executemany("UPDATE bills SET status='Paid' WHERE bill_id=? AND senior_id=?",
+                           [(bill_id, senior_id) for bill_id in bill_ids])
+    if cur.rowcount != len(bill_ids):
+        raise LookupError("Bill not found" if len(bill_ids) == 1 else "Some of these bills were not found")
+    return len(bill_ids)
+
+
+def pay_bill(conn, senior_id, bill_id):
+    pay_bills(conn, senior_id, [bill_id])
+
+
+def mark_booking_paid(conn, provider_id, booking_id):
+    bill_id = bookings.booking_bill(conn, provider_id, booking_id)
+    if bill_id is None:
+        raise LookupError("No bill found for this booking")
+    conn.execute("UPDATE bills SET status='Paid' WHERE bill_id=?", (bill_id,))
+    return bill_id
+
+
+def mark_bookings_paid(conn, provider_id, booking_ids):
+    booking_ids = sorted(set(booking_ids))
+    cur = conn.executemany("""
+        UPDATE bills SET status='Paid'
+        WHERE bill_id = (SELECT b.bill_id FROM bookings b
+                         JOIN services s ON b.service_id = s.id
+                         WHERE b.booking_id = ? AND s.provider_id = ?)
+    """, [(booking_id, provider_id) for booking_id in booking_ids])
+    if cur.rowcount != len(booking_ids):
+        raise LookupError("No bill found for some of these bookings")
+    return len(booking_ids)
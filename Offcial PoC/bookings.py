@@ -0,0 +1,238 @@
+import datetime
+
+from changes import id_list
+
+# -------------------------
+# Booking Operations
+# -------------------------
+# Shared by the senior and provider dashboards so the booking and the bill it
+# creates are always written together and linked by bookings.bill_id.
+
+
+def book_service(conn, senior_id, service_id, day, month, year):
+    # Runs on the write queue (writer.py), whose BEGIN IMMEDIATE holds the
+    # write lock, so the capacity check in the bookings trigger and both
+    # inserts see one consistent state even when several senior apps book the
+    # same provider at once. If either insert fails, both are undone.
+    try:
+        datetime.date(year, month, day)
+    except ValueError:
+        raise ValueError(f"{day}/{month}/{year} is not a valid date")
+
+    service = conn.execute("SELECT provider_id, payment_amount FROM services WHERE id=?",
+                           (service_id,)).fetchone()
+    if not service:
+        raise LookupError("Service not found")
+    provider_id, amount = service
+
+    cur = conn.execute("INSERT INTO bills (status, senior_id, provider_id, amount) VALUES (?,?,?,?)",
+                       ("Pending", senior_id, provider_id, amount))
+    bill_id = cur.lastrowid
+    cur = conn.execute("INSERT INTO bookings (senior_id, service_id, day, month, year, bill_id) VALUES (?,?,?,?,?,?)",
+                       (senior_id, service_id, day, month, year, bill_id))
+    return cur.lastrowid, bill_id
+
+
+def booking_bill(conn, provider_id, booking_id):
+    # Only bookings on this provider's own services can be settled by them
+    row = conn.execute("""
+        SELECT b.bill_id FROM bookings b
+        JOIN services s ON b.service_id = s.id
+        WHERE b.booking_id = ? AND s.provider_id = ?
+    """, (booking_id, provider_id)).fetchone()
+    return row[0] if row else None
+
+
+# -------------------------
+# Availability
+# -------------------------
+# provider_day_load only has rows for days with bookings, and its primary key
+# is (provider_id, booking_date), so the full days from a start date onwards
+# come back in date order from one index range read. Free days are the gaps.
+
+FULL_DAYS = """
+    SELECT l.booking_date
+    FROM provider_day_load l JOIN providers p ON p.id = l.provider_id
+    WHERE l.provider_id = ? AND l.booking_date >= ? AND l.booked >= p.daily_capacity
+    ORDER BY l.booking_date
+"""
+
+
+def next_available_dates(conn, service_id, count=5, start=None):
+    row = conn.execute("""
+        SELECT s.provider_id, p.daily_capacity
+        FROM services s LEFT JOIN providers p ON p.id = s.provider_id
+        WHERE s.id = ?
+    """, (service_id,)).fetchone()
+    if not row:
+        raise LookupError("Service not found")
+    # With a capacity of 0 every day is full, booked or not
+    if row[1] is not None and row[1] <= 0:
+        return []
+    day = start or datetime.date.today()
+
+    # Walk the calendar, skipping full days as they come off the cursor; we
+    # stop after `count` free days, never reading the rest of the history.
+    full_days = (datetime.date.fromisoformat(d) for (d,) in conn.execute(FULL_DAYS, (row[0], day.isoformat())))
+    next_full = next(full_days, None)
+    available = []
+    while len(available) < count:
+        if day == next_full:
+            next_full = next(full_days, None)
+        else:
+            available.append(day)
+        day += datetime.timedelta(days=1)
+    return available
+
+
+def rebuild_provider_day_load(conn):
+    # Recompute the per-day load from bookings, e.g. after services changed
+    # provider by hand. A write queue operation, so it commits as a whole.
+    conn.execute("DELETE FROM provider_day_load")
+    conn.execute("""
+        INSERT INTO provider_day_load (provider_id, booking_date, booked)
+        SELECT s.provider_id, b.booking_date, COUNT(*)
+        FROM bookings b JOIN services s ON b.service_id = s.id
+        GROUP BY s.provider_id, b.booking_date
+    """)
+
+
+# -------------------------
+# Date Range Queries
+# -------------------------
+# bookings.booking_date is an ISO date (YYYY-MM-DD) indexed together with
+# service_id and senior_id, so every view below is an index range read. Open
+# ends are filled in with the smallest/largest date to keep one SQL text per
+# view (and one cached prepared statement).
+
+MIN_DATE = "0001-01-01"
+MAX_DATE = "9999-12-31"
+
+VIEWS = ("All", "Upcoming", "Past", "Between")
+
+PROVIDER_BOOKINGS = """
+    SELECT b.booking_id, s2.name AS senior_name, s1.service_name, b.booking_date,
+           COALESCE(bi.status, 'No Bill') AS bill_status
+    FROM services s1
+    JOIN bookings b ON b.service_id = s1.id
+    JOIN seniors s2 ON b.senior_id = s2.id
+    LEFT JOIN bills bi ON bi.bill_id = b.bill_id
+    WHERE s1.provider_id = ? AND b.booking_date BETWEEN ? AND ?
+    ORDER BY b.booking_date {order}, b.booking_id {order}
+"""
+
+SENIOR_BOOKINGS = """
+    SELECT b.booking_id, s.service_name, p.name AS provider_name, b.booking_date,
+           COALESCE(bi.status, 'No Bill') AS bill_status
+    FROM bookings b
+    JOIN services s ON b.service_id = s.id
+    JOIN providers p ON s.provider_id = p.id
+    LEFT JOIN bills bi ON bi.bill_id = b.bill_id
+    WHERE b.senior_id = ? AND b.booking_date BETWEEN ? AND ?
+    ORDER BY b.booking_date {order}, b.booking_id {order}
+"""
+
+
+# The rows of a view among the given bookings, plus the bookings of the given
+# bills, for patching a dashboard after a change (changes.py). The id lists
+# are JSON arrays; CROSS JOIN makes SQLite start from the changed ids and
+# look each booking up by key instead of walking the whole view.
+CHANGED_BOOKINGS = """
+    WITH changed(booking_id) AS (
+        SELECT value FROM json_each(?)
+        UNION SELECT booking_id FROM bookings WHERE bill_id IN (SELECT value FROM json_each(?))
+    )
+"""
+
+PROVIDER_BOOKING_CHANGES = CHANGED_BOOKINGS + """
+    SELECT b.booking_id, s2.name AS senior_name, s1.service_name, b.booking_date,
+           COALESCE(bi.status, 'No Bill') AS bill_status
+    FROM changed
+    CROSS JOIN bookings b ON b.booking_id = changed.booking_id
+    JOIN services s1 ON b.service_id = s1.id
+    JOIN seniors s2 ON b.senior_id = s2.id
+    LEFT JOIN bills bi ON bi.bill_id = b.bill_id
+    WHERE s1.provider_id = ? AND b.booking_date BETWEEN ? AND ?
+"""
+
+SENIOR_BOOKING_CHANGES = CHANGED_BOOKINGS + """
+    SELECT b.booking_id, s.service_name, p.name AS provider_name, b.booking_date,
+           COALESCE(bi.status, 'No Bill') AS bill_status
+    FROM changed
+    CROSS JOIN bookings b ON b.booking_id = changed.booking_id
+    JOIN services s ON b.service_id = s.id
+    JOIN providers p ON s.provider_id = p.id
+    LEFT JOIN bills bi ON bi.bill_id = b.bill_id
+    WHERE b.senior_id = ? AND b.booking_date BETWEEN ? AND ?
+"""
+
+
+def parse_date(text):
+    # Accepts the D/M/YYYY format used across the dashboards, or ISO dates
+    text = text.strip()
+    try:
+        if "/" in text:
+            day, month, year = (int(part) for part in text.split("/"))
+            return datetime.date(year, month, day)
+        return datetime.date.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f"{text!r} is not a valid date (use D/M/YYYY)")
+
+
+def format_date(iso_date):
+    year, month, day = iso_date.split("-")
+    return f"{int(day)}/{int(month)}/{int(year)}"
+
+
+def view_range(view, start=None, end=None, today=None):
+    # Returns (start, end, descending) for one of VIEWS
+    today = today or datetime.date.today()
+    if view == "Upcoming":
+        return today, None, False
+    if view == "Past":
+        return None, today - datetime.timedelta(days=1), True
+    if view == "Between":
+        return start, end, False
+    return None, None, True
+
+
+def _bounds(start, end):
+    return (start.isoformat() if start else MIN_DATE,
+            end.isoformat() if end else MAX_DATE)
+
+
+def provider_bookings(conn, provider_id, start=None, end=None, descending=True, booking_ids=None, bill_ids=None):
+    if booking_ids is not None or bill_ids is not None:
+        # Only the changed rows, in no particular order
+        return conn.execute(PROVIDER_BOOKING_CHANGES, (id_list(booking_ids or []), id_list(bill_ids or []),
+                                                       provider_id, *_bounds(start, end))).fetchall()
+    query = PROVIDER_BOOKINGS.format(order="DESC" if descending else "ASC")
+    return conn.execute(query, (provider_id, *_bounds(start, end))).fetchall()
+
+
+def senior_bookings(conn, senior_id, start=None, end=None, descending=True, booking_ids=None, bill_ids=None):
+    if booking_ids is not None or bill_ids is not None:
+        return conn.execute(SENIOR_BOOKING_CHANGES, (id_list(booking_ids or []), id_list(bill_ids or []),
+                                                     senior_id, *_bounds(start, end))).fetchall()
+    query = SENIOR_BOOKINGS.format(order="DESC" if descending else "ASC")
+    return conn.execute(query, (senior_id, *_bounds(start, end))).fetchall()
+
+
+def upcoming_bookings(conn, provider_id=None, senior_id=None, today=None):
+    start, end, descending = view_range("Upcoming", today=today)
+    if provider_id is not None:
+        return provider_bookings(conn, provider_id, start, end, descending)
+    return senior_bookings(conn, senior_id, start, end, descending)
+
+
+def past_bookings(conn, provider_id=None, senior_id=None, today=None):
+    start, end, descending = view_range("Past", today=today)
+    if provider_id is not None:
+        return provider_bookings(conn, provider_id, start, end, descending)
+    return senior_bookings(conn, senior_id, start, end, descending)
+
+
+def bookings_between(conn, start, end, provider_id=None, senior_id=None):
+    if provider_id is not None:
+        return provider_bookings(conn, provider_id, start, end, descending=False)
+    return senior_bookings(conn, senior_id, start, end, descending=False)
@@ -0,0 +1,285 @@
+import csv
+import datetime
+import sqlite3
+import sys
+import time
+
+import auth
+from catalog import SERVICE_TYPES
+from database import DB_PATH
+from writer import get_writer, is_busy
+
+# -------------------------
+# Bulk CSV Import
+# -------------------------
+# python bulk_import.py <seniors|providers|services|bookings> <file.csv>
+#
+# The file is read a batch at a time, never all at once. Each row is checked
+# in Python first; the valid rows of a batch are then inserted with one
+# executemany as one write queue operation (writer.py). If the database
+# rejects the batch (say a duplicate email), that batch is retried row by row
+# under savepoints so only the offending rows are skipped. Every skipped row is reported with its
+# line number and reason; the import itself carries on.
+
+BATCH_SIZE = 500
+OPTIONAL_COLUMNS = ("age", "daily_capacity", "service_description", "latitude", "longitude", "service_radius_km")
+
+
+class RowError(ValueError):
+    pass
+
+
+def _text(row, col, required=True):
+    value = (row.get(col) or "").strip()
+    if required and not value:
+        raise RowError(f"{col} is required")
+    return value or None
+
+
+def _int(row, col, required=True, minimum=None):
+    value = _text(row, col, required)
+    if value is None:
+        return None
+    try:
+        number = int(value)
+    except ValueError:
+        raise RowError(f"{col} must be an integer, got {value!r}")
+    if minimum is not None and number < minimum:
+        raise RowError(f"{col} must be at least {minimum}")
+    return number
+
+
+def _price(row, col):
+    value = _text(row, col)
+    try:
+        price = float(value)
+    except ValueError:
+        raise RowError(f"{col} must be a number, got {value!r}")
+    if price < 0:
+        raise RowError(f"{col} must not be negative")
+    return price
+
+
+def _number(row, col, minimum, maximum):
+    value = _text(row, col, required=False)
+    if value is None:
+        return None
+    try:
+        number = float(value)
+    except ValueError:
+        raise RowError(f"{col} must be a number, got {value!r}")
+    if not minimum <= number <= maximum:
+        raise RowError(f"{col} must be between {minimum} and {maximum}")
+    return number
+
+
+def _location(row):
+    # Optional, but latitude and longitude come together
+    latitude, longitude = _number(row, "latitude", -90, 90), _number(row, "longitude", -180, 180)
+    if (latitude is None) != (longitude is None):
+        raise RowError("latitude and longitude must be given together")
+    return latitude, longitude
+
+
+def _email(row, col):
+    value = _text(row, col)
+    if "@" not in value:
+        raise RowError(f"{col} {value!r} is not an email address")
+    # Kept as written: sign-up stores emails as typed and login matches them
+    # exactly, so an imported user logs in with the address in the file
+    return value
+
+
+# -------------------------
+# Row Parsers
+# -------------------------
+# Each turns one CSV row (a dict) into the tuple that gets inserted, or
+# raises RowError. Passwords are hashed later, a whole batch at a time.
+def parse_senior(row):
+    return (_text(row, "name"), _int(row, "age", required=False, minimum=0),
+            _email(row, "email"), _text(row, "password"), *_location(row))
+
+
+def parse_provider(row):
+    service_type = _text(row, "service_type")
+    if service_type not in SERVICE_TYPES:
+        raise RowError(f"service_type must be one of {', '.join(SERVICE_TYPES)}")
+    capacity = _int(row, "daily_capacity", required=False, minimum=1)
+    return (_text(row, "name"), _int(row, "age", required=False, minimum=0), service_type,
+            _email(row, "email"), _text(row, "password"), capacity if capacity is not None else 3,
+            *_location(row), _number(row, "service_radius_km", 0, 20_000))
+
+
+def parse_service(row):
+    return (_text(row, "service_name"), _int(row, "provider_id"),
+            _text(row, "service_description", required=False), _price(row, "payment_amount"))
+
+
+def parse_booking(row):
+    senior_id, service_id = _int(row, "senior_id"), _int(row, "service_id")
+    day, month, year = _int(row, "day"), _int(row, "month"), _int(row, "year")
+    try:
+        datetime.date(year, month, day)
+    except ValueError:
+        raise RowError(f"{day}/{month}/{year} is not a valid date")
+    return senior_id, service_id, day, month, year
+
+
+# -------------------------
+# Batch Inserts
+# -------------------------
+def _hash_passwords(rows, index):
+    # Rows that already carry a hash (e.g. an export from another install) keep it
+    plain = [i for i, row in enumerate(rows) if not row[index].startswith(auth.HASH_ALGORITHM + "$")]
+    hashed = auth.hash_many([rows[i][index] for i in plain])
+    rows = [list(row) for row in rows]
+    for i, password_hash in zip(plain, hashed):
+        rows[i][index] = password_hash
+    return [tuple(row) for row in rows]
+
+
+def insert_seniors(conn, rows):
+    conn.executemany("INSERT INTO seniors (name, age, email, password, latitude, longitude) VALUES (?,?,?,?,?,?)", rows)
+
+
+def insert_providers(conn, rows):
+    conn.executemany("INSERT INTO providers (name, age, service_type, email, password, daily_capacity, "
+                     "latitude, longitude, service_radius_km) VALUES (?,?,?,?,?,?,?,?,?)", rows)
+
+
+def insert_services(conn, rows):
+    conn.executemany("INSERT INTO services (service_name, provider_id, service_description, payment_amount) "
+                     "VALUES (?,?,?,?)", rows)
+
+
+def insert_bookings(conn, rows):
+    # Each booking gets its Pending bill, like bookings.book_service, and is
+    # linked to the id that bill insert returned
+    bill_ids = []
+    for senior_id, service_id, *_ in rows:
+        cur = conn.execute("""
+            INSERT INTO bills (status, senior_id, provider_id, amount)
+            SELECT 'Pending', ?, provider_id, payment_amount FROM services WHERE id = ?
+        """, (senior_id, service_id))
+        if cur.rowcount != 1:
+            raise sqlite3.IntegrityError(f"could not create a bill for service {service_id}")
+        bill_ids.append(cur.lastrowid)
+    conn.executemany("INSERT INTO bookings (senior_id, service_id, day, month, year, bill_id) VALUES (?,?,?,?,?,?)",
+                     [(*row, bill_id) for row, bill_id in zip(rows, bill_ids)])
+
+
+def check_references(conn, rows, checks):
+    # Foreign keys are not enforced by SQLite here, so look the ids up.
+    # checks: [(tuple index, table)]; returns {row index: error}
+    errors = {}
+    for index, table in checks:
+        ids = sorted({row[index] for row in rows})
+        existing = set()
+        for start in range(0, len(ids), BATCH_SIZE):
+            chunk = ids[start:start + BATCH_SIZE]
+            existing.update(id for (id,) in conn.execute(
+                f"SELECT id FROM {table} WHERE id IN ({', '.join('?' * len(chunk))})", chunk))
+        for i, row in enumerate(rows):
+            if row[index] not in existing and i not in errors:
+                errors[i] = f"{table[:-1]} {row[index]} does not exist"
+    return errors
+
+
+# table -> (CSV columns, row parser, batch inserter, password column, reference checks)
+IMPORTS = {
+    "seniors": (["name", "age", "email", "password", "latitude", "longitude"], parse_senior, insert_seniors, 3, []),
+    "providers": (["name", "age", "service_type", "email", "password", "daily_capacity",
+                   "latitude", "longitude", "service_radius_km"],
+                  parse_provider, insert_providers, 4, []),
+    "services": (["service_name", "provider_id", "service_description", "payment_amount"],
+                 parse_service, insert_services, None, [(1, "providers")]),
+    "bookings": (["senior_id", "service_id", "day", "month", "year"],
+                 parse_booking, insert_bookings, None, [(0, "seniors"), (1, "services")]),
+}
+
+
+def insert_batch(conn, table, batch):
+    # batch: [(line number, values)]; returns (inserted, [(line, error)])
+    _, _, insert, _, checks = IMPORTS[table]
+    errors = []
+    bad = check_references(conn, [values for _, values in batch], checks)
+    for i in sorted(bad):
+        errors.append((batch[i][0], bad[i]))
+    batch = [item for i, item in enumerate(batch) if i not in bad]
+    if not batch:
+        return 0, errors
+
+    try:
+        conn.execute("SAVEPOINT batch")
+        insert(conn, [values for _, values in batch])
+        conn.execute("RELEASE batch")
+        inserted = len(batch)
+    except sqlite3.DatabaseError as e:
+        if is_busy(e):
+            raise  # the write queue retries the whole batch
+        conn.execute("ROLLBACK TO batch")
+        conn.execute("RELEASE batch")
+        inserted = 0
+        for line, values in batch:
+            conn.execute("SAVEPOINT row")
+            try:
+                insert(conn, [values])
+                conn.execute("RELEASE row")
+                inserted += 1
+            except sqlite3.DatabaseError as e:
+                conn.execute("ROLLBACK TO row")
+                conn.execute("RELEASE row")
+                errors.append((line, str(e)))
+    return inserted, errors
+
+
+def import_csv(table, lines, batch_size=BATCH_SIZE, path=DB_PATH):
+    # lines: an open CSV file (with a header row). Returns (inserted, errors)
+    # where errors is a list of (line number, message), sorted by line.
+    if table not in IMPORTS:
+        raise ValueError(f"Cannot import {table!r}; choose one of {', '.join(IMPORTS)}")
+    columns, parse, _, password_index, _ = IMPORTS[table]
+    reader = csv.DictReader(lines)
+    missing = [col for col in columns if col not in (reader.fieldnames or [])
+               and col not in OPTIONAL_COLUMNS]
+    if missing:
+        raise ValueError(f"CSV is missing columns: {', '.join(missing)}")
+
+    inserted, errors, batch = 0, [], []
+
+    def flush():
+        nonlocal inserted
+        rows = [values for _, values in batch]
+        if password_index is not None:
+            rows = _hash_passwords(rows, password_index)
+        count, batch_errors = get_writer(path).call(insert_batch, table,
+                                                    [(line, values) for (line, _), values in zip(batch, rows)])
+        inserted += count
+        errors.extend(batch_errors)
+        batch.clear()
+
+    for row in reader:
+        try:
+            batch.append((reader.line_num, parse(row)))
+        except RowError as e:
+            errors.append((reader.line_num, str(e)))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    errors.sort()
+    return inserted, errors
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] not in IMPORTS:
+        print(f"usage: python bulk_import.py <{'|'.join(IMPORTS)}> <file.csv>")
+        sys.exit(2)
+    started = time.perf_counter()
+    with open(sys.argv[2], newline="", encoding="utf-8") as f:
+        inserted, errors = import_csv(sys.argv[1], f)
+    for line, message in errors:
+        print(f"line {line}: {message}")
+    print(f"{inserted} {sys.argv[1]} imported, {len(errors)} rows skipped "
+          f"in {time.perf_counter() - started:.2f}s")
+    sys.exit(1 if errors else 0)
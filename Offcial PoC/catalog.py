@@ -0,0 +1,117 @@
+import re
+
+from changes import id_list
+
+# -------------------------
+# Service Catalog Search
+# -------------------------
+# Text search goes through the services_fts index (migration 7); facets
+# filter on provider type, price and rating. Only the top `limit` matches are
+# returned, best text match first, so typing in the search box stays fast no
+# matter how large the catalog gets. Browsing without search text lists the
+# best-scored services first (ranking.py).
+
+SERVICE_TYPES = ["Nursing", "Transportation", "Food and Dinery", "Companion"]
+
+TOP_K = 50
+
+# Unused price/rating facets are bound as wide-open bounds, so there is one
+# SQL text per (text search?, type filter?) combination and each stays a
+# cached prepared statement. The type filter is spliced in rather than written
+# as ":type IS NULL OR ..." so SQLite can use an index on the type.
+FACETS = """
+    {type_filter}
+    AND s.payment_amount BETWEEN :min_price AND :max_price
+    AND p.rating >= :min_rating
+"""
+
+TYPE_FILTER = "AND p.service_type = :service_type"
+RANKED_TYPE_FILTER = "AND r.service_type = :service_type"
+
+TEXT_SEARCH = """
+    SELECT s.id, s.service_name, p.name AS provider_name, p.rating, s.payment_amount
+    FROM services_fts
+    JOIN services s ON s.id = services_fts.rowid
+    JOIN providers p ON p.id = s.provider_id
+    WHERE services_fts MATCH :match
+""" + FACETS + """
+    ORDER BY services_fts.rank
+    LIMIT :limit
+"""
+
+# Without search text, service_rank is walked best score first (within the
+# type through idx_service_rank_type_score) and the LIMIT stops the walk
+# early. CROSS JOIN keeps it the outer loop, so a selective price range does
+# not tempt SQLite into reading every service in it and sorting them.
+FACET_SEARCH = """
+    SELECT s.id, s.service_name, p.name AS provider_name, p.rating, s.payment_amount
+    FROM service_rank r
+    CROSS JOIN services s ON s.id = r.service_id
+    CROSS JOIN providers p ON p.id = s.provider_id
+    WHERE 1
+""" + FACETS + """
+    ORDER BY r.score DESC
+    LIMIT :limit
+"""
+
+
+def match_expression(text):
+    # Every word must match, and the last one may be half typed, so each word
+    # becomes a quoted prefix query: nurs -> "nurs"*
+    words = re.findall(r"\w+", text.lower())
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def facet_params(service_type=None, min_price=None, max_price=None, min_rating=None, limit=TOP_K):
+    # Bound parameters for FACETS and the LIMIT
+    params = {
+        "min_price": min_price if min_price is not None else float("-inf"),
+        "max_price": max_price if max_price is not None else float("inf"),
+        "min_rating": min_rating if min_rating is not None else 0,
+        "limit": limit,
+    }
+    if service_type:
+        params["service_type"] = service_type
+    return params
+
+
+def search_services(conn, text="", service_type=None, min_price=None, max_price=None,
+                    min_rating=None, limit=TOP_K):
+    params = facet_params(service_type, min_price, max_price, min_rating, limit)
+    type_filter = TYPE_FILTER if service_type else ""
+
+    match = match_expression(text)
+    if match:
+        query = TEXT_SEARCH.format(type_filter=type_filter)
+        return conn.execute(query, {**params, "match": match}).fetchall()
+    type_filter = RANKED_TYPE_FILTER if service_type else ""
+    return conn.execute(FACET_SEARCH.format(type_filter=type_filter), params).fetchall()
+
+
+# -------------------------
+# Provider Services
+# -------------------------
+PROVIDER_SERVICES = """
+    SELECT id, service_name, service_description, payment_amount
+    FROM services WHERE provider_id=?
+"""
+
+
+def provider_services(conn, provider_id, service_ids=None):
+    if service_ids is not None:
+        # Only these services (changes.py)
+        return conn.execute(PROVIDER_SERVICES + "AND id IN (SELECT value FROM json_each(?))",
+                            (provider_id, id_list(service_ids))).fetchall()
+    return conn.execute(PROVIDER_SERVICES, (provider_id,)).fetchall()
+
+
+def add_service(conn, provider_id, name, description, price):
+    cur = conn.execute("INSERT INTO services (service_name, provider_id, service_description, payment_amount) VALUES (?,?,?,?)",
+                       (name, provider_id, description, price))
+    return cur.lastrowid
+
+
+def delete_service(conn, provider_id, service_id):
+    cur = conn.execute("DELETE FROM services WHERE id=? AND provider_id=?", (service_id, provider_id))
+    if cur.rowcount == 0:
+        raise LookupError("Service not found")
@@ -0,0 +1,185 @@
+import bisect
+import collections
+import sys
+import threading
+from array import array
+
+import catalog
+from database import DB_PATH, get_read_connection
+
+# -------------------------
+# Catalog Cache
+# -------------------------
+# The service catalog is read far more often than it changes, so each process
+# keeps what it has read of it: search results (browse, facets and text
+# searches), each provider's service list, and the provider id -> name map
+# that lets senior_bills skip its join with providers.
+#
+# Staleness is checked on every read in two steps. PRAGMA data_version on the
+# thread's read connection only changes when some other connection (in this
+# process or another) has committed, so most reads stop there. When it has
+# changed, the catalog_version counter (migration 9) says whether the commit
+# touched the catalog; bookings and bills do not, so they leave the cache be.
+# A catalog change drops everything at once.
+#
+# Search results and service lists are LRU-bounded; the name map holds every
+# provider, as two column arrays, which is a few bytes per provider.
+
+SEARCH_ENTRIES = 256
+PROVIDER_ENTRIES = 128
+
+CATALOG_VERSION = "SELECT version FROM catalog_version WHERE id = 1"
+PROVIDER_NAMES = "SELECT id, name FROM providers ORDER BY id"
+
+
+class ProviderNames:
+    __slots__ = ("ids", "names")
+
+    def __init__(self, rows):
+        self.ids = array("q")
+        self.names = []
+        for provider_id, name in rows:
+            self.ids.append(provider_id)
+            self.names.append(name)
+
+    def get(self, provider_id, default=None):
+        i = bisect.bisect_left(self.ids, provider_id)
+        if i < len(self.ids) and self.ids[i] == provider_id:
+            return self.names[i]
+        return default
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def _size(value):
+    # Rough deep size of the cached rows: containers plus their contents
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(_size(item) for item in value)
+    if isinstance(value, ProviderNames):
+        return sys.getsizeof(value.ids) + _size(value.names)
+    return sys.getsizeof(value)
+
+
+class CatalogCache:
+    def __init__(self, path=DB_PATH, search_entries=SEARCH_ENTRIES, provider_entries=PROVIDER_ENTRIES):
+        self.path = path
+        self.search_entries = search_entries
+        self.provider_entries = provider_entries
+        self.lock = threading.Lock()
+        self.local = threading.local()  # (connection, data_version, catalog version) last seen by this thread
+        self.version = None
+        self.searches = collections.OrderedDict()
+        self.services = collections.OrderedDict()
+        self.names = None
+        self.counts = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+    def current_version(self, conn):
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        seen = getattr(self.local, "seen", None)
+        if seen is not None and seen[0] is conn and seen[1] == data_version:
+            return seen[2]
+        version = conn.execute(CATALOG_VERSION).fetchone()[0]
+        self.local.seen = (conn, data_version, version)
+        return version
+
+    def check(self, conn):
+        # Returns the catalog version this read is for, clearing older data
+        version = self.current_version(conn)
+        with self.lock:
+            if self.version is None or version > self.version:
+                if self.version is not None:
+                    self.counts["invalidations"] += 1
+                self.version = version
+                self.searches.clear()
+                self.services.clear()
+                self.names = None
+        return version
+
+    def lookup(self, entries, key, version):
+        with self.lock:
+            if version == self.version and key in entries:
+                entries.move_to_end(key)
+                self.counts["hits"] += 1
+                return entries[key]
+            self.counts["misses"] += 1
+        return None
+
+    def store(self, entries, limit, key, value, version):
+        # Only into the generation it was read for; a result read while the
+        # catalog changed is dropped by the next check anyway
+        with self.lock:
+            if version != self.version:
+                return
+            entries[key] = value
+            entries.move_to_end(key)
+            while len(entries) > limit:
+                entries.popitem(last=False)
+                self.counts["evictions"] += 1
+
+    def search_services(self, text="", service_type=None, min_price=None, max_price=None,
+                        min_rating=None, limit=catalog.TOP_K):
+        conn = get_read_connection(self.path)
+        version = self.check(conn)
+        key = (catalog.match_expression(text), service_type, min_price, max_price, min_rating, limit)
+        rows = self.lookup(self.searches, key, version)
+        if rows is None:
+            rows = tuple(catalog.search_services(conn, text, service_type, min_price, max_price, min_rating, limit))
+            self.store(self.searches, self.search_entries, key, rows, version)
+        return list(rows)
+
+    def provider_services(self, provider_id):
+        conn = get_read_connection(self.path)
+        version = self.check(conn)
+        rows = self.lookup(self.services, provider_id, version)
+        if rows is None:
+            rows = tuple(catalog.provider_services(conn, provider_id))
+            self.store(self.services, self.provider_entries, provider_id, rows, version)
+        return list(rows)
+
+    def provider_names(self):
+        conn = get_read_connection(self.path)
+        version = self.check(conn)
+        with self.lock:
+            if version == self.version and self.names is not None:
+                self.counts["hits"] += 1
+                return self.names
+            self.counts["misses"] += 1
+        names = ProviderNames(conn.execute(PROVIDER_NAMES))
+        with self.lock:
+            if version == self.version:
+                self.names = names
+        return names
+
+    def stats(self):
+        with self.lock:
+            lookups = self.counts["hits"] + self.counts["misses"]
+            return {
+                **self.counts,
+                "hit_rate": round(self.counts["hits"] / lookups, 3) if lookups else 0,
+                "version": self.version,
+                "searches": len(self.searches),
+                "provider_service_lists": len(self.services),
+                "providers": len(self.names) if self.names is not None else 0,
+                "bytes": _size(list(self.searches.values())) + _size(list(self.services.values()))
+                         + (_size(self.names) if self.names is not None else 0),
+            }
+
+    def clear(self):
+        with self.lock:
+            self.version = None
+            self.searches.clear()
+            self.services.clear()
+            self.names = None
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(path=DB_PATH):
+    # One cache per database file, shared by every thread of the process
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = CatalogCache(path)
+        return _caches[path]
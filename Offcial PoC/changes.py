@@ -0,0 +1,48 @@
+import json
+
+# -------------------------
+# Change Feed
+# -------------------------
+# Triggers (migration 10) append one change_log row per inserted, updated or
+# deleted row of the logged tables. A dashboard remembers the last seq it has
+# seen and asks for what happened since; it then re-reads only those rows
+# (the *_ids arguments of the list queries) and patches its view, so staying
+# live costs in proportion to what changed, not to the size of the view.
+#
+# A reader that is more than CHANGE_LIMIT changes behind, or older than the
+# trimmed log reaches back, is told to reset: reload its views in full.
+
+TABLES = ("bookings", "bills", "services", "ratings")  # the tables migration 10 logs
+CHANGE_LIMIT = 500
+
+# MAX and MIN of an INTEGER PRIMARY KEY are single index seeks
+LATEST_SEQ = "SELECT COALESCE(MAX(seq), 0) FROM change_log"
+OLDEST_SEQ = "SELECT MIN(seq) FROM change_log"
+
+CHANGES_SINCE = """
+    SELECT table_name, row_id FROM change_log
+    WHERE seq > ? AND seq <= ?
+"""
+
+
+def changes_since(conn, seq=None, limit=CHANGE_LIMIT):
+    # Returns {"seq": latest seq, "reset": bool, table: [changed row ids], ...}.
+    # Without a seq only the latest one is returned, as a starting point.
+    latest = conn.execute(LATEST_SEQ).fetchone()[0]
+    result = {"seq": latest, "reset": False, **{table: [] for table in TABLES}}
+    if seq is None or seq == latest:
+        return result
+    oldest = conn.execute(OLDEST_SEQ).fetchone()[0]
+    if seq > latest or latest - seq > limit or (oldest is not None and seq < oldest - 1):
+        result["reset"] = True
+        return result
+    changed = {table: set() for table in TABLES}
+    for table, row_id in conn.execute(CHANGES_SINCE, (seq, latest)):
+        changed[table].add(row_id)
+    result.update((table, sorted(ids)) for table, ids in changed.items())
+    return result
+
+
+def id_list(ids):
+    # Binds a list of ids as one parameter, read back with json_each
+    return json.dumps([int(i) for i in ids])
@@ -0,0 +1,90 @@
+import os
+import sqlite3
+import threading
+
+import tracing
+from migrations import migrate
+
+# -------------------------
+# Shared Database Access
+# -------------------------
+# All apps open the database through here so they agree on journaling and
+# locking. In WAL mode readers never block the writer (and vice versa), which
+# matters because the role apps run as separate processes on the same file.
+
+DB_PATH = "elderly_care.db"
+
+BUSY_TIMEOUT_MS = 5000           # wait for a competing writer instead of failing with "database is locked"
+CACHE_SIZE_KB = 16384            # page cache per connection
+MMAP_SIZE = 256 * 1024 * 1024    # memory-map reads of up to 256 MB of the file
+CACHED_STATEMENTS = 256          # prepared statements kept per connection
+
+CONNECTION_PRAGMAS = [
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+    "PRAGMA synchronous = NORMAL",   # safe with WAL; fsync happens at checkpoint, not every commit
+    f"PRAGMA cache_size = -{CACHE_SIZE_KB}",
+    f"PRAGMA mmap_size = {MMAP_SIZE}",
+    "PRAGMA temp_store = MEMORY",
+]
+
+_local = threading.local()
+_migrated = set()  # (pid, path) whose schema is known to be current
+
+
+def connect(path=DB_PATH, readonly=False):
+    # With tracing off these are plain sqlite3 connections, so it costs nothing
+    factory = tracing.TracedConnection if tracing.enabled else sqlite3.Connection
+    if readonly:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True,
+                               timeout=BUSY_TIMEOUT_MS / 1000,
+                               cached_statements=CACHED_STATEMENTS, factory=factory)
+    else:
+        conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000,
+                               cached_statements=CACHED_STATEMENTS, factory=factory)
+        # journal_mode is stored in the file, so this only changes it once
+        conn.execute("PRAGMA journal_mode = WAL")
+    if tracing.enabled:
+        conn.set_trace_callback(tracing.on_trace)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def _connections():
+    # sqlite3 connections must not cross threads or a fork, so the cache is
+    # per thread and is dropped when the process id changes.
+    if getattr(_local, "pid", None) != os.getpid():
+        _local.pid = os.getpid()
+        _local.connections = {}
+    return _local.connections
+
+
+def get_connection(path=DB_PATH):
+    connections = _connections()
+    key = (path, "rw")
+    if key not in connections:
+        conn = connect(path)
+        if (os.getpid(), path) not in _migrated:
+            migrate(conn)
+            _migrated.add((os.getpid(), path))
+        connections[key] = conn
+    return connections[key]
+
+
+def get_read_connection(path=DB_PATH):
+    connections = _connections()
+    key = (path, "ro")
+    if key not in connections:
+        # A writer creates the file, the schema and the WAL index that a
+        # read-only connection needs, so make sure one has been opened first.
+        if (os.getpid(), path) not in _migrated:
+            get_connection(path)
+        connections[key] = connect(path, readonly=True)
+    return connections[key]
+
+
+def close_connections():
+    connections = _connections()
+    for conn in connections.values():
+        conn.close()
+    connections.clear()
@@ -0,0 +1,117 @@
+import concurrent.futures
+import queue
+import sys
+from tkinter import messagebox
+
+import tracing
+
+# -------------------------
+# Background Query Executor
+# -------------------------
+# Dashboards hand their database work to run() and get the result back on
+# the Tk thread through a callback, so a slow or locked database never
+# freezes the window. Reads run on a small thread pool; writes run on one
+# writer thread so they commit in the order they were clicked. Each worker
+# thread gets its own connections from database.py. Finished work is queued
+# and picked up by polling with root.after, because Tk may only be touched
+# from its own thread.
+#
+# Passing a key makes a request supersede any earlier one with the same key:
+# if the earlier one has not started it is cancelled, otherwise its result is
+# dropped when it arrives. This is how a new refresh replaces an old one.
+# Background requests (the change feed polling every few seconds) do not
+# show the busy cursor and status.
+#
+# With tracing on, each request is recorded as an action named after the
+# dashboard method that submitted it ("SeniorApp.load_bills"), unless an
+# action name is passed.
+
+READ_WORKERS = 2
+POLL_MS = 30
+
+
+class QueryExecutor:
+    def __init__(self, root, status=None, read_workers=READ_WORKERS):
+        self.root = root
+        self.status = status  # optional label that shows "Working..." while busy
+        self.readers = concurrent.futures.ThreadPoolExecutor(max_workers=read_workers,
+                                                             thread_name_prefix="ui-reader")
+        self.writer = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="ui-writer")
+        self.results = queue.Queue()
+        self.pending = {}  # future -> (key, on_done, on_error, background)
+        self.latest = {}   # key -> newest future for that key
+        self.polling = None
+        self.busy = False
+
+    def run(self, fn, *args, key=None, write=False, on_done=None, on_error=None, action=None,
+            background=False, **kwargs):
+        if key is not None and key in self.latest:
+            self.latest[key].cancel()
+        pool = self.writer if write else self.readers
+        if tracing.enabled:
+            caller = sys._getframe(1).f_code
+            # co_qualname ("SeniorApp.load_bills") is Python 3.11+
+            action = action or getattr(caller, "co_qualname", caller.co_name)
+            future = pool.submit(tracing.traced_call, action, fn, *args, **kwargs)
+        else:
+            future = pool.submit(fn, *args, **kwargs)
+        if key is not None:
+            self.latest[key] = future
+        self.pending[future] = (key, on_done, on_error, background)
+        future.add_done_callback(self.results.put)
+        self.set_busy(self.working())
+        if self.polling is None:
+            self.polling = self.root.after(POLL_MS, self.poll)
+        return future
+
+    def cancel(self, key):
+        # Forget the request for key; its result will not be delivered
+        future = self.latest.pop(key, None)
+        if future is not None:
+            future.cancel()
+
+    def poll(self):
+        self.polling = None
+        while True:
+            try:
+                future = self.results.get_nowait()
+            except queue.Empty:
+                break
+            key, on_done, on_error, background = self.pending.pop(future)
+            if future.cancelled():
+                continue
+            if key is not None:
+                if self.latest.get(key) is not future:
+                    continue  # superseded
+                del self.latest[key]
+            error = future.exception()
+            if error is not None:
+                (on_error or self.show_error)(error)
+            elif on_done is not None:
+                on_done(future.result())
+
+        self.set_busy(self.working())
+        if self.pending:
+            self.polling = self.root.after(POLL_MS, self.poll)
+
+    def working(self):
+        return any(not background for key, on_done, on_error, background in self.pending.values())
+
+    def set_busy(self, busy):
+        if busy == self.busy:
+            return
+        self.busy = busy
+        self.root.config(cursor="watch" if busy else "")
+        if self.status is not None:
+            self.status.config(text="Working..." if busy else "")
+
+    def show_error(self, error):
+        messagebox.showerror("Error", str(error))
+
+    def shutdown(self):
+        # Queued reads are dropped; queued writes still run so clicks are not lost
+        self.readers.shutdown(wait=False, cancel_futures=True)
+        self.writer.shutdown(wait=False)
+        if self.polling is not None:
+            self.root.after_cancel(self.polling)
+            self.polling = None
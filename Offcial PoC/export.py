@@ -0,0 +1,160 @@
+import argparse
+import csv
+import datetime
+import gzip
+import io
+import json
+import sys
+import time
+
+from database import DB_PATH, get_read_connection
+from writer import get_writer
+
+# -------------------------
+# Streaming Export
+# -------------------------
+# python export.py <bills|bookings|ratings> <out.csv|out.jsonl>[.gz] [--since ID | --incremental]
+#
+# Rows are read from the cursor FETCH_ROWS at a time and written straight
+# out, so memory use stays flat however large the table is. Every extract
+# walks its table in primary-key order from a starting id, which makes
+# "everything after the last run" a cheap range read. --incremental starts
+# where the previous --incremental run of that extract stopped (kept in the
+# export_marks table) and moves the mark on when it finishes. Only new rows
+# are picked up this way: later changes to an already exported row (a bill
+# being paid) are not re-exported.
+
+FETCH_ROWS = 1000
+
+EXPORTS = {
+    "bills": """
+        SELECT b.bill_id, b.status, b.amount,
+               b.senior_id, s.name AS senior_name, s.email AS senior_email,
+               b.provider_id, p.name AS provider_name, p.service_type
+        FROM bills b
+        LEFT JOIN seniors s ON s.id = b.senior_id
+        LEFT JOIN providers p ON p.id = b.provider_id
+        WHERE b.bill_id > ?
+        ORDER BY b.bill_id
+    """,
+    "bookings": """
+        SELECT b.booking_id, b.booking_date, b.senior_id, b.service_id,
+               sv.service_name, sv.provider_id, sv.payment_amount, b.bill_id
+        FROM bookings b
+        LEFT JOIN services sv ON sv.id = b.service_id
+        WHERE b.booking_id > ?
+        ORDER BY b.booking_id
+    """,
+    "ratings": """
+        SELECT id AS rating_id, senior_id, provider_id, rating
+        FROM ratings
+        WHERE id > ?
+        ORDER BY id
+    """,
+}
+
+FORMATS = ("csv", "jsonl")
+
+
+def stream_rows(conn, name, since=0, fetch_rows=FETCH_ROWS):
+    # Yields the column names first, then one row at a time
+    if name not in EXPORTS:
+        raise ValueError(f"Unknown export {name!r}; choose one of {', '.join(EXPORTS)}")
+    cur = conn.execute(EXPORTS[name], (since,))
+    yield [col[0] for col in cur.description]
+    while True:
+        rows = cur.fetchmany(fetch_rows)
+        if not rows:
+            break
+        yield from rows
+
+
+def stream_text(conn, name, fmt, since=0, stats=None):
+    # Yields the export as text chunks of about FETCH_ROWS rows each. If a
+    # stats dict is passed, "rows" and "last_id" are kept up to date in it.
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}; choose one of {', '.join(FORMATS)}")
+    stats = stats if stats is not None else {}
+    stats.update(rows=0, last_id=since)
+    rows = stream_rows(conn, name, since)
+    columns = next(rows)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if fmt == "csv":
+        writer.writerow(columns)
+    for row in rows:
+        if fmt == "csv":
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(dict(zip(columns, row))) + "\n")
+        stats["rows"] += 1
+        stats["last_id"] = row[0]
+        if stats["rows"] % FETCH_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def output_format(path):
+    # out.csv, out.jsonl, out.csv.gz, out.jsonl.gz -> (format, gzipped)
+    gzipped = path.endswith(".gz")
+    base = path[:-3] if gzipped else path
+    fmt = base.rsplit(".", 1)[-1].lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"Cannot tell the format of {path!r}; use .csv or .jsonl, optionally .gz")
+    return fmt, gzipped
+
+
+# -------------------------
+# Incremental Marks
+# -------------------------
+def last_mark(conn, name):
+    row = conn.execute("SELECT last_id FROM export_marks WHERE name=?", (name,)).fetchone()
+    return row[0] if row else 0
+
+
+def save_mark(conn, name, last_id):
+    conn.execute("""
+        INSERT INTO export_marks (name, last_id, exported_at) VALUES (?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET last_id = excluded.last_id, exported_at = excluded.exported_at
+    """, (name, last_id, datetime.datetime.now().isoformat(timespec="seconds")))
+
+
+def export(name, out_path, since=None, incremental=False, path=DB_PATH):
+    # Returns {"rows", "last_id", "seconds"}
+    fmt, gzipped = output_format(out_path)
+    read_conn = get_read_connection(path)
+    if incremental:
+        since = last_mark(read_conn, name)
+    stats = {}
+    started = time.perf_counter()
+    opener = gzip.open if gzipped else open
+    with opener(out_path, "wt", newline="", encoding="utf-8") as f:
+        for chunk in stream_text(read_conn, name, fmt, since or 0, stats):
+            f.write(chunk)
+    stats["seconds"] = time.perf_counter() - started
+    if incremental:
+        get_writer(path).call(save_mark, name, stats["last_id"])
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export bills, bookings or ratings for accounting")
+    parser.add_argument("name", choices=list(EXPORTS))
+    parser.add_argument("out", help="output file: .csv or .jsonl, add .gz to compress")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--since", type=int, default=0, help="only rows with a larger id")
+    group.add_argument("--incremental", action="store_true", help="only rows added since the last --incremental run")
+    parser.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args()
+    try:
+        stats = export(args.name, args.out, args.since, args.incremental, args.db)
+    except ValueError as e:
+        print(e)
+        sys.exit(2)
+    rate = stats["rows"] / stats["seconds"] if stats["seconds"] else 0
+    print(f"exported {stats['rows']} {args.name} rows to {args.out} in {stats['seconds']:.2f}s "
+          f"({rate:,.0f} rows/s), last id {stats['last_id']}")
@@ -0,0 +1,199 @@
+import sys
+
+# -------------------------
+# Billing Ledger
+# -------------------------
+# bills holds each bill's current state; bill_events (migration 15) holds how
+# it got there. Triggers on bills append an event for every change:
+#
+#   created    a new bill
+#   paid       status set to Paid
+#   cancelled  status set to Cancelled
+#   reopened   status set back to Pending
+#   adjusted   amount, senior or provider changed
+#   deleted    the bill was deleted
+#
+# Each event carries the bill's whole state after it, and the ledger refuses
+# updates and deletes, so a bill's history is never lost, whoever wrote it.
+#
+# Balances are what is still outstanding: the Pending bills of a senior (owed)
+# or a provider (to be paid). Every event that moves a balance adds a posting
+# to {owner}_postings, and when an account has SNAPSHOT_EVERY postings since
+# its last snapshot, a new one is taken in {owner}_balance_snapshots. A
+# balance is the latest snapshot plus fewer than SNAPSHOT_EVERY postings,
+# however many bills the account has had.
+#
+# The triggers are migration 15's own copy of the SQL below: a change to how
+# postings or snapshots are made (SNAPSHOT_EVERY included) needs a new
+# migration replacing them, or the triggers and --check/--replay disagree.
+#
+# python ledger.py [db] --check      compare bills and balances with the ledger
+# python ledger.py [db] --replay     rebuild them from the ledger
+
+SNAPSHOT_EVERY = 50
+OWNERS = ("senior", "provider")
+
+CENTS = "CAST(round(COALESCE({bill}.amount, 0) * 100) AS INTEGER)"
+
+# What an event leaves outstanding; deleted events have no status
+PENDING = "CASE WHEN {event}status = 'Pending' THEN {event}amount_cents ELSE 0 END"
+
+# The latest snapshot of an account plus the postings after it
+BALANCE = """
+    COALESCE((SELECT balance_cents FROM {owner}_balance_snapshots
+              WHERE {owner}_id = {account} ORDER BY seq DESC LIMIT 1), 0)
+    + (SELECT COALESCE(SUM(delta_cents), 0) FROM {owner}_postings
+       WHERE {owner}_id = {account}
+         AND seq > COALESCE((SELECT MAX(seq) FROM {owner}_balance_snapshots WHERE {owner}_id = {account}), 0))
+"""
+
+SENIOR_BALANCE = "SELECT " + BALANCE.format(owner="senior", account=":account")
+PROVIDER_BALANCE = "SELECT " + BALANCE.format(owner="provider", account=":account")
+
+BILL_HISTORY = """
+    SELECT seq, event, status, senior_id, provider_id, amount_cents, recorded_at
+    FROM bill_events WHERE bill_id = ?
+    ORDER BY seq
+"""
+
+# Each event's effect on the owner's balances: its outstanding amount, less
+# what the bill's previous event left outstanding (on whichever account that
+# was). Used to fill {owner}_postings from the events.
+POSTINGS_FROM_EVENTS = """
+    SELECT {owner}_id, seq, SUM(delta)
+    FROM (
+        SELECT {owner}_id, seq, {pending} AS delta FROM bill_events
+        UNION ALL
+        SELECT LAG({owner}_id) OVER previous, seq, -LAG({pending}) OVER previous FROM bill_events
+        WINDOW previous AS (PARTITION BY bill_id ORDER BY seq)
+    )
+    WHERE {owner}_id IS NOT NULL
+    GROUP BY {owner}_id, seq
+    HAVING SUM(delta) != 0
+    ORDER BY seq
+""".format(owner="{owner}", pending=PENDING.format(event=""))
+
+
+def senior_balance(conn, senior_id):
+    return conn.execute(SENIOR_BALANCE, {"account": senior_id}).fetchone()[0] / 100
+
+
+def provider_balance(conn, provider_id):
+    return conn.execute(PROVIDER_BALANCE, {"account": provider_id}).fetchone()[0] / 100
+
+
+def bill_history(conn, bill_id):
+    # (seq, event, status, senior, provider, amount, recorded at), oldest first
+    return [(seq, event, status, senior_id, provider_id, cents / 100, recorded_at)
+            for seq, event, status, senior_id, provider_id, cents, recorded_at
+            in conn.execute(BILL_HISTORY, (bill_id,))]
+
+
+# -------------------------
+# Consistency and Replay
+# -------------------------
+# Each bill's last event; SQLite takes the bare columns from the MAX(seq) row
+LEDGER_STATES = """
+    SELECT bill_id, event, status, senior_id, provider_id, amount_cents, MAX(seq)
+    FROM bill_events GROUP BY bill_id
+"""
+
+BILL_STATES = f"""
+    SELECT bill_id, COALESCE(status, 'Pending'), senior_id, provider_id, {CENTS.format(bill="bills")}
+    FROM bills
+"""
+
+LEDGER_BALANCES = """
+    WITH latest AS (
+        SELECT {owner}_id, MAX(seq) AS seq, balance_cents FROM {owner}_balance_snapshots GROUP BY {owner}_id
+    )
+    SELECT {owner}_id, SUM(balance)
+    FROM (
+        SELECT {owner}_id, balance_cents AS balance FROM latest
+        UNION ALL
+        SELECT p.{owner}_id, p.delta_cents
+        FROM {owner}_postings p LEFT JOIN latest l ON l.{owner}_id = p.{owner}_id
+        WHERE p.seq > COALESCE(l.seq, 0)
+    )
+    GROUP BY {owner}_id
+"""
+
+BILL_BALANCES = f"""
+    SELECT {{owner}}_id, SUM(CASE COALESCE(status, 'Pending') WHEN 'Pending' THEN {CENTS.format(bill="bills")} ELSE 0 END)
+    FROM bills WHERE {{owner}}_id IS NOT NULL
+    GROUP BY {{owner}}_id
+"""
+
+
+def ledger_states(conn):
+    # bill id -> (status, senior, provider, cents) the ledger says it has now,
+    # or None if it says the bill was deleted
+    return {bill_id: None if event == "deleted" else (status, senior_id, provider_id, cents)
+            for bill_id, event, status, senior_id, provider_id, cents, seq in conn.execute(LEDGER_STATES)}
+
+
+def check_ledger(conn):
+    # Returns {"bills" or owner: [(key, stored, from the ledger)]} where they differ
+    problems = {}
+    stored = {row[0]: row[1:] for row in conn.execute(BILL_STATES)}
+    expected = ledger_states(conn)
+    diffs = [(bill_id, stored.get(bill_id), expected.get(bill_id))
+             for bill_id in stored.keys() | expected.keys() if stored.get(bill_id) != expected.get(bill_id)]
+    if diffs:
+        problems["bills"] = sorted(diffs)
+    for owner in OWNERS:
+        balances = {account: cents for account, cents in conn.execute(LEDGER_BALANCES.format(owner=owner)) if cents}
+        owed = {account: cents for account, cents in conn.execute(BILL_BALANCES.format(owner=owner)) if cents}
+        diffs = [(account, balances.get(account, 0), owed.get(account, 0))
+                 for account in balances.keys() | owed.keys() if balances.get(account, 0) != owed.get(account, 0)]
+        if diffs:
+            problems[owner] = sorted(diffs)
+    return problems
+
+
+def replay(conn):
+    # A write queue operation. Bills that differ from their last event are
+    # put back to it (which the triggers do not log, as nothing differs from
+    # the ledger any more); bills the ledger has never seen are recorded as
+    # created. The postings and snapshots are then rebuilt from the events.
+    # Returns (bills restored, bills recorded).
+    expected = ledger_states(conn)
+    restore = []
+    for bill_id, *state in conn.execute(BILL_STATES).fetchall():
+        last = expected.get(bill_id)
+        if last is not None and tuple(state) != last:
+            status, senior_id, provider_id, cents = last
+            restore.append((status, cents / 100, senior_id, provider_id, bill_id))
+    conn.executemany("UPDATE bills SET status = ?, amount = ?, senior_id = ?, provider_id = ? WHERE bill_id = ?",
+                     restore)
+    unseen = conn.execute(f"""
+        INSERT INTO bill_events (bill_id, event, status, senior_id, provider_id, amount_cents)
+        SELECT bill_id, 'created', COALESCE(status, 'Pending'), senior_id, provider_id, {CENTS.format(bill="bills")}
+        FROM bills WHERE NOT EXISTS (SELECT 1 FROM bill_events e WHERE e.bill_id = bills.bill_id)
+        ORDER BY bill_id
+    """).rowcount
+    for owner in OWNERS:
+        conn.execute(f"DELETE FROM {owner}_balance_snapshots")
+        conn.execute(f"DELETE FROM {owner}_postings")
+        # In seq order, so the trigger takes the snapshots along the way
+        conn.execute(f"INSERT INTO {owner}_postings ({owner}_id, seq, delta_cents) "
+                     + POSTINGS_FROM_EVENTS.format(owner=owner))
+    return len(restore), unseen
+
+
+if __name__ == "__main__":
+    from database import DB_PATH, get_connection
+    from writer import get_writer
+
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    path = args[0] if args else DB_PATH
+    conn = get_connection(path)
+    if "--replay" in sys.argv:
+        restored, recorded = get_writer(path).call(replay)
+        print(f"ledger replayed: {restored} bills restored, {recorded} bills recorded")
+    problems = check_ledger(conn)
+    for key, diffs in problems.items():
+        print(f"{key}: {len(diffs)} differ from the ledger, e.g. {diffs[:3]}")
+    if not problems:
+        print("bills and balances match the ledger")
+    sys.exit(1 if problems else 0)
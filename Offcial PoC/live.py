@@ -0,0 +1,156 @@
+import bisect
+
+# -------------------------
+# Live Dashboard Views
+# -------------------------
+# ChangeFeed polls the change log (changes.py) in the background. When rows
+# changed, the dashboard's read function re-reads just those rows in the same
+# background job, and its apply function patches them into the views on the
+# Tk thread. One poll runs at a time, so patches arrive in commit order.
+#
+# A full load of a patched view can be overtaken by a patch: its rows are
+# read, a write commits and is patched in, and then the load's older rows
+# replace the patched ones. So full loads go through load(), which notes the
+# feed's seq before reading, and loaded() rewinds the feed to it once the
+# rows are shown; the changes since are read and patched in again.
+#
+# TreeSync keeps a Treeview in step with rows keyed by their first column: a
+# full reload is applied as a diff (so the list does not flicker and the
+# selection survives), and changed rows are patched in place, with new rows
+# inserted where the view's sort order puts them.
+
+LIVE_POLL_MS = 2000
+
+
+class ChangeFeed:
+    def __init__(self, root, executor, fetch, read, apply, reload, interval_ms=LIVE_POLL_MS):
+        self.root = root
+        self.executor = executor
+        self.fetch = fetch      # backend.changes_since
+        self.read = read        # changes -> re-read rows, on a reader thread
+        self.apply = apply      # (changes, rows) -> None, on the Tk thread
+        self.reload = reload    # when the feed cannot say what changed
+        self.interval_ms = interval_ms
+        # The starting point is read before the views load, so no change
+        # between the two is missed (seeing one twice is harmless)
+        self.seq = fetch()["seq"]
+        self.job = self.root.after(self.interval_ms, self.poll)
+
+    def poll(self):
+        # Also called straight after the dashboard's own writes. A poll that
+        # replaces one in flight starts from the same seq, so nothing is lost.
+        if self.job is not None:
+            self.root.after_cancel(self.job)
+            self.job = None
+        self.executor.run(self.check, self.seq, key="changes", background=True,
+                          on_done=self.received, on_error=lambda error: self.schedule())
+
+    def load(self, fn, *args, **kwargs):
+        # On a reader thread: (seq, fn's rows), the seq read first
+        return self.fetch()["seq"], fn(*args, **kwargs)
+
+    def loaded(self, seq):
+        # On the Tk thread, after a view shows rows from load()
+        if seq < self.seq:
+            self.seq = seq
+            self.poll()
+
+    def check(self, seq):
+        changes = self.fetch(seq)
+        if changes["reset"] or not any(changes[table] for table in changes if table not in ("seq", "reset")):
+            return changes, None
+        return changes, self.read(changes)
+
+    def received(self, result):
+        changes, rows = result
+        self.seq = changes["seq"]
+        if changes["reset"]:
+            self.reload()
+        elif rows is not None:
+            self.apply(changes, rows)
+        self.schedule()
+
+    def schedule(self):
+        if self.job is None:
+            self.job = self.root.after(self.interval_ms, self.poll)
+
+
+class TreeSync:
+    def __init__(self, tree, display=tuple, sort_key=None, descending=False):
+        self.tree = tree
+        self.display = display    # row -> values shown in the tree
+        self.sort_key = sort_key  # row -> sort key; None keeps query order and appends new rows
+        self.descending = descending
+        self.values = {}          # iid -> values shown
+        self.keys = {}            # iid -> sort key
+        self.order = []           # (sort key, iid), ascending
+
+    @staticmethod
+    def iid(row):
+        return str(row[0])
+
+    def replace(self, rows, descending=None):
+        # Make the tree show exactly these rows, in this order
+        if descending is not None:
+            self.descending = descending
+        rows = list(rows)
+        shown = {self.iid(row): self.display(row) for row in rows}
+        gone = [iid for iid in self.values if iid not in shown]
+        if gone:
+            self.tree.delete(*gone)
+        for index, row in enumerate(rows):
+            iid = self.iid(row)
+            if iid not in self.values:
+                self.tree.insert("", index, iid=iid, values=shown[iid])
+            elif self.values[iid] != shown[iid]:
+                self.tree.item(iid, values=shown[iid])
+        order = [self.iid(row) for row in rows]
+        if list(self.tree.get_children()) != order:
+            for index, iid in enumerate(order):
+                self.tree.move(iid, "", index)
+        self.values = shown
+        if self.sort_key is not None:
+            self.keys = {self.iid(row): self.sort_key(row) for row in rows}
+            self.order = sorted((key, iid) for iid, key in self.keys.items())
+
+    def update(self, rows, checked=()):
+        # Patch in rows that were re-read after a change. Rows with a key in
+        # `checked` that did not come back have left the view and are removed.
+        seen = set()
+        for row in rows:
+            iid = self.iid(row)
+            seen.add(iid)
+            values = self.display(row)
+            if iid not in self.values:
+                self.tree.insert("", self.place(iid, row), iid=iid, values=values)
+            else:
+                if self.values[iid] != values:
+                    self.tree.item(iid, values=values)
+                if self.sort_key is not None and self.keys[iid] != self.sort_key(row):
+                    # Detached first, so the index counts the other rows only
+                    self.unplace(iid)
+                    self.tree.detach(iid)
+                    self.tree.move(iid, "", self.place(iid, row))
+            self.values[iid] = values
+        gone = [str(key) for key in checked if str(key) not in seen and str(key) in self.values]
+        for iid in gone:
+            self.unplace(iid)
+            del self.values[iid]
+        if gone:
+            self.tree.delete(*gone)
+
+    def place(self, iid, row):
+        # Tree index for a row entering the view
+        if self.sort_key is None:
+            return "end"
+        key = self.sort_key(row)
+        self.keys[iid] = key
+        position = bisect.bisect_left(self.order, (key, iid))
+        self.order.insert(position, (key, iid))
+        return len(self.order) - 1 - position if self.descending else position
+
+    def unplace(self, iid):
+        if self.sort_key is None:
+            return
+        key = self.keys.pop(iid)
+        del self.order[bisect.bisect_left(self.order, (key, iid))]
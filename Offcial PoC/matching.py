@@ -0,0 +1,128 @@
+import json
+import math
+
+import catalog
+
+# -------------------------
+# Location Matching
+# -------------------------
+# Seniors and providers may have coordinates, and a provider may limit how far
+# it travels with service_radius_km; all of them are optional (migration 14).
+# "Services of type X within R km of this senior, best first" must not measure
+# the distance to every provider, so each provider with coordinates has a grid
+# cell: the map cut into CELLS_PER_DEGREE x CELLS_PER_DEGREE cells per degree
+# (about 11 km north to south), numbered row by row. grid_cell is a virtual
+# column, indexed on its own and after service_type, so the cells around a
+# senior are one index range per row of cells and only the providers in them
+# are looked at. Those are filtered on distance and ordered by their
+# service_rank score (ranking.py) in the same query.
+#
+# Distances use the equirectangular approximation (longitude scaled by the
+# cosine of the senior's latitude), which is off by well under 1% at these
+# ranges and needs no trigonometry in SQL. The grid does not wrap around the
+# 180th meridian, so a search next to it only sees its own side.
+
+CELLS_PER_DEGREE = 10  # fixed by migration 14's grid_cell column
+GRID_ROWS = 180 * CELLS_PER_DEGREE
+GRID_COLUMNS = 360 * CELLS_PER_DEGREE
+KM_PER_DEGREE = 111.195  # of latitude, on a sphere of radius 6371 km
+MIN_COSINE = 0.01        # caps the longitude span near the poles
+
+RADII_KM = [5, 10, 25, 50]
+DEFAULT_RADIUS_KM = 25
+
+SENIOR_LOCATION = "SELECT latitude, longitude FROM seniors WHERE id = ?"
+
+# :cells is a JSON list of [first, last] cell ranges. d2 is the squared
+# distance in degrees of latitude. A provider without a number for its radius
+# travels anywhere. The facets are catalog.FACETS, so the same filters mean
+# the same thing here as in a region-wide search.
+NEARBY_SERVICES = """
+    SELECT s.id, s.service_name, p.name AS provider_name, p.rating, s.payment_amount,
+           (p.latitude - :latitude) * (p.latitude - :latitude)
+           + (p.longitude - :longitude) * (p.longitude - :longitude) * :longitude_scale AS d2
+    FROM json_each(:cells) c
+    CROSS JOIN providers p
+        ON p.grid_cell BETWEEN json_extract(c.value, '$[0]') AND json_extract(c.value, '$[1]')
+    CROSS JOIN services s ON s.provider_id = p.id
+    CROSS JOIN service_rank r ON r.service_id = s.id
+    WHERE d2 <= :reach
+      AND (typeof(p.service_radius_km) NOT IN ('integer', 'real')
+           OR d2 <= p.service_radius_km * p.service_radius_km * :degrees_per_km)
+    {text_filter}
+""" + catalog.FACETS + """
+    ORDER BY r.score DESC, d2
+    LIMIT :limit
+"""
+
+# The unary + keeps SQLite from walking every text match for each provider:
+# the matches are gathered once and each nearby service is looked up in them
+TEXT_FILTER = "AND +s.id IN (SELECT rowid FROM services_fts WHERE services_fts MATCH :match)"
+
+
+def valid_location(latitude, longitude):
+    return (isinstance(latitude, (int, float)) and isinstance(longitude, (int, float))
+            and -90 <= latitude <= 90 and -180 <= longitude <= 180)
+
+
+def grid_cell(latitude, longitude):
+    # The same numbering as the grid_cell column of migration 14
+    row = min(int((latitude + 90) * CELLS_PER_DEGREE), GRID_ROWS - 1)
+    column = min(int((longitude + 180) * CELLS_PER_DEGREE), GRID_COLUMNS - 1)
+    return row * GRID_COLUMNS + column
+
+
+def cell_ranges(latitude, longitude, radius_km):
+    # [[first, last]] cells, one range per row of cells, covering the box
+    # around the point that holds the circle of radius_km
+    span = radius_km / KM_PER_DEGREE
+    width = span / max(math.cos(math.radians(latitude)), MIN_COSINE)
+    first = grid_cell(max(latitude - span, -90), max(longitude - width, -180))
+    last = grid_cell(min(latitude + span, 90), min(longitude + width, 180))
+    first_row, first_column = divmod(first, GRID_COLUMNS)
+    last_row, last_column = divmod(last, GRID_COLUMNS)
+    return [[row * GRID_COLUMNS + first_column, row * GRID_COLUMNS + last_column]
+            for row in range(first_row, last_row + 1)]
+
+
+def senior_location(conn, senior_id):
+    # (latitude, longitude), or None if the senior has not given one
+    row = conn.execute(SENIOR_LOCATION, (senior_id,)).fetchone()
+    if row is None:
+        raise LookupError("Senior not found")
+    return tuple(row) if valid_location(*row) else None
+
+
+def services_near(conn, latitude, longitude, radius_km, text="", service_type=None, min_price=None,
+                  max_price=None, min_rating=None, limit=catalog.TOP_K):
+    # Rows as catalog.search_services, plus the distance in km
+    if not valid_location(latitude, longitude):
+        raise ValueError("Not a valid location")
+    if not radius_km or radius_km <= 0:
+        raise ValueError("Radius must be a positive number of km")
+    params = catalog.facet_params(service_type, min_price, max_price, min_rating, limit)
+    params.update({
+        "cells": json.dumps(cell_ranges(latitude, longitude, radius_km)),
+        "latitude": latitude,
+        "longitude": longitude,
+        "longitude_scale": math.cos(math.radians(latitude)) ** 2,
+        "reach": (radius_km / KM_PER_DEGREE) ** 2,
+        "degrees_per_km": 1 / KM_PER_DEGREE ** 2,
+    })
+    text_filter = ""
+    match = catalog.match_expression(text)
+    if match:
+        text_filter = TEXT_FILTER
+        params["match"] = match
+    query = NEARBY_SERVICES.format(type_filter=catalog.TYPE_FILTER if service_type else "",
+                                   text_filter=text_filter)
+    return [(*row[:5], round(math.sqrt(row[5]) * KM_PER_DEGREE, 1)) for row in conn.execute(query, params)]
+
+
+def nearby_services(conn, senior_id, radius_km, text="", **filters):
+    # None when the senior has no location, so the caller can fall back to
+    # the region-wide catalog.search_services
+    location = senior_location(conn, senior_id)
+    if location is None:
+        return None
+    return services_near(conn, *location, radius_km, text, **filters)
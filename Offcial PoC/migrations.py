@@ -0,0 +1,1175 @@
+import sqlite3
+import sys
+
+# -------------------------
+# Schema Migrations
+# -------------------------
+# Every migration runs exactly once, in order. The number of the last applied
+# migration is kept in the database header via PRAGMA user_version, so an
+# up-to-date database costs a single PRAGMA read on launch.
+
+INITIAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS seniors (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    age INTEGER,
+    email TEXT UNIQUE NOT NULL,
+    password TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS providers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    age INTEGER,
+    service_type TEXT CHECK(service_type IN ('Nursing', 'Transportation', 'Food and Dinery', 'Companion')),
+    rating REAL DEFAULT 0,
+    email TEXT UNIQUE NOT NULL,
+    password TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS ratings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    senior_id INTEGER,
+    provider_id INTEGER,
+    rating INTEGER CHECK(rating BETWEEN 1 AND 5),
+    FOREIGN KEY (senior_id) REFERENCES seniors(id),
+    FOREIGN KEY (provider_id) REFERENCES providers(id)
+);
+
+CREATE TABLE IF NOT EXISTS services (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    service_name TEXT NOT NULL,
+    provider_id INTEGER,
+    provider_overall_rating REAL DEFAULT 0,
+    service_description TEXT,
+    payment_amount REAL,
+    FOREIGN KEY (provider_id) REFERENCES providers(id)
+);
+
+CREATE TABLE IF NOT EXISTS bills (
+    bill_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    status TEXT CHECK(status IN ('Pending', 'Paid', 'Cancelled')),
+    senior_id INTEGER,
+    provider_id INTEGER,
+    amount REAL,
+    FOREIGN KEY (senior_id) REFERENCES seniors(id),
+    FOREIGN KEY (provider_id) REFERENCES providers(id)
+);
+
+CREATE TABLE IF NOT EXISTS admin (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    email TEXT UNIQUE NOT NULL,
+    password TEXT NOT NULL,
+    admin_key TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS bookings (
+    booking_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    senior_id INTEGER NOT NULL,
+    service_id INTEGER NOT NULL,
+    day INTEGER NOT NULL CHECK(day BETWEEN 1 AND 31),
+    month INTEGER NOT NULL CHECK(month BETWEEN 1 AND 12),
+    year INTEGER NOT NULL,
+    FOREIGN KEY (senior_id) REFERENCES seniors(id),
+    FOREIGN KEY (service_id) REFERENCES services(id)
+);
+"""
+
+# Indexes for the dashboard lookups. Where the extra columns are small the
+# index also covers the query, so SQLite never has to visit the table rows.
+LOOKUP_INDEXES = """
+-- SeniorApp.load_bills: bills of one senior, with provider, amount and status
+CREATE INDEX IF NOT EXISTS idx_bills_senior ON bills(senior_id, provider_id, amount, status);
+
+-- ProviderApp.load_services and the provider-wide services UPDATE
+CREATE INDEX IF NOT EXISTS idx_services_provider ON services(provider_id);
+
+-- ProviderApp.load_bookings: bookings of each of the provider's services
+CREATE INDEX IF NOT EXISTS idx_bookings_service ON bookings(service_id, year, month, day, senior_id);
+
+-- AVG(rating) of one provider (ratings.py rebuilds the aggregates this way)
+CREATE INDEX IF NOT EXISTS idx_ratings_provider ON ratings(provider_id, rating);
+"""
+
+# Running rating totals per provider, kept up to date by triggers in the same
+# transaction as the rating itself. providers.rating is derived from them, so
+# a new rating costs O(1) instead of an AVG over the provider's history, and
+# the copy in every services row is no longer needed.
+RATING_AGGREGATES = """
+ALTER TABLE providers ADD COLUMN rating_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE providers ADD COLUMN rating_sum INTEGER NOT NULL DEFAULT 0;
+
+UPDATE providers SET
+    rating_count = (SELECT COUNT(rating) FROM ratings WHERE provider_id = providers.id),
+    rating_sum = (SELECT COALESCE(SUM(rating), 0) FROM ratings WHERE provider_id = providers.id);
+UPDATE providers SET rating = CASE WHEN rating_count > 0 THEN rating_sum * 1.0 / rating_count ELSE 0 END;
+
+ALTER TABLE services DROP COLUMN provider_overall_rating;
+
+CREATE TRIGGER IF NOT EXISTS trg_ratings_insert AFTER INSERT ON ratings
+WHEN NEW.rating IS NOT NULL
+BEGIN
+    UPDATE providers SET rating_count = rating_count + 1, rating_sum = rating_sum + NEW.rating
+    WHERE id = NEW.provider_id;
+    UPDATE providers SET rating = rating_sum * 1.0 / rating_count WHERE id = NEW.provider_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_ratings_delete AFTER DELETE ON ratings
+WHEN OLD.rating IS NOT NULL
+BEGIN
+    UPDATE providers SET rating_count = rating_count - 1, rating_sum = rating_sum - OLD.rating
+    WHERE id = OLD.provider_id;
+    UPDATE providers SET rating = CASE WHEN rating_count > 0 THEN rating_sum * 1.0 / rating_count ELSE 0 END
+    WHERE id = OLD.provider_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_ratings_update AFTER UPDATE OF rating, provider_id ON ratings
+BEGIN
+    UPDATE providers SET rating_count = rating_count - 1, rating_sum = rating_sum - OLD.rating
+    WHERE id = OLD.provider_id AND OLD.rating IS NOT NULL;
+    UPDATE providers SET rating_count = rating_count + 1, rating_sum = rating_sum + NEW.rating
+    WHERE id = NEW.provider_id AND NEW.rating IS NOT NULL;
+    UPDATE providers SET rating = CASE WHEN rating_count > 0 THEN rating_sum * 1.0 / rating_count ELSE 0 END
+    WHERE id IN (OLD.provider_id, NEW.provider_id);
+END;
+"""
+
+
+def link_bookings_to_bills(conn):
+    # Every booking now records the bill created with it, replacing the
+    # senior/provider/amount match that could pair one booking with many bills.
+    conn.execute("ALTER TABLE bookings ADD COLUMN bill_id INTEGER REFERENCES bills(bill_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_bill ON bookings(bill_id)")
+
+    # Backfill: pair each existing booking with the oldest bill of the same
+    # senior, provider and amount that no other booking has claimed yet.
+    unclaimed = {}
+    for bill_id, senior_id, provider_id, amount in conn.execute(
+            "SELECT bill_id, senior_id, provider_id, amount FROM bills ORDER BY bill_id"):
+        unclaimed.setdefault((senior_id, provider_id, amount), []).append(bill_id)
+    for bill_ids in unclaimed.values():
+        bill_ids.reverse()  # pop() from the end returns the oldest
+
+    links = []
+    for booking_id, senior_id, provider_id, amount in conn.execute("""
+            SELECT b.booking_id, b.senior_id, s.provider_id, s.payment_amount
+            FROM bookings b JOIN services s ON b.service_id = s.id
+            ORDER BY b.booking_id"""):
+        bill_ids = unclaimed.get((senior_id, provider_id, amount))
+        if bill_ids:
+            links.append((bill_ids.pop(), booking_id))
+    conn.executemany("UPDATE bookings SET bill_id = ? WHERE booking_id = ?", links)
+
+
+# One sortable ISO date per booking, derived from day/month/year so existing
+# writers keep working. It is a virtual column: computed on read, stored only
+# in the indexes, which serve "bookings of X between two dates" as a range read.
+BOOKING_DATES = """
+ALTER TABLE bookings ADD COLUMN booking_date TEXT
+    GENERATED ALWAYS AS (printf('%04d-%02d-%02d', year, month, day)) VIRTUAL;
+
+DROP INDEX IF EXISTS idx_bookings_service;
+CREATE INDEX IF NOT EXISTS idx_bookings_service_date ON bookings(service_id, booking_date);
+CREATE INDEX IF NOT EXISTS idx_bookings_senior_date ON bookings(senior_id, booking_date);
+
+-- SQLite accepts 2025-02-31 as a date string, but adding zero days normalizes
+-- it to 2025-03-03, so any difference means the date does not exist.
+CREATE TRIGGER IF NOT EXISTS trg_bookings_date_insert BEFORE INSERT ON bookings
+WHEN date(printf('%04d-%02d-%02d', NEW.year, NEW.month, NEW.day), '+0 days')
+     IS NOT printf('%04d-%02d-%02d', NEW.year, NEW.month, NEW.day)
+BEGIN
+    SELECT RAISE(ABORT, 'Invalid booking date');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_bookings_date_update BEFORE UPDATE OF day, month, year ON bookings
+WHEN date(printf('%04d-%02d-%02d', NEW.year, NEW.month, NEW.day), '+0 days')
+     IS NOT printf('%04d-%02d-%02d', NEW.year, NEW.month, NEW.day)
+BEGIN
+    SELECT RAISE(ABORT, 'Invalid booking date');
+END;
+"""
+
+# Per-provider daily capacity. provider_day_load holds one row per provider
+# and booked day, so checking a booking against capacity is a primary key
+# lookup; the triggers keep it in step with bookings and refuse overbooking
+# in the same transaction as the insert, whichever process writes it.
+# Every provider that already exists is given a capacity of 3 a day; nothing
+# tells them, so one that takes more must be raised by hand.
+PROVIDER_CAPACITY = """
+ALTER TABLE providers ADD COLUMN daily_capacity INTEGER NOT NULL DEFAULT 3;
+
+CREATE TABLE IF NOT EXISTS provider_day_load (
+    provider_id INTEGER NOT NULL,
+    booking_date TEXT NOT NULL,
+    booked INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (provider_id, booking_date)
+) WITHOUT ROWID;
+
+INSERT INTO provider_day_load (provider_id, booking_date, booked)
+SELECT s.provider_id, b.booking_date, COUNT(*)
+FROM bookings b JOIN services s ON b.service_id = s.id
+GROUP BY s.provider_id, b.booking_date;
+
+CREATE TRIGGER IF NOT EXISTS trg_bookings_capacity_insert BEFORE INSERT ON bookings
+WHEN (SELECT l.booked >= p.daily_capacity
+      FROM services s
+      JOIN providers p ON p.id = s.provider_id
+      JOIN provider_day_load l ON l.provider_id = s.provider_id
+           AND l.booking_date = printf('%04d-%02d-%02d', NEW.year, NEW.month, NEW.day)
+      WHERE s.id = NEW.service_id)
+BEGIN
+    SELECT RAISE(ABORT, 'Provider is fully booked on this date');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_bookings_capacity_update BEFORE UPDATE OF service_id, day, month, year ON bookings
+WHEN (SELECT l.booked >= p.daily_capacity
+      FROM services s
+      JOIN providers p ON p.id = s.provider_id
+      JOIN provider_day_load l ON l.provider_id = s.provider_id
+           AND l.booking_date = printf('%04d-%02d-%02d', NEW.year, NEW.month, NEW.day)
+      WHERE s.id = NEW.service_id
+        AND NOT (l.booking_date = OLD.booking_date
+                 AND s.provider_id = (SELECT provider_id FROM services WHERE id = OLD.service_id)))
+BEGIN
+    SELECT RAISE(ABORT, 'Provider is fully booked on this date');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_bookings_load_insert AFTER INSERT ON bookings
+BEGIN
+    INSERT INTO provider_day_load (provider_id, booking_date, booked)
+    SELECT provider_id, NEW.booking_date, 1 FROM services WHERE id = NEW.service_id
+    ON CONFLICT (provider_id, booking_date) DO UPDATE SET booked = booked + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_bookings_load_delete AFTER DELETE ON bookings
+BEGIN
+    UPDATE provider_day_load SET booked = booked - 1
+    WHERE provider_id = (SELECT provider_id FROM services WHERE id = OLD.service_id)
+      AND booking_date = OLD.booking_date;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_bookings_load_update AFTER UPDATE OF service_id, day, month, year ON bookings
+BEGIN
+    UPDATE provider_day_load SET booked = booked - 1
+    WHERE provider_id = (SELECT provider_id FROM services WHERE id = OLD.service_id)
+      AND booking_date = OLD.booking_date;
+    INSERT INTO provider_day_load (provider_id, booking_date, booked)
+    SELECT provider_id, NEW.booking_date, 1 FROM services WHERE id = NEW.service_id
+    ON CONFLICT (provider_id, booking_date) DO UPDATE SET booked = booked + 1;
+END;
+"""
+
+# The capacity triggers above joined provider_day_load, which has no row
+# before a provider's first booking of a day, so that booking was never
+# checked and a provider with a capacity of 0 could still be booked once a
+# day. The load is now looked up on its own and taken as 0 when missing.
+# SQLite cannot add a CHECK to an existing column, so the new triggers on
+# providers refuse a negative capacity instead; any already stored meant the
+# same as 0 (every day full) and becomes 0.
+CAPACITY_CHECKS = """
+DROP TRIGGER IF EXISTS trg_bookings_capacity_insert;
+DROP TRIGGER IF EXISTS trg_bookings_capacity_update;
+
+CREATE TRIGGER IF NOT EXISTS trg_bookings_capacity_insert BEFORE INSERT ON bookings
+WHEN (SELECT COALESCE((SELECT l.booked FROM provider_day_load l
+                       WHERE l.provider_id = s.provider_id
+                         AND l.booking_date = printf('%04d-%02d-%02d', NEW.year, NEW.month, NEW.day)), 0)
+             >= p.daily_capacity
+      FROM services s
+      JOIN providers p ON p.id = s.provider_id
+      WHERE s.id = NEW.service_id)
+BEGIN
+    SELECT RAISE(ABORT, 'Provider is fully booked on this date');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_bookings_capacity_update BEFORE UPDATE OF service_id, day, month, year ON bookings
+WHEN (SELECT COALESCE((SELECT l.booked FROM provider_day_load l
+                       WHERE l.provider_id = s.provider_id
+                         AND l.booking_date = printf('%04d-%02d-%02d', NEW.year, NEW.month, NEW.day)), 0)
+             >= p.daily_capacity
+      FROM services s
+      JOIN providers p ON p.id = s.provider_id
+      WHERE s.id = NEW.service_id
+        AND NOT (printf('%04d-%02d-%02d', NEW.year, NEW.month, NEW.day) = OLD.booking_date
+                 AND s.provider_id = (SELECT provider_id FROM services WHERE id = OLD.service_id)))
+BEGIN
+    SELECT RAISE(ABORT, 'Provider is fully booked on this date');
+END;
+
+UPDATE providers SET daily_capacity = 0 WHERE daily_capacity < 0;
+
+CREATE TRIGGER IF NOT EXISTS trg_providers_capacity_insert BEFORE INSERT ON providers
+WHEN NEW.daily_capacity < 0
+BEGIN
+    SELECT RAISE(ABORT, 'daily_capacity cannot be negative');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_providers_capacity_update BEFORE UPDATE OF daily_capacity ON providers
+WHEN NEW.daily_capacity < 0
+BEGIN
+    SELECT RAISE(ABORT, 'daily_capacity cannot be negative');
+END;
+"""
+
+# Full-text index over the service catalog. It is an external-content FTS5
+# table (the text lives only in services), kept in sync by triggers so
+# provider add/delete/edit of a service is reflected immediately.
+SERVICE_SEARCH = """
+CREATE VIRTUAL TABLE IF NOT EXISTS services_fts USING fts5(
+    service_name, service_description,
+    content='services', content_rowid='id'
+);
+INSERT INTO services_fts(services_fts) VALUES ('rebuild');
+
+CREATE TRIGGER IF NOT EXISTS trg_services_fts_insert AFTER INSERT ON services
+BEGIN
+    INSERT INTO services_fts(rowid, service_name, service_description)
+    VALUES (NEW.id, NEW.service_name, NEW.service_description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_services_fts_delete AFTER DELETE ON services
+BEGIN
+    INSERT INTO services_fts(services_fts, rowid, service_name, service_description)
+    VALUES ('delete', OLD.id, OLD.service_name, OLD.service_description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_services_fts_update AFTER UPDATE OF service_name, service_description ON services
+BEGIN
+    INSERT INTO services_fts(services_fts, rowid, service_name, service_description)
+    VALUES ('delete', OLD.id, OLD.service_name, OLD.service_description);
+    INSERT INTO services_fts(rowid, service_name, service_description)
+    VALUES (NEW.id, NEW.service_name, NEW.service_description);
+END;
+
+-- Facet filters: service type + minimum rating on providers, price on services.
+-- Browsing without search text walks providers best-rated first.
+CREATE INDEX IF NOT EXISTS idx_providers_type_rating ON providers(service_type, rating);
+CREATE INDEX IF NOT EXISTS idx_providers_rating ON providers(rating);
+CREATE INDEX IF NOT EXISTS idx_services_price ON services(payment_amount);
+"""
+
+# Where the last incremental export of each extract stopped (export.py)
+EXPORT_MARKS = """
+CREATE TABLE IF NOT EXISTS export_marks (
+    name TEXT PRIMARY KEY,
+    last_id INTEGER NOT NULL,
+    exported_at TEXT NOT NULL
+);
+"""
+
+# A counter that moves whenever anything shown in the service catalog
+# changes: services, provider names and types, and provider ratings (which
+# the rating triggers update). catalog_cache.py compares it to decide whether
+# its copy is still good, so bookings and bills never invalidate the cache.
+CATALOG_VERSION = """
+CREATE TABLE IF NOT EXISTS catalog_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0);
+
+CREATE TRIGGER IF NOT EXISTS trg_catalog_services_insert AFTER INSERT ON services
+BEGIN
+    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_catalog_services_delete AFTER DELETE ON services
+BEGIN
+    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_catalog_services_update AFTER UPDATE ON services
+BEGIN
+    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_catalog_providers_insert AFTER INSERT ON providers
+BEGIN
+    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_catalog_providers_delete AFTER DELETE ON providers
+BEGIN
+    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_catalog_providers_update AFTER UPDATE OF id, name, service_type, rating ON providers
+BEGIN
+    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+END;
+"""
+
+# Append-only feed of row changes that the dashboards poll to stay live
+# (changes.py). seq only ever grows, and SQLite commits one writer at a time,
+# so a reader that has seen seq N has seen every change up to N. The log is
+# trimmed to the last CHANGE_LOG_ROWS entries as it is appended to; a reader
+# that falls further behind than that reloads instead.
+CHANGE_LOG_ROWS = 100_000
+
+CHANGE_LOG = """
+CREATE TABLE IF NOT EXISTS change_log (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    table_name TEXT NOT NULL,
+    row_id INTEGER NOT NULL,
+    op TEXT NOT NULL CHECK (op IN ('I', 'U', 'D'))
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_change_log_trim AFTER INSERT ON change_log
+BEGIN
+    DELETE FROM change_log WHERE seq <= NEW.seq - %d;
+END;
+""" % CHANGE_LOG_ROWS
+
+CHANGE_LOG_TRIGGERS = """
+CREATE TRIGGER IF NOT EXISTS trg_{table}_log_insert AFTER INSERT ON {table}
+BEGIN
+    INSERT INTO change_log (table_name, row_id, op) VALUES ('{table}', NEW.{key}, 'I');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_{table}_log_update AFTER UPDATE ON {table}
+BEGIN
+    INSERT INTO change_log (table_name, row_id, op) VALUES ('{table}', NEW.{key}, 'U');
+    INSERT INTO change_log (table_name, row_id, op)
+    SELECT '{table}', OLD.{key}, 'D' WHERE OLD.{key} IS NOT NEW.{key};
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_{table}_log_delete AFTER DELETE ON {table}
+BEGIN
+    INSERT INTO change_log (table_name, row_id, op) VALUES ('{table}', OLD.{key}, 'D');
+END;
+"""
+
+# table -> primary key of the tables whose changes are logged
+LOGGED_TABLES = {"bookings": "booking_id", "bills": "bill_id", "services": "id", "ratings": "id"}
+
+CHANGE_LOG += "".join(CHANGE_LOG_TRIGGERS.format(table=table, key=key) for table, key in LOGGED_TABLES.items())
+
+# Monthly bill totals per senior and per provider, by status, kept up to
+# date by triggers so statements and payouts are read rather than summed.
+# A bill belongs to the month of the service booked with it: bills.month is
+# set when the booking links the bill (a bill on its own has no month and
+# is left out). Amounts are summed in whole cents, so adding and taking away
+# the same bills always returns to exactly zero.
+BILL_ROLLUPS = """
+ALTER TABLE bills ADD COLUMN month TEXT;
+
+UPDATE bills SET month = (SELECT substr(b.booking_date, 1, 7) FROM bookings b WHERE b.bill_id = bills.bill_id);
+
+CREATE TRIGGER IF NOT EXISTS trg_bookings_bill_month_insert AFTER INSERT ON bookings
+WHEN NEW.bill_id IS NOT NULL
+BEGIN
+    UPDATE bills SET month = substr(NEW.booking_date, 1, 7)
+    WHERE bill_id = NEW.bill_id AND month IS NOT substr(NEW.booking_date, 1, 7);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_bookings_bill_month_update AFTER UPDATE OF day, month, year, bill_id ON bookings
+WHEN NEW.bill_id IS NOT NULL
+BEGIN
+    UPDATE bills SET month = substr(NEW.booking_date, 1, 7)
+    WHERE bill_id = NEW.bill_id AND month IS NOT substr(NEW.booking_date, 1, 7);
+END;
+"""
+
+BILL_ROLLUP_TABLE = """
+CREATE TABLE IF NOT EXISTS {owner}_monthly_bills (
+    {owner}_id INTEGER NOT NULL,
+    month TEXT NOT NULL,
+    status TEXT NOT NULL,
+    bills INTEGER NOT NULL,
+    amount_cents INTEGER NOT NULL,
+    PRIMARY KEY ({owner}_id, month, status)
+) WITHOUT ROWID;
+
+INSERT INTO {owner}_monthly_bills ({owner}_id, month, status, bills, amount_cents)
+SELECT {owner}_id, month, COALESCE(status, 'Pending'), COUNT(*), SUM(CAST(round(COALESCE(amount, 0) * 100) AS INTEGER))
+FROM bills
+WHERE {owner}_id IS NOT NULL AND month IS NOT NULL
+GROUP BY {owner}_id, month, COALESCE(status, 'Pending');
+
+CREATE TRIGGER IF NOT EXISTS trg_bills_{owner}_rollup_insert AFTER INSERT ON bills
+WHEN NEW.{owner}_id IS NOT NULL AND NEW.month IS NOT NULL
+BEGIN
+    INSERT INTO {owner}_monthly_bills ({owner}_id, month, status, bills, amount_cents)
+    VALUES (NEW.{owner}_id, NEW.month, COALESCE(NEW.status, 'Pending'), 1,
+            CAST(round(COALESCE(NEW.amount, 0) * 100) AS INTEGER))
+    ON CONFLICT ({owner}_id, month, status) DO UPDATE SET
+        bills = bills + 1, amount_cents = amount_cents + excluded.amount_cents;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_bills_{owner}_rollup_update AFTER UPDATE OF status, amount, month, {owner}_id ON bills
+BEGIN
+    UPDATE {owner}_monthly_bills
+    SET bills = bills - 1, amount_cents = amount_cents - CAST(round(COALESCE(OLD.amount, 0) * 100) AS INTEGER)
+    WHERE {owner}_id = OLD.{owner}_id AND month = OLD.month AND status = COALESCE(OLD.status, 'Pending');
+    DELETE FROM {owner}_monthly_bills
+    WHERE {owner}_id = OLD.{owner}_id AND month = OLD.month AND status = COALESCE(OLD.status, 'Pending') AND bills = 0;
+    INSERT INTO {owner}_monthly_bills ({owner}_id, month, status, bills, amount_cents)
+    SELECT NEW.{owner}_id, NEW.month, COALESCE(NEW.status, 'Pending'), 1,
+           CAST(round(COALESCE(NEW.amount, 0) * 100) AS INTEGER)
+    WHERE NEW.{owner}_id IS NOT NULL AND NEW.month IS NOT NULL
+    ON CONFLICT ({owner}_id, month, status) DO UPDATE SET
+        bills = bills + 1, amount_cents = amount_cents + excluded.amount_cents;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_bills_{owner}_rollup_delete AFTER DELETE ON bills
+BEGIN
+    UPDATE {owner}_monthly_bills
+    SET bills = bills - 1, amount_cents = amount_cents - CAST(round(COALESCE(OLD.amount, 0) * 100) AS INTEGER)
+    WHERE {owner}_id = OLD.{owner}_id AND month = OLD.month AND status = COALESCE(OLD.status, 'Pending');
+    DELETE FROM {owner}_monthly_bills
+    WHERE {owner}_id = OLD.{owner}_id AND month = OLD.month AND status = COALESCE(OLD.status, 'Pending') AND bills = 0;
+END;
+"""
+
+BILL_ROLLUPS += "".join(BILL_ROLLUP_TABLE.format(owner=owner) for owner in ("senior", "provider"))
+
+# Totals for the admin analytics tab: bookings, bills and billed cents by
+# status, per day of service and provider (daily_provider_stats), per day and
+# service type (daily_type_stats) and per provider over all time
+# (provider_stats). The triggers follow each booking and bill as it is
+# written, so a KPI reads a few rows per day, or one per provider, however
+# long the history is. Bills take their day from the booking they pay for
+# (bills.service_date, set alongside bills.month). Bookings count for the
+# current provider of their service, as in provider_day_load; a provider
+# changing type (or being deleted) moves its history with it, and so does a
+# service changing provider (migration 16).
+# analytics.py --rebuild recomputes everything.
+ANALYTICS = """
+ALTER TABLE bills ADD COLUMN service_date TEXT;
+
+UPDATE bills SET service_date = (SELECT b.booking_date FROM bookings b WHERE b.bill_id = bills.bill_id);
+
+DROP TRIGGER IF EXISTS trg_bookings_bill_month_insert;
+DROP TRIGGER IF EXISTS trg_bookings_bill_month_update;
+
+CREATE TRIGGER IF NOT EXISTS trg_bookings_bill_date_insert AFTER INSERT ON bookings
+WHEN NEW.bill_id IS NOT NULL
+BEGIN
+    UPDATE bills SET month = substr(NEW.booking_date, 1, 7), service_date = NEW.booking_date
+    WHERE bill_id = NEW.bill_id AND service_date IS NOT NEW.booking_date;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_bookings_bill_date_update AFTER UPDATE OF day, month, year, bill_id ON bookings
+WHEN NEW.bill_id IS NOT NULL
+BEGIN
+    UPDATE bills SET month = substr(NEW.booking_date, 1, 7), service_date = NEW.booking_date
+    WHERE bill_id = NEW.bill_id AND service_date IS NOT NEW.booking_date;
+END;
+"""
+
+# key column -> (type, value for a bookings row, value for a bills row,
+# the same two in the backfill, where b, bl, s and p are bookings, bills,
+# services and providers)
+ANALYTICS_KEYS = {
+    "day": ("TEXT", "{row}.booking_date", "{row}.service_date", "b.booking_date", "bl.service_date"),
+    "provider_id": ("INTEGER", "(SELECT provider_id FROM services WHERE id = {row}.service_id)",
+                    "{row}.provider_id", "s.provider_id", "bl.provider_id"),
+    "service_type": ("TEXT", "(SELECT COALESCE(p.service_type, '') FROM services s "
+                             "LEFT JOIN providers p ON p.id = s.provider_id WHERE s.id = {row}.service_id)",
+                     "COALESCE((SELECT service_type FROM providers WHERE id = {row}.provider_id), '')",
+                     "COALESCE(p.service_type, '')", "COALESCE(p.service_type, '')"),
+}
+
+# table -> its key columns
+ANALYTICS_TABLES = {
+    "daily_provider_stats": ("day", "provider_id"),
+    "daily_type_stats": ("day", "service_type"),
+    "provider_stats": ("provider_id",),
+}
+
+ANALYTICS_TABLE = """
+CREATE TABLE IF NOT EXISTS {table} (
+{key_columns}    bookings INTEGER NOT NULL DEFAULT 0,
+    bills INTEGER NOT NULL DEFAULT 0,
+    pending_cents INTEGER NOT NULL DEFAULT 0,
+    paid_cents INTEGER NOT NULL DEFAULT 0,
+    cancelled_cents INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY ({keys})
+) WITHOUT ROWID;
+
+INSERT INTO {table} ({keys}, bookings, bills, pending_cents, paid_cents, cancelled_cents)
+SELECT {keys}, SUM(bookings), SUM(bills), SUM(pending_cents), SUM(paid_cents), SUM(cancelled_cents)
+FROM (
+    SELECT {booking_keys}, 1 AS bookings, 0 AS bills, 0 AS pending_cents, 0 AS paid_cents, 0 AS cancelled_cents
+    FROM bookings b
+    JOIN services s ON s.id = b.service_id
+    LEFT JOIN providers p ON p.id = s.provider_id
+    UNION ALL
+    SELECT {bill_keys}, 0, 1,
+           CASE COALESCE(bl.status, 'Pending') WHEN 'Pending' THEN {cents} ELSE 0 END,
+           CASE bl.status WHEN 'Paid' THEN {cents} ELSE 0 END,
+           CASE bl.status WHEN 'Cancelled' THEN {cents} ELSE 0 END
+    FROM bills bl
+    LEFT JOIN providers p ON p.id = bl.provider_id
+    WHERE bl.service_date IS NOT NULL
+)
+WHERE {not_null}
+GROUP BY {keys};
+"""
+
+# Adds one bookings or bills row to a table; {sign} is "-" to take it away
+ANALYTICS_DELTA = """
+    INSERT INTO {table} ({keys}, bookings, bills, pending_cents, paid_cents, cancelled_cents)
+    SELECT {keys}, {bookings}, {bills}, {pending}, {paid}, {cancelled}
+    FROM (SELECT {key_values})
+    WHERE {not_null}
+    ON CONFLICT ({keys}) DO UPDATE SET
+        bookings = bookings + excluded.bookings, bills = bills + excluded.bills,
+        pending_cents = pending_cents + excluded.pending_cents,
+        paid_cents = paid_cents + excluded.paid_cents,
+        cancelled_cents = cancelled_cents + excluded.cancelled_cents;
+"""
+
+ANALYTICS_CLEANUP = """
+    DELETE FROM {table} WHERE {match} AND bookings = 0 AND bills = 0;
+"""
+
+
+def analytics_delta(row, kind, sign):
+    # Trigger statements adding NEW or OLD of bookings or bills to every table
+    cents = f"{sign}CAST(round(COALESCE({row}.amount, 0) * 100) AS INTEGER)"
+    if kind == "booking":
+        counts = {"bookings": f"{sign}1", "bills": 0, "pending": 0, "paid": 0, "cancelled": 0}
+    else:
+        counts = {"bookings": 0, "bills": f"{sign}1",
+                  **{name: f"CASE COALESCE({row}.status, 'Pending') WHEN '{name.capitalize()}' THEN {cents} ELSE 0 END"
+                     for name in ("pending", "paid", "cancelled")}}
+    # A bill counts once it has a day, even in provider_stats
+    dated = "" if kind == "booking" else f" AND {row}.service_date IS NOT NULL"
+    sql = ""
+    for table, keys in ANALYTICS_TABLES.items():
+        values = {key: ANALYTICS_KEYS[key][1 if kind == "booking" else 2].format(row=row) for key in keys}
+        sql += ANALYTICS_DELTA.format(
+            table=table, keys=", ".join(keys), not_null=" AND ".join(f"{key} IS NOT NULL" for key in keys) + dated,
+            key_values=", ".join(f"{value} AS {key}" for key, value in values.items()), **counts)
+        if sign == "-":
+            sql += ANALYTICS_CLEANUP.format(table=table, match=" AND ".join(f"{key} = {value}" for key, value in values.items()))
+    return sql
+
+
+# Moves a provider's daily totals from one service type to another
+ANALYTICS_MOVE = """
+    INSERT INTO daily_type_stats (day, service_type, bookings, bills, pending_cents, paid_cents, cancelled_cents)
+    SELECT day, {service_type}, {sign}bookings, {sign}bills, {sign}pending_cents, {sign}paid_cents, {sign}cancelled_cents
+    FROM daily_provider_stats WHERE provider_id = {provider}
+    ON CONFLICT (day, service_type) DO UPDATE SET
+        bookings = bookings + excluded.bookings, bills = bills + excluded.bills,
+        pending_cents = pending_cents + excluded.pending_cents,
+        paid_cents = paid_cents + excluded.paid_cents,
+        cancelled_cents = cancelled_cents + excluded.cancelled_cents;
+"""
+
+
+def analytics_move(provider, old_type, new_type):
+    return (ANALYTICS_MOVE.format(service_type=old_type, sign="-", provider=provider)
+            + ANALYTICS_MOVE.format(service_type=new_type, sign="", provider=provider)
+            + ANALYTICS_CLEANUP.format(table="daily_type_stats", match=f"service_type = {old_type}"))
+
+
+def analytics_table(table, keys):
+    # Creates a table if needed and adds the whole history to it
+    return ANALYTICS_TABLE.format(
+        table=table, keys=", ".join(keys),
+        key_columns="".join(f"    {key} {ANALYTICS_KEYS[key][0]} NOT NULL,\n" for key in keys),
+        booking_keys=", ".join(f"{ANALYTICS_KEYS[key][3]} AS {key}" for key in keys),
+        bill_keys=", ".join(ANALYTICS_KEYS[key][4] for key in keys),
+        not_null=" AND ".join(f"{key} IS NOT NULL" for key in keys),
+        cents="CAST(round(COALESCE(bl.amount, 0) * 100) AS INTEGER)")
+
+
+ANALYTICS += "".join(analytics_table(table, keys) for table, keys in ANALYTICS_TABLES.items())
+
+ANALYTICS += f"""
+CREATE TRIGGER IF NOT EXISTS trg_bookings_analytics_insert AFTER INSERT ON bookings
+BEGIN
+{analytics_delta("NEW", "booking", "")}END;
+
+CREATE TRIGGER IF NOT EXISTS trg_bookings_analytics_delete AFTER DELETE ON bookings
+BEGIN
+{analytics_delta("OLD", "booking", "-")}END;
+
+CREATE TRIGGER IF NOT EXISTS trg_bookings_analytics_update AFTER UPDATE OF service_id, day, month, year ON bookings
+BEGIN
+{analytics_delta("OLD", "booking", "-")}{analytics_delta("NEW", "booking", "")}END;
+
+CREATE TRIGGER IF NOT EXISTS trg_bills_analytics_insert AFTER INSERT ON bills
+WHEN NEW.service_date IS NOT NULL
+BEGIN
+{analytics_delta("NEW", "bill", "")}END;
+
+CREATE TRIGGER IF NOT EXISTS trg_bills_analytics_update AFTER UPDATE OF status, amount, service_date, provider_id ON bills
+BEGIN
+{analytics_delta("OLD", "bill", "-")}{analytics_delta("NEW", "bill", "")}END;
+
+CREATE TRIGGER IF NOT EXISTS trg_bills_analytics_delete AFTER DELETE ON bills
+WHEN OLD.service_date IS NOT NULL
+BEGIN
+{analytics_delta("OLD", "bill", "-")}END;
+
+CREATE TRIGGER IF NOT EXISTS trg_providers_analytics_type AFTER UPDATE OF service_type ON providers
+WHEN OLD.service_type IS NOT NEW.service_type
+BEGIN
+{analytics_move("NEW.id", "COALESCE(OLD.service_type, '')", "COALESCE(NEW.service_type, '')")}END;
+
+CREATE TRIGGER IF NOT EXISTS trg_providers_analytics_delete AFTER DELETE ON providers
+WHEN COALESCE(OLD.service_type, '') <> ''
+BEGIN
+{analytics_move("OLD.id", "OLD.service_type", "''")}END;
+"""
+
+# The bookings of a service count for its provider, so the analytics
+# rollups follow a service that is deleted (its bookings are no longer
+# counted, as in analytics.py's recomputation), moved to another provider, or
+# given an id that orphaned bookings still point to. Rollups that drifted
+# before these triggers existed are recomputed.
+ANALYTICS_SERVICES = "".join(f"DELETE FROM {table};\n" + analytics_table(table, keys)
+                             for table, keys in ANALYTICS_TABLES.items())
+
+# Adds (or with {sign} "-" takes away) the bookings of one service, under
+# one provider, to one table
+ANALYTICS_SERVICE_BOOKINGS = """
+    INSERT INTO {table} ({keys}, bookings, bills, pending_cents, paid_cents, cancelled_cents)
+    SELECT {key_values}, {sign}COUNT(*), 0, 0, 0, 0
+    FROM bookings b
+    WHERE b.service_id = {service} AND {not_null}
+    GROUP BY {group}
+    ON CONFLICT ({keys}) DO UPDATE SET bookings = bookings + excluded.bookings;
+"""
+
+
+def analytics_service(service, provider, sign):
+    values = {"day": "b.booking_date", "provider_id": provider,
+              "service_type": f"COALESCE((SELECT service_type FROM providers WHERE id = {provider}), '')"}
+    sql = ""
+    for table, keys in ANALYTICS_TABLES.items():
+        sql += ANALYTICS_SERVICE_BOOKINGS.format(
+            table=table, keys=", ".join(keys), sign=sign, service=service,
+            key_values=", ".join(values[key] for key in keys),
+            not_null=" AND ".join(f"{values[key]} IS NOT NULL" for key in keys if key != "service_type"),
+            group=", ".join(values[key] for key in keys))
+        if sign == "-":
+            # Only the days this service was booked on can have emptied
+            match = " AND ".join(f"day IN (SELECT booking_date FROM bookings WHERE service_id = {service})"
+                                 if key == "day" else f"{key} = {values[key]}" for key in keys)
+            sql += ANALYTICS_CLEANUP.format(table=table, match=match)
+    return sql
+
+
+ANALYTICS_SERVICES += f"""
+CREATE TRIGGER IF NOT EXISTS trg_services_analytics_insert AFTER INSERT ON services
+BEGIN
+{analytics_service("NEW.id", "NEW.provider_id", "")}END;
+
+CREATE TRIGGER IF NOT EXISTS trg_services_analytics_delete AFTER DELETE ON services
+BEGIN
+{analytics_service("OLD.id", "OLD.provider_id", "-")}END;
+
+CREATE TRIGGER IF NOT EXISTS trg_services_analytics_update AFTER UPDATE OF id, provider_id ON services
+WHEN OLD.id IS NOT NEW.id OR OLD.provider_id IS NOT NEW.provider_id
+BEGIN
+{analytics_service("OLD.id", "OLD.provider_id", "-")}{analytics_service("NEW.id", "NEW.provider_id", "")}END;
+"""
+
+# All-time pending cents in one row, so the receivables KPI does not sum a
+# row per day of history. It follows daily_type_stats itself, so every
+# trigger, cleanup and rebuild that writes the rollup keeps it in step.
+ANALYTICS_PENDING = """
+CREATE TABLE IF NOT EXISTS analytics_totals (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    pending_cents INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR REPLACE INTO analytics_totals (id, pending_cents)
+SELECT 1, COALESCE(SUM(pending_cents), 0) FROM daily_type_stats;
+
+CREATE TRIGGER IF NOT EXISTS trg_daily_type_stats_pending_insert AFTER INSERT ON daily_type_stats
+WHEN NEW.pending_cents != 0
+BEGIN
+    UPDATE analytics_totals SET pending_cents = pending_cents + NEW.pending_cents WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_daily_type_stats_pending_update AFTER UPDATE OF pending_cents ON daily_type_stats
+WHEN NEW.pending_cents != OLD.pending_cents
+BEGIN
+    UPDATE analytics_totals SET pending_cents = pending_cents + NEW.pending_cents - OLD.pending_cents WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_daily_type_stats_pending_delete AFTER DELETE ON daily_type_stats
+WHEN OLD.pending_cents != 0
+BEGIN
+    UPDATE analytics_totals SET pending_cents = pending_cents - OLD.pending_cents WHERE id = 1;
+END;
+"""
+
+# Confidence-adjusted service scores for browsing the catalog (ranking.py).
+# service_rank holds each service's type (from its provider), its bookings
+# count and its score; (service_type, score) and score are indexed so the
+# best services, of one type or of all, are read in order and the LIMIT stops
+# the read. The triggers rescore a service whenever something its score is
+# made of changes. A score change is not a catalog change (catalog_version),
+# so cached search results follow new bookings only at the next catalog
+# change; ratings move providers.rating and so invalidate them at once.
+#
+# The SQL below is the score as this migration set it up, kept here rather
+# than taken from ranking.py so the migration always does the same thing.
+# Weights live in ranking_params and can be changed with ranking.py
+# --rebuild; a different formula needs a new migration replacing the
+# triggers.
+RANKING_PARAMS = """
+INSERT OR REPLACE INTO ranking_params
+        (id, prior_mean, prior_weight, volume_weight, volume_half, price_weight, price_half)
+    SELECT 1, COALESCE((SELECT AVG(rating) FROM ratings), 3.0), 10,
+           0.5, 20, 0.25,
+           COALESCE((SELECT AVG(payment_amount) FROM services WHERE payment_amount > 0), 100.0)
+"""
+
+RANKING_ROWS = """
+    SELECT service_id, service_type, bookings, (k.prior_weight * k.prior_mean + rating_sum) / (k.prior_weight + rating_count)
+        + k.volume_weight * bookings / (bookings + k.volume_half)
+        - k.price_weight * price / (price + k.price_half)
+    FROM ranking_params k, (
+        SELECT s.id AS service_id, COALESCE(p.service_type, '') AS service_type,
+               (SELECT COUNT(*) FROM bookings b WHERE b.service_id = s.id) AS bookings,
+               COALESCE(p.rating_sum, 0) AS rating_sum, COALESCE(p.rating_count, 0) AS rating_count,
+               MAX(COALESCE(s.payment_amount, 0), 0) AS price
+        FROM services s
+        LEFT JOIN providers p ON p.id = s.provider_id
+    )
+    WHERE k.id = 1 {where}
+"""
+
+RANKING_REFRESH = """
+    UPDATE service_rank SET
+        bookings = {bookings},
+        service_type = COALESCE((SELECT p.service_type FROM services s JOIN providers p ON p.id = s.provider_id
+                                 WHERE s.id = service_rank.service_id), ''),
+        score = (SELECT (k.prior_weight * k.prior_mean + COALESCE(p.rating_sum, 0)) / (k.prior_weight + COALESCE(p.rating_count, 0))
+        + k.volume_weight * {bookings} / ({bookings} + k.volume_half)
+        - k.price_weight * MAX(COALESCE(s.payment_amount, 0), 0) / (MAX(COALESCE(s.payment_amount, 0), 0) + k.price_half)
+                 FROM ranking_params k, services s
+                 LEFT JOIN providers p ON p.id = s.provider_id
+                 WHERE k.id = 1 AND s.id = service_rank.service_id)
+    WHERE {where};
+"""
+
+
+def ranking_refresh(where, change=""):
+    # Rescores the matching rows; change is "+ 1" or "- 1" for a booking
+    # added or taken away
+    bookings = f"(service_rank.bookings {change})" if change else "service_rank.bookings"
+    return RANKING_REFRESH.format(where=where, bookings=bookings)
+
+
+SERVICE_RANKING = f"""
+CREATE TABLE IF NOT EXISTS ranking_params (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    prior_mean REAL NOT NULL,
+    prior_weight REAL NOT NULL CHECK (prior_weight > 0),
+    volume_weight REAL NOT NULL,
+    volume_half REAL NOT NULL CHECK (volume_half > 0),
+    price_weight REAL NOT NULL,
+    price_half REAL NOT NULL CHECK (price_half > 0)
+);
+{RANKING_PARAMS.strip()};
+
+CREATE TABLE IF NOT EXISTS service_rank (
+    service_id INTEGER PRIMARY KEY,
+    service_type TEXT NOT NULL,
+    bookings INTEGER NOT NULL,
+    score REAL NOT NULL
+);
+
+INSERT INTO service_rank (service_id, service_type, bookings, score)
+{RANKING_ROWS.format(where="").strip()};
+
+CREATE INDEX IF NOT EXISTS idx_service_rank_type_score ON service_rank(service_type, score);
+CREATE INDEX IF NOT EXISTS idx_service_rank_score ON service_rank(score);
+
+CREATE TRIGGER IF NOT EXISTS trg_services_rank_insert AFTER INSERT ON services
+BEGIN
+    INSERT OR REPLACE INTO service_rank (service_id, service_type, bookings, score)
+    {RANKING_ROWS.format(where="AND service_id = NEW.id").strip()};
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_services_rank_delete AFTER DELETE ON services
+BEGIN
+    DELETE FROM service_rank WHERE service_id = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_services_rank_id AFTER UPDATE OF id ON services
+WHEN OLD.id IS NOT NEW.id
+BEGIN
+    DELETE FROM service_rank WHERE service_id = OLD.id;
+    INSERT OR REPLACE INTO service_rank (service_id, service_type, bookings, score)
+    {RANKING_ROWS.format(where="AND service_id = NEW.id").strip()};
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_services_rank_update AFTER UPDATE OF provider_id, payment_amount ON services
+BEGIN
+{ranking_refresh("service_id = NEW.id")}END;
+
+CREATE TRIGGER IF NOT EXISTS trg_providers_rank_update AFTER UPDATE OF id, service_type, rating_count, rating_sum ON providers
+BEGIN
+{ranking_refresh("service_id IN (SELECT id FROM services WHERE provider_id IN (OLD.id, NEW.id))")}END;
+
+CREATE TRIGGER IF NOT EXISTS trg_providers_rank_delete AFTER DELETE ON providers
+BEGIN
+{ranking_refresh("service_id IN (SELECT id FROM services WHERE provider_id = OLD.id)")}END;
+
+CREATE TRIGGER IF NOT EXISTS trg_bookings_rank_insert AFTER INSERT ON bookings
+BEGIN
+{ranking_refresh("service_id = NEW.service_id", "+ 1")}END;
+
+CREATE TRIGGER IF NOT EXISTS trg_bookings_rank_delete AFTER DELETE ON bookings
+BEGIN
+{ranking_refresh("service_id = OLD.service_id", "- 1")}END;
+
+CREATE TRIGGER IF NOT EXISTS trg_bookings_rank_update AFTER UPDATE OF service_id ON bookings
+WHEN OLD.service_id IS NOT NEW.service_id
+BEGIN
+{ranking_refresh("service_id = OLD.service_id", "- 1")}{ranking_refresh("service_id = NEW.service_id", "+ 1")}END;
+"""
+
+# Optional coordinates for seniors and providers, and how far a provider
+# travels. grid_cell (matching.py) is computed from the coordinates and only
+# stored in its indexes, so the providers of a type in a handful of cells
+# are a few index ranges. Cells are a tenth of a degree, numbered row by row
+# (matching.CELLS_PER_DEGREE); NULL without valid coordinates, since the
+# admin tables accept any text.
+LOCATIONS = """
+ALTER TABLE seniors ADD COLUMN latitude REAL;
+ALTER TABLE seniors ADD COLUMN longitude REAL;
+ALTER TABLE providers ADD COLUMN latitude REAL;
+ALTER TABLE providers ADD COLUMN longitude REAL;
+ALTER TABLE providers ADD COLUMN service_radius_km REAL;
+ALTER TABLE providers ADD COLUMN grid_cell INTEGER
+    GENERATED ALWAYS AS (CASE WHEN typeof(latitude) IN ('integer', 'real') AND typeof(longitude) IN ('integer', 'real')
+              AND latitude BETWEEN -90 AND 90 AND longitude BETWEEN -180 AND 180
+         THEN MIN(CAST((latitude + 90) * 10 AS INTEGER), 1799) * 3600
+              + MIN(CAST((longitude + 180) * 10 AS INTEGER), 3599)
+    END) VIRTUAL;
+
+CREATE INDEX IF NOT EXISTS idx_providers_type_cell ON providers(service_type, grid_cell);
+CREATE INDEX IF NOT EXISTS idx_providers_cell ON providers(grid_cell);
+"""
+
+# Append-only history of every bill (ledger.py). Existing bills start it with
+# a 'created' event in their current state, and each account with a snapshot
+# of its outstanding balance. Events are inserted by the bills triggers only;
+# an update only adds one if the bill now differs from its last event. The
+# SQL is written out here rather than taken from ledger.py, so this
+# migration does the same thing however ledger.py changes later.
+BILL_LEDGER = """
+CREATE TABLE IF NOT EXISTS bill_events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    bill_id INTEGER NOT NULL,
+    event TEXT NOT NULL CHECK (event IN ('created', 'paid', 'cancelled', 'reopened', 'adjusted', 'deleted')),
+    status TEXT,
+    senior_id INTEGER,
+    provider_id INTEGER,
+    amount_cents INTEGER NOT NULL,
+    recorded_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+CREATE INDEX IF NOT EXISTS idx_bill_events_bill ON bill_events(bill_id, seq);
+
+INSERT INTO bill_events (bill_id, event, status, senior_id, provider_id, amount_cents)
+SELECT bill_id, 'created', COALESCE(status, 'Pending'), senior_id, provider_id, CAST(round(COALESCE(bills.amount, 0) * 100) AS INTEGER)
+FROM bills ORDER BY bill_id;
+
+CREATE TRIGGER IF NOT EXISTS trg_bill_events_no_update BEFORE UPDATE ON bill_events
+BEGIN
+    SELECT RAISE(ABORT, 'The bill ledger is append-only');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_bill_events_no_delete BEFORE DELETE ON bill_events
+BEGIN
+    SELECT RAISE(ABORT, 'The bill ledger is append-only');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_bills_ledger_insert AFTER INSERT ON bills
+BEGIN
+    INSERT INTO bill_events (bill_id, event, status, senior_id, provider_id, amount_cents)
+    VALUES (NEW.bill_id, 'created', COALESCE(NEW.status, 'Pending'), NEW.senior_id, NEW.provider_id,
+            CAST(round(COALESCE(NEW.amount, 0) * 100) AS INTEGER));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_bills_ledger_update AFTER UPDATE OF status, amount, senior_id, provider_id ON bills
+WHEN NOT EXISTS (
+    SELECT 1 FROM bill_events
+    WHERE seq = (SELECT MAX(seq) FROM bill_events WHERE bill_id = NEW.bill_id)
+      AND status IS COALESCE(NEW.status, 'Pending') AND senior_id IS NEW.senior_id
+      AND provider_id IS NEW.provider_id AND amount_cents = CAST(round(COALESCE(NEW.amount, 0) * 100) AS INTEGER))
+BEGIN
+    INSERT INTO bill_events (bill_id, event, status, senior_id, provider_id, amount_cents)
+    VALUES (NEW.bill_id,
+            CASE WHEN COALESCE(OLD.status, 'Pending') = COALESCE(NEW.status, 'Pending') THEN 'adjusted'
+                 WHEN NEW.status = 'Paid' THEN 'paid'
+                 WHEN NEW.status = 'Cancelled' THEN 'cancelled'
+                 ELSE 'reopened' END,
+            COALESCE(NEW.status, 'Pending'), NEW.senior_id, NEW.provider_id, CAST(round(COALESCE(NEW.amount, 0) * 100) AS INTEGER));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_bills_ledger_delete AFTER DELETE ON bills
+BEGIN
+    INSERT INTO bill_events (bill_id, event, status, senior_id, provider_id, amount_cents)
+    VALUES (OLD.bill_id, 'deleted', NULL, OLD.senior_id, OLD.provider_id, CAST(round(COALESCE(OLD.amount, 0) * 100) AS INTEGER));
+END;
+"""
+
+BILL_LEDGER_ACCOUNTS = """
+CREATE TABLE IF NOT EXISTS {owner}_postings (
+    {owner}_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    delta_cents INTEGER NOT NULL,
+    PRIMARY KEY ({owner}_id, seq)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS {owner}_balance_snapshots (
+    {owner}_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    balance_cents INTEGER NOT NULL,
+    PRIMARY KEY ({owner}_id, seq)
+) WITHOUT ROWID;
+
+INSERT INTO {owner}_postings ({owner}_id, seq, delta_cents)
+SELECT {owner}_id, seq, SUM(delta)
+    FROM (
+        SELECT {owner}_id, seq, CASE WHEN status = 'Pending' THEN amount_cents ELSE 0 END AS delta FROM bill_events
+        UNION ALL
+        SELECT LAG({owner}_id) OVER previous, seq, -LAG(CASE WHEN status = 'Pending' THEN amount_cents ELSE 0 END) OVER previous FROM bill_events
+        WINDOW previous AS (PARTITION BY bill_id ORDER BY seq)
+    )
+    WHERE {owner}_id IS NOT NULL
+    GROUP BY {owner}_id, seq
+    HAVING SUM(delta) != 0
+    ORDER BY seq;
+
+INSERT INTO {owner}_balance_snapshots ({owner}_id, seq, balance_cents)
+SELECT {owner}_id, MAX(seq), SUM(delta_cents) FROM {owner}_postings GROUP BY {owner}_id;
+
+-- The bill's previous event is taken back off whichever account it was on
+CREATE TRIGGER IF NOT EXISTS trg_bill_events_{owner}_posting AFTER INSERT ON bill_events
+BEGIN
+    INSERT INTO {owner}_postings ({owner}_id, seq, delta_cents)
+    SELECT {owner}_id, NEW.seq, SUM(delta)
+    FROM (
+        SELECT * FROM (
+            SELECT {owner}_id, -(CASE WHEN status = 'Pending' THEN amount_cents ELSE 0 END) AS delta FROM bill_events
+            WHERE bill_id = NEW.bill_id AND seq < NEW.seq
+            ORDER BY seq DESC LIMIT 1)
+        UNION ALL
+        SELECT NEW.{owner}_id, CASE WHEN NEW.status = 'Pending' THEN NEW.amount_cents ELSE 0 END
+    )
+    WHERE {owner}_id IS NOT NULL
+    GROUP BY {owner}_id
+    HAVING SUM(delta) != 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_{owner}_postings_snapshot AFTER INSERT ON {owner}_postings
+WHEN (SELECT COUNT(*) FROM {owner}_postings
+      WHERE {owner}_id = NEW.{owner}_id
+        AND seq > COALESCE((SELECT MAX(seq) FROM {owner}_balance_snapshots
+                            WHERE {owner}_id = NEW.{owner}_id), 0)) >= 50
+BEGIN
+    INSERT INTO {owner}_balance_snapshots ({owner}_id, seq, balance_cents)
+    SELECT NEW.{owner}_id, NEW.seq, COALESCE((SELECT balance_cents FROM {owner}_balance_snapshots
+              WHERE {owner}_id = NEW.{owner}_id ORDER BY seq DESC LIMIT 1), 0)
+    + (SELECT COALESCE(SUM(delta_cents), 0) FROM {owner}_postings
+       WHERE {owner}_id = NEW.{owner}_id
+         AND seq > COALESCE((SELECT MAX(seq) FROM {owner}_balance_snapshots WHERE {owner}_id = NEW.{owner}_id), 0));
+END;
+"""
+
+BILL_LEDGER += "".join(BILL_LEDGER_ACCOUNTS.format(owner=owner) for owner in ("senior", "provider"))
+
+# (version, description, SQL script or function taking the connection)
+MIGRATIONS = [
+    (1, "initial schema", INITIAL_SCHEMA),
+    (2, "lookup indexes", LOOKUP_INDEXES),
+    (3, "incremental rating aggregates", RATING_AGGREGATES),
+    (4, "booking to bill link", link_bookings_to_bills),
+    (5, "indexed booking dates", BOOKING_DATES),
+    (6, "provider daily capacity", PROVIDER_CAPACITY),
+    (7, "service full-text search", SERVICE_SEARCH),
+    (8, "export marks", EXPORT_MARKS),
+    (9, "catalog change counter", CATALOG_VERSION),
+    (10, "change log", CHANGE_LOG),
+    (11, "monthly bill rollups", BILL_ROLLUPS),
+    (12, "daily analytics rollups", ANALYTICS),
+    (13, "service ranking scores", SERVICE_RANKING),
+    (14, "locations and provider grid cells", LOCATIONS),
+    (15, "bill ledger", BILL_LEDGER),
+    (16, "analytics for moved and deleted services", ANALYTICS_SERVICES),
+    (17, "capacity check on a provider's first booking of a day", CAPACITY_CHECKS),
+    (18, "running receivables total", ANALYTICS_PENDING),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def split_statements(script):
+    # sqlite3.complete_statement understands trigger bodies, so a ';' inside
+    # BEGIN ... END does not end the statement early.
+    statements, pending = [], ""
+    for line in script.splitlines(keepends=True):
+        pending += line
+        if sqlite3.complete_statement(pending):
+            if pending.strip():
+                statements.append(pending.strip())
+            pending = ""
+    if pending.strip() and not pending.strip().startswith("--"):
+        statements.append(pending.strip())
+    return statements
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    applied = []
+    for version, description, step in MIGRATIONS:
+        if schema_version(conn) >= version:
+            continue
+        # BEGIN IMMEDIATE takes the write lock before re-checking the version,
+        # so two apps starting together never run the same migration twice.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            if callable(step):
+                step(conn)
+            else:
+                for statement in split_statements(step):
+                    conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append((version, description))
+
+    if applied:
+        conn.execute("ANALYZE")
+        conn.commit()
+    return applied
+
+
+def main(argv):
+    if "--check-plans" in argv:
+        # the query list imports the app modules; the migrations never do
+        import query_plans
+        return query_plans.main()
+
+    path = argv[1] if len(argv) > 1 else "elderly_care.db"
+    conn = sqlite3.connect(path)
+    applied = migrate(conn)
+    for version, description in applied:
+        print(f"applied {version}: {description}")
+    print(f"{path} is at schema version {schema_version(conn)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,124 @@
+from database import DB_PATH, get_read_connection
+
+# -------------------------
+# Keyset Pagination
+# -------------------------
+# Reads a table one page at a time, continuing from the last row seen
+# (sort value + primary key) instead of using OFFSET, so fetching page 1000
+# costs the same as fetching page 1. Sorting and filtering happen in SQL, so
+# only the rows on screen are ever held in memory.
+#
+# A pager only sorts by the columns in `sortable` and filters on those in
+# `filterable`, and the caller lists only columns an index answers: a sort
+# column needs an index on that column alone (with the rowid it gives the
+# sort value + primary key order), a filter column must lead an index. A
+# filter that is a number matches the column exactly; any other text matches
+# it as a case-sensitive prefix, which is a range on the same index.
+
+PAGE_SIZE = 200
+
+
+class KeysetPager:
+    def __init__(self, conn, table, columns, pk, sortable=(), filterable=(), page_size=PAGE_SIZE):
+        self.conn = conn
+        self.table = table
+        self.columns = list(columns)
+        self.pk = pk
+        self.sortable = [pk, *sortable]
+        self.filterable = list(filterable)
+        self.page_size = page_size
+        self.reset()
+
+    def reset(self, sort_col=None, descending=False, filter_col=None, filter_text=""):
+        # Column names end up in the SQL text, so only known columns are accepted
+        filter_text = filter_text.strip()
+        if sort_col is not None and sort_col not in self.sortable:
+            raise ValueError(f"{self.table} cannot be sorted by {sort_col!r}")
+        if filter_text and filter_col not in self.filterable:
+            raise ValueError(f"{self.table} cannot be filtered on {filter_col!r}")
+        self.sort_col = sort_col or self.pk
+        self.descending = descending
+        self.filter_col = filter_col if filter_text else None
+        self.filter_text = filter_text
+        self.last_row = None
+        self.exhausted = False
+
+    def _filter_clause(self):
+        if self.filter_col is None:
+            return None, []
+        text = self.filter_text
+        if text.isdigit():
+            return f"{self.filter_col} = ?", [int(text)]
+        if text.replace(".", "", 1).isdigit():
+            return f"{self.filter_col} = ?", [float(text)]
+        # U+10FFFF sorts after any character that can follow the prefix
+        return f"{self.filter_col} >= ? AND {self.filter_col} < ?", [text, text + "\U0010ffff"]
+
+    def _keyset_clause(self):
+        if self.last_row is None:
+            return None, []
+        pk, col = self.pk, self.sort_col
+        last_value = self.last_row[self.columns.index(col)]
+        last_pk = self.last_row[self.columns.index(pk)]
+        op = "<" if self.descending else ">"
+        if col == pk:
+            return f"{pk} {op} ?", [last_pk]
+
+        # SQLite sorts NULLs first, so ascending pages go NULLs -> values and
+        # descending pages go values -> NULLs.
+        if last_value is None:
+            if self.descending:
+                return f"({col} IS NULL AND {pk} < ?)", [last_pk]
+            return f"(({col} IS NULL AND {pk} > ?) OR {col} IS NOT NULL)", [last_pk]
+        clause = f"({col} {op} ? OR ({col} = ? AND {pk} {op} ?)"
+        if self.descending:
+            clause += f" OR {col} IS NULL"
+        return clause + ")", [last_value, last_value, last_pk]
+
+    def page_query(self):
+        # Building the query and accepting its rows are separate steps so the
+        # query itself can run on a worker thread with its own connection.
+        where, params = [], []
+        for clause, values in (self._filter_clause(), self._keyset_clause()):
+            if clause:
+                where.append(clause)
+                params.extend(values)
+
+        direction = "DESC" if self.descending else "ASC"
+        order = f"{self.pk} {direction}"
+        if self.sort_col != self.pk:
+            order = f"{self.sort_col} {direction}, {order}"
+        sql = f"SELECT {', '.join(self.columns)} FROM {self.table}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {order} LIMIT ?"
+        return sql, (*params, self.page_size)
+
+    def accept(self, rows):
+        if len(rows) < self.page_size:
+            self.exhausted = True
+        if rows:
+            self.last_row = rows[-1]
+        return rows
+
+    def next_page(self):
+        if self.exhausted:
+            return []
+        return self.accept(self.conn.execute(*self.page_query()).fetchall())
+
+    def row_query(self, key):
+        return f"SELECT {', '.join(self.columns)} FROM {self.table} WHERE {self.pk} = ?", (key,)
+
+    def fetch_row(self, key):
+        return self.conn.execute(*self.row_query(key)).fetchone()
+
+
+def fetch_page(sql, params, path=DB_PATH):
+    # One page_query() run on a worker thread with its own connection
+    return get_read_connection(path).execute(sql, params).fetchall()
+
+
+def count_rows(table, path=DB_PATH):
+    # An exact count reads the whole table (or its smallest index), so it is
+    # only run when asked for, never on a refresh
+    return get_read_connection(path).execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
@@ -1,9 +1,15 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import sqlite3
 
-conn = sqlite3.connect("elderly_care.db")
-c = conn.cursor()
+import bookings
+import statements
+from api_client import get_backend
+from database import get_read_connection
+from executor import QueryExecutor
+from live import ChangeFeed, TreeSync
+
+# Local SQLite file, or the JSON API when ELDERLY_CARE_API is set
+backend = get_backend()
 
 class ProviderApp:
     def __init__(self, root, provider_id):
@@ -14,16 +20,27 @@ class ProviderApp:
         self.root.geometry("800x500")
 
         tk.Label(root, text="Provider Dashboard", font=("Arial", 18, "bold")).pack(pady=10)
+        self.status = tk.Label(root, text="", anchor="w")
+        self.status.pack(side="bottom", fill="x")
+        # All database work runs off the Tk thread
+        self.executor = QueryExecutor(root, self.status)
 
         notebook = ttk.Notebook(root)
         self.my_services_tab = ttk.Frame(notebook)
         self.bookings_tab = ttk.Frame(notebook)
+        self.earnings_tab = ttk.Frame(notebook)
         notebook.add(self.my_services_tab, text="My Services")
         notebook.add(self.bookings_tab, text="Bookings")
+        notebook.add(self.earnings_tab, text="Earnings")
         notebook.pack(expand=True, fill="both")
 
+        # New bookings, payments and service edits show up without a refresh
+        self.feed = ChangeFeed(root, self.executor, backend.changes_since,
+                               self.read_changes, self.apply_changes, self.reload)
         self.setup_services_tab()
         self.setup_bookings_tab()
+        self.setup_earnings_tab()
+        self.load_bookings()
 
     # -------------------- SERVICES TAB --------------------
     def setup_services_tab(self):
@@ -32,15 +49,20 @@ class ProviderApp:
         for col in ("id","name","desc","price"):
             self.tree.heading(col, text=col.capitalize())
         self.tree.pack(expand=True, fill="both")
+        self.services_view = TreeSync(self.tree)
         self.load_services()
 
         tk.Button(self.my_services_tab, text="Add Service", command=self.add_service).pack(side="left", padx=5)
         tk.Button(self.my_services_tab, text="Delete Service", command=self.delete_service).pack(side="left", padx=5)
 
     def load_services(self):
-        self.tree.delete(*self.tree.get_children())
-        for row in c.execute("SELECT id, service_name, service_description, payment_amount FROM services WHERE provider_id=?", (self.provider_id,)):
-            self.tree.insert("", "end", values=row)
+        self.executor.run(self.feed.load, backend.provider_services, self.provider_id,
+                          key="services", on_done=self.show_services)
+
+    def show_services(self, result):
+        seq, rows = result
+        self.services_view.replace(rows)
+        self.feed.loaded(seq)
 
     def add_service(self):
         new_name = simple_input("Enter Service Name:")
@@ -49,10 +71,13 @@ class ProviderApp:
         if not new_name or not new_price:
             messagebox.showerror("Error", "Service name and price are required.")
             return
-        c.execute("INSERT INTO services (service_name, provider_id, service_description, payment_amount) VALUES (?,?,?,?)",
-                  (new_name, self.provider_id, new_desc, new_price))
-        conn.commit()
-        self.load_services()
+        try:
+            price = float(new_price)
+        except ValueError:
+            messagebox.showerror("Error", "Price must be a number.")
+            return
+        self.executor.run(backend.add_service, self.provider_id, new_name, new_desc, price,
+                          write=True, on_done=lambda result: self.feed.poll())
 
     def delete_service(self):
         selected = self.tree.selection()
@@ -60,62 +85,152 @@ class ProviderApp:
             messagebox.showerror("Error", "Select a service")
             return
         sid = self.tree.item(selected[0])['values'][0]
-        c.execute("DELETE FROM services WHERE id=?", (sid,))
-        conn.commit()
-        self.load_services()
+        self.executor.run(backend.delete_service, self.provider_id, sid,
+                          write=True, on_done=lambda result: self.feed.poll())
 
     # -------------------- BOOKINGS TAB --------------------
     def setup_bookings_tab(self):
         tk.Label(self.bookings_tab, text="Bookings on My Services", font=("Arial", 14)).pack(pady=5)
+
+        # Date range selector: All / Upcoming / Past / Between (From - To)
+        range_frame = tk.Frame(self.bookings_tab)
+        range_frame.pack(pady=5)
+        tk.Label(range_frame, text="Show:").grid(row=0, column=0, padx=3)
+        self.booking_view = ttk.Combobox(range_frame, values=bookings.VIEWS, state="readonly", width=10)
+        self.booking_view.set("All")
+        self.booking_view.grid(row=0, column=1, padx=3)
+        tk.Label(range_frame, text="From (D/M/YYYY):").grid(row=0, column=2, padx=3)
+        self.booking_from = tk.Entry(range_frame, width=12)
+        self.booking_from.grid(row=0, column=3, padx=3)
+        tk.Label(range_frame, text="To:").grid(row=0, column=4, padx=3)
+        self.booking_to = tk.Entry(range_frame, width=12)
+        self.booking_to.grid(row=0, column=5, padx=3)
+        self.booking_view.bind("<<ComboboxSelected>>", lambda event: self.load_bookings())
+
         self.book_tree = ttk.Treeview(self.bookings_tab, columns=("booking_id","senior","service","date","bill_status"), show="headings")
         for col in ("booking_id","senior","service","date","bill_status"):
             self.book_tree.heading(col, text=col.capitalize())
         self.book_tree.pack(expand=True, fill="both")
+        self.bookings_view = TreeSync(self.book_tree, display=lambda row: (
+            row[0], row[1], row[2], bookings.format_date(row[3]), row[4]), sort_key=lambda row: (row[3], row[0]))
+        self.booking_range = ("All", None, None)
         tk.Button(self.bookings_tab, text="Refresh", command=self.load_bookings).pack(pady=5)
         tk.Button(self.bookings_tab, text="Mark Selected as Paid", command=self.mark_paid).pack(pady=5)
 
     def load_bookings(self):
-        self.book_tree.delete(*self.book_tree.get_children())
-
-        query = """
-        SELECT 
-            b.booking_id,
-            s2.name AS senior_name,
-            s1.service_name,
-            b.day, b.month, b.year,
-            COALESCE(bi.status, 'No Bill') AS bill_status
-        FROM bookings b
-        JOIN services s1 ON b.service_id = s1.id
-        JOIN seniors s2 ON b.senior_id = s2.id
-        LEFT JOIN bills bi 
-            ON bi.senior_id = b.senior_id
-            AND bi.provider_id = s1.provider_id
-            AND bi.amount = s1.payment_amount
-        WHERE s1.provider_id = ?
-        ORDER BY b.year DESC, b.month DESC, b.day DESC
-    """
-
-        for row in c.execute(query, (self.provider_id,)):
-            booking_id, senior_name, service_name, day, month, year, bill_status = row
-            date_str = f"{day}/{month}/{year}"
-            self.book_tree.insert("", "end", values=(booking_id, senior_name, service_name, date_str, bill_status))
+        view = self.booking_view.get()
+        start = end = None
+        try:
+            if view == "Between":
+                start = bookings.parse_date(self.booking_from.get())
+                end = bookings.parse_date(self.booking_to.get())
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        self.booking_range = (view, start, end)
+        self.executor.run(self.feed.load, backend.provider_bookings, self.provider_id, view, start, end,
+                          key="bookings", on_done=self.show_bookings)
+
+    def show_bookings(self, result):
+        seq, rows = result
+        view, start, end = self.booking_range
+        self.bookings_view.replace(rows, descending=bookings.view_range(view, start, end)[2])
+        self.feed.loaded(seq)
+
+    # -------------------- EARNINGS TAB --------------------
+    def setup_earnings_tab(self):
+        tk.Label(self.earnings_tab, text="Monthly Payouts", font=("Arial", 14)).pack(pady=5)
+
+        # Months of service, from the monthly rollups; To may be left open
+        range_frame = tk.Frame(self.earnings_tab)
+        range_frame.pack(pady=5)
+        first, last = statements.recent_months()
+        tk.Label(range_frame, text="From (M/YYYY):").grid(row=0, column=0, padx=3)
+        self.payout_from = tk.Entry(range_frame, width=10)
+        self.payout_from.insert(0, statements.format_month(first))
+        self.payout_from.grid(row=0, column=1, padx=3)
+        tk.Label(range_frame, text="To:").grid(row=0, column=2, padx=3)
+        self.payout_to = tk.Entry(range_frame, width=10)
+        self.payout_to.grid(row=0, column=3, padx=3)
+        tk.Button(range_frame, text="Show", command=self.load_payouts).grid(row=0, column=4, padx=3)
+
+        self.payout_tree = ttk.Treeview(self.earnings_tab, columns=("month", "paid", "pending", "cancelled", "bills"), show="headings")
+        for col in ("month", "paid", "pending", "cancelled", "bills"):
+            self.payout_tree.heading(col, text=col.capitalize())
+        self.payout_tree.pack(expand=True, fill="both")
+        self.payouts_view = TreeSync(self.payout_tree, display=lambda row: (
+            statements.format_month(row[0]), f"{row[2]:.2f}", f"{row[1]:.2f}", f"{row[3]:.2f}", row[4]))
+        self.payout_totals = tk.Label(self.earnings_tab, text="")
+        self.payout_totals.pack(pady=5)
+        # Everything still pending, from the billing ledger (ledger.py)
+        self.balance_label = tk.Label(self.earnings_tab, text="", font=("Arial", 12))
+        self.balance_label.pack(pady=5)
+        self.payout_range = (first, last)
+        self.refresh_payouts()
+
+    def load_payouts(self):
+        try:
+            first = statements.parse_month(self.payout_from.get()) if self.payout_from.get().strip() else None
+            last = statements.parse_month(self.payout_to.get()) if self.payout_to.get().strip() else None
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        self.payout_range = (first, last)
+        self.refresh_payouts()
+
+    def refresh_payouts(self):
+        # The range last shown, so live updates do not re-read half-typed months
+        self.executor.run(backend.provider_payouts, self.provider_id, *self.payout_range,
+                          key="payouts", on_done=self.show_payouts)
+        self.executor.run(backend.provider_balance, self.provider_id, key="balance", on_done=lambda balance:
+                          self.balance_label.config(text=f"Outstanding: ${balance:.2f}"))
+
+    def show_payouts(self, rows):
+        self.payouts_view.replace(rows)
+        pending, paid, cancelled, count = statements.period_totals(rows)
+        self.payout_totals.config(text=f"Paid: ${paid:.2f}    Pending: ${pending:.2f}    "
+                                       f"Cancelled: ${cancelled:.2f}    Bills: {count}")
+
+    # -------------------- LIVE UPDATES --------------------
+    def read_changes(self, changes):
+        # Runs on a reader thread: re-read only the rows that changed
+        rows = {}
+        if changes["services"]:
+            rows["services"] = backend.provider_services(self.provider_id, changes["services"])
+        if changes["bookings"] or changes["bills"]:
+            rows["range"] = self.booking_range
+            rows["bookings"] = backend.provider_bookings(self.provider_id, *rows["range"],
+                                                         booking_ids=changes["bookings"], bill_ids=changes["bills"])
+        return rows
+
+    def apply_changes(self, changes, rows):
+        if "services" in rows:
+            self.services_view.update(rows["services"], changes["services"])
+            # Service names appear in the bookings list too; edits are rare
+            self.load_bookings()
+        if "bookings" in rows and rows["range"] == self.booking_range:
+            self.bookings_view.update(rows["bookings"], changes["bookings"])
+        if changes["bills"]:
+            self.refresh_payouts()  # a row per month, read by key
+
+    def reload(self):
+        self.load_services()
+        self.load_bookings()
+        self.refresh_payouts()
 
     def mark_paid(self):
         selected = self.book_tree.selection()
         if not selected:
             messagebox.showerror("Error", "Select a booking")
             return
-        booking_id = self.book_tree.item(selected[0])['values'][0]
-        booking = c.execute("SELECT senior_id, service_id FROM bookings WHERE booking_id=?", (booking_id,)).fetchone()
-        if booking:
-            senior_id, service_id = booking
-            c.execute("UPDATE bills SET status='Paid' WHERE senior_id=? AND provider_id=? AND amount=(SELECT payment_amount FROM services WHERE id=?)",
-                      (senior_id, self.provider_id, service_id))
-            conn.commit()
-            messagebox.showinfo("Success", "Bill marked as Paid")
-            self.load_bookings()
-        else:
-            messagebox.showerror("Error", "Booking not found")
+        # Several selected bookings are settled in one transaction
+        booking_ids = [self.book_tree.item(item)['values'][0] for item in selected]
+
+        def paid(count):
+            messagebox.showinfo("Success", "Bill marked as Paid" if count == 1 else f"{count} bills marked as Paid")
+            self.feed.poll()
+
+        self.executor.run(backend.mark_bookings_paid, self.provider_id, booking_ids, write=True, on_done=paid)
 
 
 # -------------------- HELPER: SIMPLE INPUT POPUP --------------------
@@ -147,7 +262,7 @@ def provider_login():
         if not pid.isdigit():
             messagebox.showerror("Error", "Provider ID must be numeric")
             return
-        provider = c.execute("SELECT id FROM providers WHERE id=?", (pid,)).fetchone()
+        provider = get_read_connection().execute("SELECT id FROM providers WHERE id=?", (pid,)).fetchone()
         if provider:
             login.destroy()
             ProviderApp(root, int(pid))
@@ -158,10 +273,13 @@ def provider_login():
     login.wait_window()
 
 # -------------------- MAIN --------------------
-root = tk.Tk()
-root.withdraw()  # Hide main window until login success
-provider_login()
-root.deiconify()  # Show dashboard only after login
-root.mainloop()
+# Start_App.py opens ProviderApp in its own window after login; running this
+# file directly asks for a provider ID instead.
+if __name__ == "__main__":
+    root = tk.Tk()
+    root.withdraw()  # Hide main window until login success
+    provider_login()
+    root.deiconify()  # Show dashboard only after login
+    root.mainloop()
 
 
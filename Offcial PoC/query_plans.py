@@ -0,0 +1,99 @@
+import sqlite3
+
+import analytics
+import billing
+import bookings
+import catalog
+import changes
+import ledger
+import matching
+import statements
+from migrations import migrate
+
+# -------------------------
+# Query Plan Checks
+# -------------------------
+# The per-user dashboard queries must be answered from an index. Run
+# `python migrations.py --check-plans` after changing the schema or a query.
+# The list lives here rather than in migrations.py so that migrating a
+# database never depends on the current app code.
+
+DASHBOARD_QUERIES = {
+    "SeniorApp.load_bills": (billing.SENIOR_BILL_ROWS, (1,)),
+    "ProviderApp.load_services": (catalog.PROVIDER_SERVICES, (1,)),
+    "ProviderApp.load_bookings": (
+        bookings.PROVIDER_BOOKINGS.format(order="DESC"), (1, bookings.MIN_DATE, bookings.MAX_DATE)),
+    "SeniorApp.load_bookings": (
+        bookings.SENIOR_BOOKINGS.format(order="ASC"), (1, "2025-01-01", "2025-01-07")),
+    "SeniorApp.show_available_dates": (
+        bookings.FULL_DAYS, (1, "2025-01-01")),
+    "SeniorApp.load_services (browse)": (
+        catalog.FACET_SEARCH.format(type_filter=catalog.RANKED_TYPE_FILTER),
+        {"service_type": "Nursing", "min_price": 0, "max_price": 500, "min_rating": 3, "limit": 50}),
+    "SeniorApp.load_services (nearby)": (
+        matching.NEARBY_SERVICES.format(type_filter=catalog.TYPE_FILTER, text_filter=""),
+        {"cells": "[[1000, 1003], [4600, 4603]]", "latitude": 40.0, "longitude": -75.0, "longitude_scale": 0.6,
+         "reach": 0.05, "degrees_per_km": 0.0001, "service_type": "Nursing", "min_price": 0, "max_price": 500,
+         "min_rating": 3, "limit": 50}),
+    "SeniorApp.load_services (nearby, any type)": (
+        matching.NEARBY_SERVICES.format(type_filter="", text_filter=""),
+        {"cells": "[[1000, 1003], [4600, 4603]]", "latitude": 40.0, "longitude": -75.0, "longitude_scale": 0.6,
+         "reach": 0.05, "degrees_per_km": 0.0001, "min_price": 0, "max_price": 500, "min_rating": 3, "limit": 50}),
+    "SeniorApp.load_services (search)": (
+        catalog.TEXT_SEARCH.format(type_filter=""),
+        {"match": '"nurs"*', "min_price": 0, "max_price": 500, "min_rating": 3, "limit": 50}),
+    "ProviderApp live bookings": (
+        bookings.PROVIDER_BOOKING_CHANGES, ("[1, 2]", "[3]", 1, bookings.MIN_DATE, bookings.MAX_DATE)),
+    "SeniorApp live bookings": (
+        bookings.SENIOR_BOOKING_CHANGES, ("[1, 2]", "[3]", 1, bookings.MIN_DATE, bookings.MAX_DATE)),
+    "SeniorApp live bills": (billing.SENIOR_BILL_CHANGES, ("[1, 2]", 1)),
+    "change feed": (changes.CHANGES_SINCE, (1, 2)),
+    "SeniorApp.load_statements": (statements.SENIOR_MONTHLY, (1, "2024-01", statements.MAX_MONTH)),
+    "ProviderApp.refresh_payouts": (statements.PROVIDER_MONTHLY, (1, "2024-01", "2024-12")),
+    "AdminDashboard.refresh_analytics (totals)": (analytics.PERIOD_TOTALS, ("2024-01-01", "2024-12-31")),
+    "AdminDashboard.refresh_analytics (receivables)": (analytics.RECEIVABLES, ("2024-06-30",)),
+    "AdminDashboard.refresh_analytics (monthly)": (analytics.MONTHLY_BY_TYPE, ("2024-01-01", "2024-12-31")),
+    "AdminDashboard.refresh_analytics (top providers)": (
+        analytics.TOP_PROVIDERS_BY_REVENUE, ("2024-01-01", "2024-12-31", analytics.TOP_PROVIDERS)),
+    "SeniorApp.load_balance": (ledger.SENIOR_BALANCE, {"account": 1}),
+    "ProviderApp.load_balance": (ledger.PROVIDER_BALANCE, {"account": 1}),
+    "ProviderApp.mark_paid": ("""
+        SELECT b.bill_id FROM bookings b
+        JOIN services s ON b.service_id = s.id
+        WHERE b.booking_id = ? AND s.provider_id = ?
+    """, (1, 1)),
+}
+
+
+def full_scans(conn, sql, params):
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    # A full scan shows up as "SCAN <table>"; "SCAN ... USING COVERING INDEX"
+    # is still a pass over every entry, so it counts as well. FTS5 lookups
+    # are reported as "SCAN <table> VIRTUAL TABLE INDEX", which is its own index,
+    # and a scan of a CO-ROUTINE (a WITH clause) only reads the rows it made.
+    # "SCAN CONSTANT ROW" is a SELECT without FROM, around scalar subqueries.
+    coroutines = {row[3].split()[-1] for row in plan if row[3].startswith("CO-ROUTINE")}
+    return [row[3] for row in plan
+            if row[3].startswith("SCAN") and "VIRTUAL TABLE INDEX" not in row[3]
+            and row[3] != "SCAN CONSTANT ROW"
+            and row[3].split()[1] not in coroutines]
+
+
+def check_query_plans(conn):
+    problems = {}
+    for name, (sql, params) in DASHBOARD_QUERIES.items():
+        scans = full_scans(conn, sql, params)
+        if scans:
+            problems[name] = scans
+    return problems
+
+
+def main():
+    conn = sqlite3.connect(":memory:")
+    migrate(conn)
+    problems = check_query_plans(conn)
+    for name in DASHBOARD_QUERIES:
+        print(f"{'FAIL' if name in problems else 'ok  '} {name}")
+        for detail in problems.get(name, []):
+            print(f"       {detail}")
+    return 1 if problems else 0
@@ -0,0 +1,128 @@
+import sys
+
+# -------------------------
+# Service Ranking
+# -------------------------
+# Browsing the catalog lists services best first by a score kept in
+# service_rank (migration 13), one row per service:
+#
+#   (PRIOR_WEIGHT * prior mean + sum of ratings) / (PRIOR_WEIGHT + ratings)
+#   + VOLUME_WEIGHT * bookings / (bookings + VOLUME_HALF)
+#   - PRICE_WEIGHT * price / (price + average price)
+#
+# The first term is a Bayesian average of the provider's ratings: every
+# provider starts with PRIOR_WEIGHT ratings at the mean of all ratings, so a
+# single 5-star rating barely moves it while hundreds of 4.8s settle near
+# 4.8. The other two add at most VOLUME_WEIGHT for a well-booked service and
+# take away at most PRICE_WEIGHT for an expensive one; set either weight to 0
+# to leave it out. Triggers rescore a service when its bookings, price or
+# provider's ratings change, and (service_type, score) is indexed, so the top
+# K of a type is an index range read however large the catalog is.
+#
+# The prior mean and the average price are fixed in ranking_params when the
+# scores are (re)built, so one new rating never rescores the whole catalog;
+# --rebuild refreshes them, and the weights below with them. The triggers run
+# migration 13's own copy of SCORE: changing the formula here also needs a
+# new migration that replaces them, or the triggers and --check disagree.
+#
+# python ranking.py [db] --check      compare the scores with a recomputation
+# python ranking.py [db] --rebuild    refresh the parameters and all scores
+
+PRIOR_WEIGHT = 10
+DEFAULT_PRIOR_MEAN = 3.0      # before there are any ratings
+VOLUME_WEIGHT = 0.5
+VOLUME_HALF = 20              # bookings at which a service gets half of VOLUME_WEIGHT
+PRICE_WEIGHT = 0.25
+DEFAULT_PRICE_HALF = 100.0    # before there are any priced services
+
+# Score of one service; the placeholders are SQL for its figures, k is the
+# ranking_params row
+SCORE = """(k.prior_weight * k.prior_mean + {rating_sum}) / (k.prior_weight + {rating_count})
+        + k.volume_weight * {bookings} / ({bookings} + k.volume_half)
+        - k.price_weight * {price} / ({price} + k.price_half)"""
+
+SET_PARAMS = f"""
+    INSERT OR REPLACE INTO ranking_params
+        (id, prior_mean, prior_weight, volume_weight, volume_half, price_weight, price_half)
+    SELECT 1, COALESCE((SELECT AVG(rating) FROM ratings), {DEFAULT_PRIOR_MEAN}), {PRIOR_WEIGHT},
+           {VOLUME_WEIGHT}, {VOLUME_HALF}, {PRICE_WEIGHT},
+           COALESCE((SELECT AVG(payment_amount) FROM services WHERE payment_amount > 0), {DEFAULT_PRICE_HALF})
+"""
+
+# (service_id, service_type, bookings, score) recomputed from scratch
+RANK_ROWS = """
+    SELECT service_id, service_type, bookings, {score}
+    FROM ranking_params k, (
+        SELECT s.id AS service_id, COALESCE(p.service_type, '') AS service_type,
+               (SELECT COUNT(*) FROM bookings b WHERE b.service_id = s.id) AS bookings,
+               COALESCE(p.rating_sum, 0) AS rating_sum, COALESCE(p.rating_count, 0) AS rating_count,
+               MAX(COALESCE(s.payment_amount, 0), 0) AS price
+        FROM services s
+        LEFT JOIN providers p ON p.id = s.provider_id
+    )
+    WHERE k.id = 1 {where}
+""".format(score=SCORE.format(rating_sum="rating_sum", rating_count="rating_count",
+                              bookings="bookings", price="price"), where="{where}")
+
+# Rescores the matching rows, keeping (or adjusting) their stored bookings
+# count; used by the triggers
+RANK_REFRESH = """
+    UPDATE service_rank SET
+        bookings = {bookings},
+        service_type = COALESCE((SELECT p.service_type FROM services s JOIN providers p ON p.id = s.provider_id
+                                 WHERE s.id = service_rank.service_id), ''),
+        score = (SELECT {score}
+                 FROM ranking_params k, services s
+                 LEFT JOIN providers p ON p.id = s.provider_id
+                 WHERE k.id = 1 AND s.id = service_rank.service_id)
+    WHERE {where};
+"""
+
+
+def rank_refresh(where, change=""):
+    # change: "+ 1" or "- 1" for a booking added or taken away
+    bookings = f"(service_rank.bookings {change})" if change else "service_rank.bookings"
+    return RANK_REFRESH.format(where=where, bookings=bookings, score=SCORE.format(
+        rating_sum="COALESCE(p.rating_sum, 0)", rating_count="COALESCE(p.rating_count, 0)",
+        bookings=bookings, price="MAX(COALESCE(s.payment_amount, 0), 0)"))
+
+
+def check_scores(conn, tolerance=1e-9):
+    # Returns [(service_id, stored row, recomputed row)] where they differ
+    stored = {row[0]: row[1:] for row in conn.execute(
+        "SELECT service_id, service_type, bookings, score FROM service_rank")}
+    expected = {row[0]: row[1:] for row in conn.execute(RANK_ROWS.format(where=""))}
+
+    def same(a, b):
+        return a is not None and b is not None and a[:2] == b[:2] and abs(a[2] - b[2]) <= tolerance
+
+    return sorted((service_id, stored.get(service_id), expected.get(service_id))
+                  for service_id in stored.keys() | expected.keys()
+                  if not same(stored.get(service_id), expected.get(service_id)))
+
+
+def rebuild_scores(conn):
+    # A write queue operation. New parameters reorder the catalog, so cached
+    # search results are dropped too.
+    conn.execute(SET_PARAMS)
+    conn.execute("DELETE FROM service_rank")
+    conn.execute("INSERT INTO service_rank (service_id, service_type, bookings, score) " + RANK_ROWS.format(where=""))
+    conn.execute("UPDATE catalog_version SET version = version + 1 WHERE id = 1")
+
+
+if __name__ == "__main__":
+    from database import DB_PATH, get_connection
+    from writer import get_writer
+
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    path = args[0] if args else DB_PATH
+    conn = get_connection(path)
+    if "--rebuild" in sys.argv:
+        get_writer(path).call(rebuild_scores)
+        print("service scores rebuilt")
+    diffs = check_scores(conn)
+    if diffs:
+        print(f"{len(diffs)} services have stale scores, e.g. {diffs[:3]}")
+    else:
+        print("service scores match the ratings and bookings")
+    sys.exit(1 if diffs else 0)
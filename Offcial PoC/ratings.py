@@ -0,0 +1,74 @@
+import sys
+
+from database import get_connection
+from writer import get_writer
+
+# -------------------------
+# Provider Rating Aggregates
+# -------------------------
+# providers.rating_count / rating_sum are maintained by triggers on ratings
+# (see migration 3). These helpers compare them against the ratings table and
+# rebuild them when they have drifted, e.g. after editing the file by hand.
+
+EXPECTED_AGGREGATES = """
+    SELECT p.id, p.rating_count, p.rating_sum,
+           COUNT(r.rating) AS expected_count,
+           COALESCE(SUM(r.rating), 0) AS expected_sum
+    FROM providers p
+    LEFT JOIN ratings r ON r.provider_id = p.id
+    GROUP BY p.id
+"""
+
+
+def submit_rating(conn, senior_id, provider_id, rating):
+    if rating < 1 or rating > 5:
+        raise ValueError("Rating must be between 1 and 5")
+    if not conn.execute("SELECT 1 FROM providers WHERE id=?", (provider_id,)).fetchone():
+        raise LookupError("Provider not found")
+    # The aggregate triggers run inside the write queue's transaction too
+    conn.execute("INSERT INTO ratings (senior_id, provider_id, rating) VALUES (?,?,?)",
+                 (senior_id, provider_id, rating))
+
+
+def check_rating_aggregates(conn):
+    mismatches = []
+    for pid, count, total, expected_count, expected_sum in conn.execute(EXPECTED_AGGREGATES):
+        if (count, total) != (expected_count, expected_sum):
+            mismatches.append((pid, count, total, expected_count, expected_sum))
+    return mismatches
+
+
+def rebuild_rating_aggregates(conn):
+    # A write queue operation: both updates commit together
+    conn.execute("""
+        UPDATE providers SET
+            rating_count = (SELECT COUNT(rating) FROM ratings WHERE provider_id = providers.id),
+            rating_sum = (SELECT COALESCE(SUM(rating), 0) FROM ratings WHERE provider_id = providers.id)
+    """)
+    conn.execute("""
+        UPDATE providers
+        SET rating = CASE WHEN rating_count > 0 THEN rating_sum * 1.0 / rating_count ELSE 0 END
+    """)
+
+
+# -------------------------
+# Consistency Check Command
+# -------------------------
+# python ratings.py            report providers whose aggregates are wrong
+# python ratings.py --rebuild  recompute every provider from the ratings table
+def main(argv):
+    if "--rebuild" in argv:
+        get_writer().call(rebuild_rating_aggregates)
+        print("Rating aggregates rebuilt from ratings table.")
+        return 0
+
+    mismatches = check_rating_aggregates(get_connection())
+    for pid, count, total, expected_count, expected_sum in mismatches:
+        print(f"provider {pid}: count {count} (expected {expected_count}), "
+              f"sum {total} (expected {expected_sum})")
+    print(f"{len(mismatches)} provider(s) with inconsistent rating aggregates.")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,216 @@
+import argparse
+import datetime
+import itertools
+import math
+import os
+import random
+import sys
+import time
+
+import auth
+from catalog import SERVICE_TYPES
+from database import get_connection
+from matching import KM_PER_DEGREE
+
+# -------------------------
+# Synthetic Data Generator
+# -------------------------
+# python seed.py bench.db --bookings 100000
+#
+# Fills an empty database with realistic-looking volumes for scaling tests.
+# The skew follows what real usage looks like:
+#   - provider popularity is Zipf-like, so a few providers take most bookings
+#     and ratings;
+#   - most seniors rebook a service they have used before;
+#   - bookings spread over DAYS around today, so both Upcoming and Past
+#     views have data, and no provider is booked past its daily capacity.
+#   - seniors and most providers are spread evenly over a square region
+#     REGION_KM across, and providers travel SERVICE_AREAS_KM (None: anywhere).
+# Every booking gets its linked bill, as book_service does. All seeded users
+# share one password hash (SEED_PASSWORD), since hashing a million distinct
+# passwords would take hours and tells us nothing about query speed.
+
+SEED_PASSWORD = "password"
+DAYS = 730
+ZIPF_EXPONENT = 1.1
+REBOOK_CHANCE = 0.7
+PAID_SHARE = 0.8  # of bills for bookings already past
+BATCH_ROWS = 50_000
+REGION_CENTER = (40.0, -75.0)
+REGION_KM = 200
+LOCATED_SHARE = 0.9  # of providers; the rest have no coordinates
+SERVICE_AREAS_KM = [None, 10, 25, 50]
+
+
+def default_sizes(bookings):
+    # The mix used by the benchmark: 10 bookings per senior, 100 per provider
+    providers = max(10, bookings // 100)
+    return {
+        "seniors": max(10, bookings // 10),
+        "providers": providers,
+        "services": providers * 3,
+        "bookings": bookings,
+        "ratings": bookings // 2,
+    }
+
+
+def _batched(rows, size=BATCH_ROWS):
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _zipf_weights(n, exponent=ZIPF_EXPONENT):
+    return list(itertools.accumulate(1 / (rank + 1) ** exponent for rank in range(n)))
+
+
+def _place(rng):
+    # A random point in the region, as (latitude, longitude)
+    latitude = REGION_CENTER[0] + (rng.random() - 0.5) * REGION_KM / KM_PER_DEGREE
+    longitude = REGION_CENTER[1] + (rng.random() - 0.5) * REGION_KM / KM_PER_DEGREE / math.cos(
+        math.radians(REGION_CENTER[0]))
+    return latitude, longitude
+
+
+def seed(conn, seniors, providers, services, bookings, ratings, random_seed=0, today=None):
+    if conn.execute("SELECT EXISTS (SELECT 1 FROM seniors) OR EXISTS (SELECT 1 FROM providers)").fetchone()[0]:
+        raise ValueError("seed.py only fills an empty database")
+    rng = random.Random(random_seed)
+    today = today or datetime.date.today()
+    first_day = today - datetime.timedelta(days=DAYS // 2)
+    password_hash = auth.hash_password(SEED_PASSWORD)
+
+    # Providers: the most popular get room for about twice their expected
+    # bookings per day, the rest keep the default capacity of 3
+    provider_weights = _zipf_weights(providers)
+    total_weight = provider_weights[-1]
+    capacities = [max(3, math.ceil(2 * bookings / DAYS / total_weight / (rank + 1) ** ZIPF_EXPONENT))
+                  for rank in range(providers)]
+    provider_order = list(range(1, providers + 1))
+    rng.shuffle(provider_order)  # popularity is not tied to id order
+    # Locations come from their own generator, so the rest of the data is the
+    # same as it was before seniors and providers had any
+    places = random.Random(random_seed + 1)
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany(
+            "INSERT INTO seniors (id, name, age, email, password, latitude, longitude) VALUES (?,?,?,?,?,?,?)",
+            ((i, f"Senior {i}", rng.randint(65, 99), f"senior{i}@example.com", password_hash, *_place(places))
+             for i in range(1, seniors + 1)))
+        conn.executemany(
+            "INSERT INTO providers (id, name, age, service_type, email, password, daily_capacity, "
+            "latitude, longitude, service_radius_km) VALUES (?,?,?,?,?,?,?,?,?,?)",
+            ((pid, f"Provider {pid}", rng.randint(25, 65), rng.choice(SERVICE_TYPES),
+              f"provider{pid}@example.com", password_hash, capacities[rank],
+              *(_place(places) if places.random() < LOCATED_SHARE else (None, None)),
+              places.choice(SERVICE_AREAS_KM))
+             for rank, pid in enumerate(provider_order)))
+
+        # Services hang off providers; a popular provider's services are popular
+        service_provider = {}
+        service_rows = []
+        for sid in range(1, services + 1):
+            rank = sid % providers if sid <= providers else rng.randrange(providers)
+            pid = provider_order[rank]
+            service_provider[sid] = (pid, rank)
+            service_type = SERVICE_TYPES[sid % len(SERVICE_TYPES)]
+            service_rows.append((sid, f"{service_type} visit {sid}", pid,
+                                 f"{service_type} care from provider {pid}", float(rng.randrange(20, 500, 5))))
+        conn.executemany("INSERT INTO services (id, service_name, provider_id, service_description, payment_amount) "
+                         "VALUES (?,?,?,?,?)", service_rows)
+        prices = {sid: price for sid, _, _, _, price in service_rows}
+        services_by_rank = {}
+        for sid, (pid, rank) in service_provider.items():
+            services_by_rank.setdefault(rank, []).append(sid)
+
+        # Bookings and their bills
+        day_load = {}
+        history = {}
+        senior_weights = _zipf_weights(seniors, 0.5)
+
+        def pick_booking():
+            senior_id = rng.choices(range(1, seniors + 1), cum_weights=senior_weights)[0]
+            past = history.get(senior_id)
+            if past and rng.random() < REBOOK_CHANCE:
+                service_id = rng.choice(past)
+            else:
+                rank = rng.choices(range(providers), cum_weights=provider_weights)[0]
+                service_id = rng.choice(services_by_rank[rank])
+                history.setdefault(senior_id, []).append(service_id)
+            pid, rank = service_provider[service_id]
+            day = first_day + datetime.timedelta(days=rng.randrange(DAYS))
+            misses = 0
+            while day_load.get((pid, day), 0) >= capacities[rank]:
+                # Try other random days; if the provider is nearly full, walk
+                # forward instead (possibly past the window) so this always ends
+                misses += 1
+                if misses < 20:
+                    day = first_day + datetime.timedelta(days=rng.randrange(DAYS))
+                else:
+                    day += datetime.timedelta(days=1)
+            day_load[(pid, day)] = day_load.get((pid, day), 0) + 1
+            return senior_id, service_id, pid, day
+
+        for batch in _batched(pick_booking() for _ in range(bookings)):
+            start = conn.execute("SELECT COALESCE(MAX(booking_id), 0) FROM bookings").fetchone()[0] + 1
+            conn.executemany(
+                "INSERT INTO bills (bill_id, status, senior_id, provider_id, amount) VALUES (?,?,?,?,?)",
+                ((start + i, "Paid" if day < today and rng.random() < PAID_SHARE else "Pending",
+                  senior_id, pid, prices[service_id])
+                 for i, (senior_id, service_id, pid, day) in enumerate(batch)))
+            conn.executemany(
+                "INSERT INTO bookings (booking_id, senior_id, service_id, day, month, year, bill_id) "
+                "VALUES (?,?,?,?,?,?,?)",
+                ((start + i, senior_id, service_id, day.day, day.month, day.year, start + i)
+                 for i, (senior_id, service_id, pid, day) in enumerate(batch)))
+
+        # Ratings, skewed the same way as bookings, mostly positive
+        def pick_rating():
+            rank = rng.choices(range(providers), cum_weights=provider_weights)[0]
+            return (rng.randint(1, seniors), provider_order[rank],
+                    rng.choices([1, 2, 3, 4, 5], weights=[1, 1, 3, 6, 8])[0])
+
+        for batch in _batched(pick_rating() for _ in range(ratings)):
+            conn.executemany("INSERT INTO ratings (senior_id, provider_id, rating) VALUES (?,?,?)", batch)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    conn.execute("ANALYZE")
+    conn.commit()
+    return {"seniors": seniors, "providers": providers, "services": services,
+            "bookings": bookings, "bills": bookings, "ratings": ratings}
+
+
+def seed_file(path, sizes, random_seed=0):
+    if os.path.exists(path):
+        raise ValueError(f"{path} already exists; seed.py only creates new databases")
+    return seed(get_connection(path), random_seed=random_seed, **sizes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill a new database with synthetic data")
+    parser.add_argument("db", help="path of the database to create")
+    parser.add_argument("--bookings", type=int, default=10_000,
+                        help="number of bookings (and bills); the other sizes default from it")
+    for table in ("seniors", "providers", "services", "ratings"):
+        parser.add_argument(f"--{table}", type=int)
+    parser.add_argument("--seed", type=int, default=0, help="random seed, for repeatable data")
+    args = parser.parse_args()
+
+    sizes = default_sizes(args.bookings)
+    for table in sizes:
+        if getattr(args, table) is not None:
+            sizes[table] = getattr(args, table)
+    started = time.perf_counter()
+    try:
+        counts = seed_file(args.db, sizes, args.seed)
+    except ValueError as e:
+        print(e)
+        sys.exit(2)
+    print(", ".join(f"{count:,} {table}" for table, count in counts.items()))
+    print(f"seeded {args.db} in {time.perf_counter() - started:.1f}s (password for every user: {SEED_PASSWORD!r})")
@@ -1,12 +1,20 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import sqlite3
+
+import bookings
+import catalog
+import matching
+import statements
+from api_client import get_backend
+from database import get_read_connection
+from executor import QueryExecutor
+from live import ChangeFeed, TreeSync
 
 # -------------------------
 # Database Connection
 # -------------------------
-conn = sqlite3.connect("elderly_care.db")
-c = conn.cursor()
+# Local SQLite file, or the JSON API when ELDERLY_CARE_API is set
+backend = get_backend()
 
 
 # -------------------------
@@ -20,20 +28,30 @@ class SeniorApp:
         self.senior_id = senior_id
 
         tk.Label(root, text="Senior Dashboard", font=("Arial", 18, "bold")).pack(pady=10)
+        self.status = tk.Label(root, text="", anchor="w")
+        self.status.pack(side="bottom", fill="x")
+        # All database work runs off the Tk thread
+        self.executor = QueryExecutor(root, self.status)
 
         notebook = ttk.Notebook(root)
         self.services_tab = ttk.Frame(notebook)
         self.book_tab = ttk.Frame(notebook)
         self.rating_tab = ttk.Frame(notebook)
         self.bill_tab = ttk.Frame(notebook)
+        self.my_bookings_tab = ttk.Frame(notebook)
         notebook.add(self.services_tab, text="View Services")
         notebook.add(self.book_tab, text="Book Service")
+        notebook.add(self.my_bookings_tab, text="My Bookings")
         notebook.add(self.rating_tab, text="Rate Provider")
         notebook.add(self.bill_tab, text="My Bills")
         notebook.pack(expand=True, fill="both")
 
+        # Bookings, bills, prices and ratings update without a refresh
+        self.feed = ChangeFeed(root, self.executor, backend.changes_since,
+                               self.read_changes, self.apply_changes, self.reload)
         self.setup_services_tab()
         self.setup_book_tab()
+        self.setup_my_bookings_tab()
         self.setup_rating_tab()
         self.setup_bill_tab()
 
@@ -42,29 +60,95 @@ class SeniorApp:
     # -------------------------
     def setup_services_tab(self):
         tk.Label(self.services_tab, text="Available Services", font=("Arial", 14)).pack(pady=5)
-        self.service_tree = ttk.Treeview(self.services_tab, columns=("id", "name", "provider", "rating", "price"), show="headings")
+
+        # Search box + facet filters; results refresh as the senior types
+        search_frame = tk.Frame(self.services_tab)
+        search_frame.pack(pady=5)
+        tk.Label(search_frame, text="Search:").grid(row=0, column=0, padx=3)
+        self.search_entry = tk.Entry(search_frame, width=20)
+        self.search_entry.grid(row=0, column=1, padx=3)
+        tk.Label(search_frame, text="Type:").grid(row=0, column=2, padx=3)
+        self.type_filter = ttk.Combobox(search_frame, values=["Any"] + catalog.SERVICE_TYPES, state="readonly", width=15)
+        self.type_filter.set("Any")
+        self.type_filter.grid(row=0, column=3, padx=3)
+        tk.Label(search_frame, text="Price:").grid(row=1, column=0, padx=3)
+        price_frame = tk.Frame(search_frame)
+        price_frame.grid(row=1, column=1, padx=3)
+        self.min_price = tk.Entry(price_frame, width=8)
+        self.min_price.pack(side="left")
+        tk.Label(price_frame, text="-").pack(side="left")
+        self.max_price = tk.Entry(price_frame, width=8)
+        self.max_price.pack(side="left")
+        tk.Label(search_frame, text="Min Rating:").grid(row=1, column=2, padx=3)
+        self.rating_filter = ttk.Combobox(search_frame, values=["Any", "1", "2", "3", "4", "4.5"], state="readonly", width=15)
+        self.rating_filter.set("Any")
+        self.rating_filter.grid(row=1, column=3, padx=3)
+        # Nearby services by default; "Anywhere" searches the whole region
+        tk.Label(search_frame, text="Within:").grid(row=0, column=4, padx=3)
+        self.radius_filter = ttk.Combobox(search_frame, values=["Anywhere"] + [f"{km} km" for km in matching.RADII_KM],
+                                          state="readonly", width=10)
+        self.radius_filter.set(f"{matching.DEFAULT_RADIUS_KM} km")
+        self.radius_filter.grid(row=0, column=5, padx=3)
+        self.location_note = tk.Label(search_frame, text="", fg="gray")
+        self.location_note.grid(row=1, column=4, columnspan=2, padx=3)
+
+        self.search_job = None
+        for entry in (self.search_entry, self.min_price, self.max_price):
+            entry.bind("<KeyRelease>", lambda event: self.schedule_search())
+        for combo in (self.type_filter, self.rating_filter, self.radius_filter):
+            combo.bind("<<ComboboxSelected>>", lambda event: self.load_services())
+
+        self.service_tree = ttk.Treeview(self.services_tab, columns=("id", "name", "provider", "rating", "price", "km"), show="headings")
         self.service_tree.heading("id", text="Service ID")
         self.service_tree.heading("name", text="Service")
         self.service_tree.heading("provider", text="Provider")
         self.service_tree.heading("rating", text="Rating")
         self.service_tree.heading("price", text="Price ($)")
+        self.service_tree.heading("km", text="Distance (km)")
         self.service_tree.pack(expand=True, fill="both")
+        self.services_view = TreeSync(self.service_tree)
         self.load_services()
 
+    def schedule_search(self):
+        # Wait for a short pause in typing instead of querying on every key
+        if self.search_job:
+            self.root.after_cancel(self.search_job)
+        self.search_job = self.root.after(150, self.load_services)
+
     def load_services(self):
-    # Clear existing data
-        self.service_tree.delete(*self.service_tree.get_children())
-    
-    # Fetch all services with provider names in a single query
-        query = """
-        SELECT s.id, s.service_name, p.name AS provider_name, 
-               s.provider_overall_rating, s.payment_amount
-        FROM services s
-        JOIN providers p ON s.provider_id = p.id
-    """
-    
-        for row in c.execute(query):
-                self.service_tree.insert("", "end", values=row)
+        self.search_job = None
+        try:
+            min_price = float(self.min_price.get()) if self.min_price.get().strip() else None
+            max_price = float(self.max_price.get()) if self.max_price.get().strip() else None
+        except ValueError:
+            return  # half-typed price; wait for a number
+        service_type = self.type_filter.get()
+        min_rating = self.rating_filter.get()
+        radius = self.radius_filter.get()
+
+        self.executor.run(
+            self.find_services, self.search_entry.get(),
+            None if radius == "Anywhere" else float(radius.split()[0]),
+            service_type=None if service_type == "Any" else service_type,
+            min_price=min_price, max_price=max_price,
+            min_rating=None if min_rating == "Any" else float(min_rating),
+            key="services", on_done=self.show_services)
+
+    def find_services(self, text, radius_km, **filters):
+        # Runs on a reader thread. Returns (rows, note): services near the
+        # senior if they chose a radius and have a location on file, otherwise
+        # across the whole region.
+        if radius_km is not None:
+            rows = backend.nearby_services(self.senior_id, radius_km, text, **filters)
+            if rows is not None:
+                return rows, ""
+            return backend.search_services(text, **filters), "No location on file; showing all areas"
+        return backend.search_services(text, **filters), ""
+
+    def show_services(self, result):
+        rows, note = result
+        self.location_note.config(text=note)
+        self.services_view.replace(rows)
 
     # -------------------------
     # Booking Tab
@@ -84,6 +168,23 @@ class SeniorApp:
             setattr(self, attr_name, entry)
 
         tk.Button(self.book_tab, text="Book Now", command=self.book_service).pack(pady=5)
+        tk.Button(self.book_tab, text="Show Next Available Dates", command=self.show_available_dates).pack(pady=5)
+        self.available_label = tk.Label(self.book_tab, text="")
+        self.available_label.pack()
+
+    def show_available_dates(self):
+        sid = self.book_service_id.get()
+        if not sid.isdigit():
+            messagebox.showerror("Error", "Enter a numeric Service ID")
+            return
+        self.executor.run(backend.next_available_dates, int(sid), key="available_dates",
+                          on_done=self.show_available)
+
+    def show_available(self, dates):
+        if not dates:
+            self.available_label.config(text="Available: none, this provider is not taking bookings")
+            return
+        self.available_label.config(text="Available: " + ", ".join(f"{d.day}/{d.month}/{d.year}" for d in dates))
 
     def book_service(self):
         sid = self.book_service_id.get()
@@ -97,29 +198,72 @@ class SeniorApp:
 
         try:
             day, month, year = int(day), int(month), int(year)
-            c.execute("SELECT provider_id, payment_amount FROM services WHERE id=?", (sid,))
-            res = c.fetchone()
-            if not res:
-                messagebox.showerror("Error", "Service not found")
-                return
-
-            provider_id, amount = res
-
-            # Insert booking
-            c.execute("INSERT INTO bookings (senior_id, service_id, day, month, year) VALUES (?,?,?,?,?)",
-                      (self.senior_id, sid, day, month, year))
+        except ValueError:
+            messagebox.showerror("Error", "Day, month, and year must be integers")
+            return
 
-            # Insert bill
-            c.execute("INSERT INTO bills (status, senior_id, provider_id, amount) VALUES (?,?,?,?)",
-                      ("Pending", self.senior_id, provider_id, amount))
+        if not sid.isdigit():
+            messagebox.showerror("Error", "Enter a numeric Service ID")
+            return
 
-            conn.commit()
+        def booked(result):
             messagebox.showinfo("Booked", f"Service booked for {day}/{month}/{year} successfully!")
+            self.feed.poll()
 
-        except ValueError:
-            messagebox.showerror("Error", "Day, month, and year must be integers")
-        except Exception as e:
+        # Booking and its bill are written in one transaction and linked
+        self.executor.run(backend.book_service, self.senior_id, int(sid), day, month, year,
+                          write=True, on_done=booked)
+
+    # -------------------------
+    # My Bookings Tab
+    # -------------------------
+    def setup_my_bookings_tab(self):
+        tk.Label(self.my_bookings_tab, text="My Bookings", font=("Arial", 14)).pack(pady=5)
+
+        # Date range selector: All / Upcoming / Past / Between (From - To)
+        range_frame = tk.Frame(self.my_bookings_tab)
+        range_frame.pack(pady=5)
+        tk.Label(range_frame, text="Show:").grid(row=0, column=0, padx=3)
+        self.booking_view = ttk.Combobox(range_frame, values=bookings.VIEWS, state="readonly", width=10)
+        self.booking_view.set("Upcoming")
+        self.booking_view.grid(row=0, column=1, padx=3)
+        tk.Label(range_frame, text="From (D/M/YYYY):").grid(row=0, column=2, padx=3)
+        self.booking_from = tk.Entry(range_frame, width=12)
+        self.booking_from.grid(row=0, column=3, padx=3)
+        tk.Label(range_frame, text="To:").grid(row=0, column=4, padx=3)
+        self.booking_to = tk.Entry(range_frame, width=12)
+        self.booking_to.grid(row=0, column=5, padx=3)
+        self.booking_view.bind("<<ComboboxSelected>>", lambda event: self.load_bookings())
+
+        self.booking_tree = ttk.Treeview(self.my_bookings_tab, columns=("booking", "service", "provider", "date", "bill_status"), show="headings")
+        for col in ("booking", "service", "provider", "date", "bill_status"):
+            self.booking_tree.heading(col, text=col.capitalize())
+        self.booking_tree.pack(expand=True, fill="both")
+        self.bookings_view = TreeSync(self.booking_tree, display=lambda row: (
+            row[0], row[1], row[2], bookings.format_date(row[3]), row[4]), sort_key=lambda row: (row[3], row[0]))
+        self.booking_range = ("Upcoming", None, None)
+        tk.Button(self.my_bookings_tab, text="Refresh", command=self.load_bookings).pack(pady=5)
+        self.load_bookings()
+
+    def load_bookings(self):
+        view = self.booking_view.get()
+        start = end = None
+        try:
+            if view == "Between":
+                start = bookings.parse_date(self.booking_from.get())
+                end = bookings.parse_date(self.booking_to.get())
+        except ValueError as e:
             messagebox.showerror("Error", str(e))
+            return
+        self.booking_range = (view, start, end)
+        self.executor.run(self.feed.load, backend.senior_bookings, self.senior_id, view, start, end,
+                          key="bookings", on_done=self.show_bookings)
+
+    def show_bookings(self, result):
+        seq, rows = result
+        view, start, end = self.booking_range
+        self.bookings_view.replace(rows, descending=bookings.view_range(view, start, end)[2])
+        self.feed.loaded(seq)
 
     # -------------------------
     # Rating Tab
@@ -141,63 +285,108 @@ class SeniorApp:
         try:
             pid = int(self.provider_id_entry.get())
             rating = int(self.rating_entry.get())
-            if rating < 1 or rating > 5:
-                messagebox.showerror("Error", "Rating must be between 1 and 5")
-                return
-
-            c.execute("INSERT INTO ratings (senior_id, provider_id, rating) VALUES (?,?,?)",
-                      (self.senior_id, pid, rating))
-            conn.commit()
-
-            # Update provider overall rating automatically
-            c.execute("SELECT AVG(rating) FROM ratings WHERE provider_id=?", (pid,))
-            avg = c.fetchone()[0]
-            if avg:
-                c.execute("UPDATE providers SET rating=? WHERE id=?", (avg, pid))
-                c.execute("UPDATE services SET provider_overall_rating=? WHERE provider_id=?", (avg, pid))
-                conn.commit()
-
-            messagebox.showinfo("Success", "Rating submitted and provider rating updated!")
+        except ValueError:
+            messagebox.showerror("Error", "Provider ID and rating must be integers")
+            return
+        if rating < 1 or rating > 5:
+            messagebox.showerror("Error", "Rating must be between 1 and 5")
+            return
 
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        # Provider rating aggregates are updated in the same transaction
+        self.executor.run(backend.submit_rating, self.senior_id, pid, rating, write=True,
+                          on_done=lambda result: messagebox.showinfo(
+                              "Success", "Rating submitted and provider rating updated!"))
 
     # -------------------------
     # Bills Tab
     # -------------------------
     def setup_bill_tab(self):
         tk.Label(self.bill_tab, text="Your Bills", font=("Arial", 14)).pack(pady=5)
+        # Outstanding total from the billing ledger (ledger.py)
+        self.balance_label = tk.Label(self.bill_tab, text="", font=("Arial", 12))
+        self.balance_label.pack()
         self.bill_tree = ttk.Treeview(self.bill_tab, columns=("bill", "provider", "amount", "status"), show="headings")
         for col in ("bill", "provider", "amount", "status"):
             self.bill_tree.heading(col, text=col.capitalize())
         self.bill_tree.pack(expand=True, fill="both")
         tk.Button(self.bill_tab, text="Refresh", command=self.load_bills).pack(pady=5)
-        tk.Button(self.bill_tab, text="Pay Selected Bill", command=self.pay_bill).pack()
+        tk.Button(self.bill_tab, text="Pay Selected Bills", command=self.pay_bill).pack()
+        self.bills_view = TreeSync(self.bill_tree)
+
+        # One line per month of service over the last year, from the rollups
+        tk.Label(self.bill_tab, text="Monthly Statements", font=("Arial", 12)).pack(pady=5)
+        self.statement_tree = ttk.Treeview(self.bill_tab, columns=("month", "pending", "paid", "cancelled", "bills"),
+                                           show="headings", height=6)
+        for col in ("month", "pending", "paid", "cancelled", "bills"):
+            self.statement_tree.heading(col, text=col.capitalize())
+        self.statement_tree.pack(fill="x")
+        self.statements_view = TreeSync(self.statement_tree, display=lambda row: (
+            statements.format_month(row[0]), *(f"{amount:.2f}" for amount in row[1:4]), row[4]))
+        self.load_bills()
 
     def load_bills(self):
-        self.bill_tree.delete(*self.bill_tree.get_children())
+        self.executor.run(self.feed.load, backend.senior_bills, self.senior_id, key="bills", on_done=self.show_bills)
+        self.load_statements()
+        self.load_balance()
+
+    def show_bills(self, result):
+        seq, rows = result
+        self.bills_view.replace(rows)
+        self.feed.loaded(seq)
 
-    # Single query to get provider name along with bill info
-        query = """
-        SELECT b.bill_id, p.name AS provider_name, b.amount, b.status
-        FROM bills b
-        JOIN providers p ON b.provider_id = p.id
-        WHERE b.senior_id = ?
-    """
-    
-        for row in c.execute(query, (self.senior_id,)):
-            self.bill_tree.insert("", "end", values=row)
+    def load_statements(self):
+        self.executor.run(backend.senior_statements, self.senior_id, *statements.recent_months(),
+                          key="statements", on_done=self.statements_view.replace)
 
+    def load_balance(self):
+        self.executor.run(backend.senior_balance, self.senior_id, key="balance", on_done=lambda balance:
+                          self.balance_label.config(text=f"Balance due: ${balance:.2f}"))
 
     def pay_bill(self):
         selected = self.bill_tree.selection()
         if not selected:
             messagebox.showerror("Error", "Select a bill first")
             return
-        bill_id = self.bill_tree.item(selected[0])['values'][0]
-        c.execute("UPDATE bills SET status='Paid' WHERE bill_id=?", (bill_id,))
-        conn.commit()
-        messagebox.showinfo("Paid", "Bill paid successfully!")
+        # Ctrl/Shift-click selects several bills; they are paid together
+        bill_ids = [self.bill_tree.item(item)['values'][0] for item in selected]
+
+        def paid(count):
+            messagebox.showinfo("Paid", "Bill paid successfully!" if count == 1 else f"{count} bills paid successfully!")
+            self.feed.poll()
+
+        self.executor.run(backend.pay_bills, self.senior_id, bill_ids, write=True, on_done=paid)
+
+    # -------------------------
+    # Live Updates
+    # -------------------------
+    def read_changes(self, changes):
+        # Runs on a reader thread: re-read only the rows that changed
+        rows = {}
+        if changes["bookings"] or changes["bills"]:
+            rows["range"] = self.booking_range
+            rows["bookings"] = backend.senior_bookings(self.senior_id, *rows["range"],
+                                                       booking_ids=changes["bookings"], bill_ids=changes["bills"])
+        if changes["bills"]:
+            rows["bills"] = backend.senior_bills(self.senior_id, changes["bills"])
+        return rows
+
+    def apply_changes(self, changes, rows):
+        if "bookings" in rows and rows["range"] == self.booking_range:
+            self.bookings_view.update(rows["bookings"], changes["bookings"])
+        if "bills" in rows:
+            self.bills_view.update(rows["bills"], changes["bills"])
+            self.load_statements()  # a dozen rows, read by key
+            self.load_balance()     # a snapshot and a short tail
+        # The catalog shows prices and ratings; it is the top matches of a
+        # search rather than rows by key, so it is searched again (and diffed)
+        if changes["services"] or changes["ratings"]:
+            self.load_services()
+        if changes["services"]:
+            self.load_bookings()  # service names; edits are rare
+
+    def reload(self):
+        self.load_services()
+        self.load_bookings()
         self.load_bills()
 
 
@@ -217,7 +406,7 @@ def senior_login():
         if not sid.isdigit():
             messagebox.showerror("Error", "Senior ID must be numeric")
             return
-        senior = c.execute("SELECT id FROM seniors WHERE id=?", (sid,)).fetchone()
+        senior = get_read_connection().execute("SELECT id FROM seniors WHERE id=?", (sid,)).fetchone()
         if senior:
             login.destroy()
             SeniorApp(root, int(sid))
@@ -237,5 +426,3 @@ if __name__ == "__main__":
     senior_login()
     root.deiconify()  # Show dashboard only after successful login
     root.mainloop()
-
-
@@ -0,0 +1,133 @@
+import datetime
+import sys
+
+# -------------------------
+# Monthly Statements and Payouts
+# -------------------------
+# Reads the per-month bill totals that migration 11 keeps in
+# senior_monthly_bills and provider_monthly_bills. A month's figures are at
+# most three rows (one per status) found by primary key, so a statement or a
+# year of payouts costs the same however many bills lie behind it.
+#
+# python statements.py [db] --check      compare the rollups with the bills
+# python statements.py [db] --rebuild    recompute them from the bills
+
+STATUSES = ("Pending", "Paid", "Cancelled")
+RECENT_MONTHS = 12
+MIN_MONTH = "0001-01"
+MAX_MONTH = "9999-12"
+
+MONTHLY_TOTALS = """
+    SELECT month, status, bills, amount_cents
+    FROM {owner}_monthly_bills
+    WHERE {owner}_id = ? AND month BETWEEN ? AND ?
+    ORDER BY month DESC
+"""
+
+SENIOR_MONTHLY = MONTHLY_TOTALS.format(owner="senior")
+PROVIDER_MONTHLY = MONTHLY_TOTALS.format(owner="provider")
+
+
+def month_key(day):
+    return f"{day.year:04d}-{day.month:02d}"
+
+
+def parse_month(text):
+    # Accepts M/YYYY as typed in the dashboards, or YYYY-MM
+    text = text.strip()
+    try:
+        if "/" in text:
+            month, year = (int(part) for part in text.split("/"))
+        else:
+            year, month = (int(part) for part in text.split("-"))
+        return month_key(datetime.date(year, month, 1))
+    except ValueError:
+        raise ValueError(f"{text!r} is not a valid month (use M/YYYY)")
+
+
+def format_month(key):
+    year, month = key.split("-")
+    return f"{int(month)}/{year}"
+
+
+def recent_months(months=RECENT_MONTHS, today=None):
+    # (first, last) covering the last `months` months and everything booked ahead
+    today = today or datetime.date.today()
+    index = today.year * 12 + today.month - 1 - (months - 1)
+    return month_key(datetime.date(index // 12, index % 12 + 1, 1)), MAX_MONTH
+
+
+def _by_month(rows):
+    # (month, status, bills, cents) rows -> one (month, pending, paid, cancelled, bills) row per month
+    months = {}
+    for month, status, bills, cents in rows:
+        totals = months.setdefault(month, {"bills": 0})
+        totals[status] = totals.get(status, 0) + cents
+        totals["bills"] += bills
+    return [(month, *(totals.get(status, 0) / 100 for status in STATUSES), totals["bills"])
+            for month, totals in months.items()]
+
+
+def senior_statements(conn, senior_id, first=None, last=None):
+    return _by_month(conn.execute(SENIOR_MONTHLY, (senior_id, first or MIN_MONTH, last or MAX_MONTH)))
+
+
+def provider_payouts(conn, provider_id, first=None, last=None):
+    return _by_month(conn.execute(PROVIDER_MONTHLY, (provider_id, first or MIN_MONTH, last or MAX_MONTH)))
+
+
+def period_totals(rows):
+    # Pending, paid and cancelled totals and the bill count over monthly rows
+    return tuple(round(sum(row[i] for row in rows), 2) for i in range(1, 4)) + (sum(row[4] for row in rows),)
+
+
+# -------------------------
+# Consistency
+# -------------------------
+FROM_BILLS = """
+    SELECT {owner}_id, month, COALESCE(status, 'Pending'), COUNT(*),
+           SUM(CAST(round(COALESCE(amount, 0) * 100) AS INTEGER))
+    FROM bills
+    WHERE {owner}_id IS NOT NULL AND month IS NOT NULL
+    GROUP BY {owner}_id, month, COALESCE(status, 'Pending')
+"""
+
+
+def check_rollups(conn):
+    # Returns {owner: [(key, rollup row, recomputed row)]} where they differ
+    problems = {}
+    for owner in ("senior", "provider"):
+        stored = {row[:3]: row[3:] for row in conn.execute(
+            f"SELECT {owner}_id, month, status, bills, amount_cents FROM {owner}_monthly_bills")}
+        expected = {row[:3]: row[3:] for row in conn.execute(FROM_BILLS.format(owner=owner))}
+        diffs = [(key, stored.get(key), expected.get(key))
+                 for key in stored.keys() | expected.keys() if stored.get(key) != expected.get(key)]
+        if diffs:
+            problems[owner] = sorted(diffs)
+    return problems
+
+
+def rebuild_rollups(conn):
+    # One write queue operation, so readers see the old totals or the new ones
+    for owner in ("senior", "provider"):
+        conn.execute(f"DELETE FROM {owner}_monthly_bills")
+        conn.execute(f"INSERT INTO {owner}_monthly_bills ({owner}_id, month, status, bills, amount_cents) "
+                     + FROM_BILLS.format(owner=owner))
+
+
+if __name__ == "__main__":
+    from database import DB_PATH, get_connection
+    from writer import get_writer
+
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    path = args[0] if args else DB_PATH
+    conn = get_connection(path)
+    if "--rebuild" in sys.argv:
+        get_writer(path).call(rebuild_rollups)
+        print("rollups rebuilt")
+    problems = check_rollups(conn)
+    for owner, diffs in problems.items():
+        print(f"{owner}: {len(diffs)} rollup rows differ from the bills, e.g. {diffs[:3]}")
+    if not problems:
+        print("rollups match the bills")
+    sys.exit(1 if problems else 0)
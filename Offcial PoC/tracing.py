@@ -0,0 +1,272 @@
+import atexit
+import collections
+import datetime
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# -------------------------
+# Query Tracing and Latency Metrics
+# -------------------------
+# Off unless the app is started with ELDERLY_CARE_TRACE=1. When off,
+# database.py opens plain sqlite3 connections and nothing here runs.
+#
+# When on, every connection from database.py is a TracedConnection: each
+# statement is timed from execute to its last fetch, together with the rows
+# it returned and the UI action it ran for ("SeniorApp.load_bills"; the
+# executor names actions after the dashboard method that submitted them).
+# SQLite's trace callback adds the statements it actually ran, with bound
+# values and any triggers fired, to the slow-query log. Statements on the
+# account tables have their text values redacted first, so password hashes
+# and emails from logins and sign-ups never reach the log or its file.
+#
+#   ELDERLY_CARE_SLOW_MS=50          slow-query threshold in ms
+#   ELDERLY_CARE_SLOW_LOG=slow.jsonl also append slow queries to this file
+#   ELDERLY_CARE_TRACE_REPORT=r.json write a report when the app exits
+#
+# Histograms keep cumulative bucket counts plus the last WINDOW samples, from
+# which the percentiles are taken, so they follow recent behaviour.
+
+enabled = os.environ.get("ELDERLY_CARE_TRACE", "") not in ("", "0")
+SLOW_MS = float(os.environ.get("ELDERLY_CARE_SLOW_MS", 50))
+SLOW_LOG_PATH = os.environ.get("ELDERLY_CARE_SLOW_LOG")
+REPORT_PATH = os.environ.get("ELDERLY_CARE_TRACE_REPORT")
+
+WINDOW = 1000
+SLOW_LOG_SIZE = 200
+TRACE_LINES = 20  # statements from the trace callback kept per slow query
+BUCKETS_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+NO_ACTION = "-"
+
+# The tables auth.py logs users in from
+AUTH_TABLES = re.compile(r"\b(seniors|providers|admin)\b", re.IGNORECASE)
+TEXT_VALUE = re.compile(r"'(?:[^']|'')*'")
+
+
+class Histogram:
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.recent = collections.deque(maxlen=WINDOW)
+
+    def add(self, ms, rows=0):
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.rows += rows
+        index = next((i for i, bound in enumerate(BUCKETS_MS) if ms <= bound), len(BUCKETS_MS))
+        self.buckets[index] += 1
+        self.recent.append(ms)
+
+    def snapshot(self):
+        recent = sorted(self.recent)
+
+        def percentile(p):
+            return round(recent[min(len(recent) - 1, int(len(recent) * p))], 3) if recent else 0
+
+        labels = [f"<={bound}ms" for bound in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"]
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0,
+            "p50_ms": percentile(0.5),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(self.max_ms, 3),
+            "rows": self.rows,
+            "buckets": {label: n for label, n in zip(labels, self.buckets) if n},
+        }
+
+
+_lock = threading.Lock()
+_local = threading.local()
+actions = {}     # action name -> Histogram
+statements = {}  # normalized SQL -> Histogram
+slow_queries = collections.deque(maxlen=SLOW_LOG_SIZE)
+
+
+def normalize(sql):
+    return re.sub(r"\s+", " ", sql).strip()[:300]
+
+
+def current_action():
+    return getattr(_local, "action", NO_ACTION)
+
+
+def record_statement(sql, ms, rows, trace):
+    sql = normalize(sql)
+    action = current_action()
+    with _lock:
+        statements.setdefault(sql, Histogram()).add(ms, rows)
+        if ms < SLOW_MS:
+            return
+        entry = {"at": datetime.datetime.now().isoformat(timespec="milliseconds"), "action": action,
+                 "ms": round(ms, 3), "rows": rows, "sql": sql, "trace": trace}
+        slow_queries.append(entry)
+    if SLOW_LOG_PATH:
+        with open(SLOW_LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+
+
+def record_action(name, ms):
+    with _lock:
+        actions.setdefault(name, Histogram()).add(ms)
+
+
+def traced_call(action, fn, /, *args, **kwargs):
+    # Runs fn as the named action: its statements are attributed to it and
+    # its total time goes into the action's histogram.
+    previous = current_action()
+    _local.action = action
+    started = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        record_action(action, (time.perf_counter() - started) * 1000)
+        _local.action = previous
+
+
+def redact(statement):
+    if AUTH_TABLES.search(statement):
+        return TEXT_VALUE.sub("'?'", statement)
+    return statement
+
+
+def on_trace(statement):
+    # sqlite3 trace callback: what SQLite actually ran, triggers included
+    lines = getattr(_local, "trace", None)
+    if lines is not None and len(lines) < TRACE_LINES:
+        lines.append(redact(statement))
+
+
+# -------------------------
+# Traced Connections
+# -------------------------
+class TracedCursor(sqlite3.Cursor):
+    # One statement is timed from execute until it is read to the end, the
+    # cursor runs another statement, or the cursor is closed or dropped.
+    _sql = None
+
+    def _start(self, sql):
+        self._finish()
+        self._sql, self._ms, self._rows = sql, 0.0, 0
+        _local.trace = []
+
+    def _finish(self):
+        if self._sql is not None:
+            sql, self._sql = self._sql, None
+            record_statement(sql, self._ms, self._rows, getattr(_local, "trace", None) or [])
+            _local.trace = None
+
+    def _timed(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            if self._sql is not None:
+                self._ms += (time.perf_counter() - started) * 1000
+
+    def execute(self, sql, parameters=()):
+        self._start(sql)
+        self._timed(super().execute, sql, parameters)
+        if self.description is None:
+            self._finish()  # no rows to read
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._start(sql)
+        self._timed(super().executemany, sql, seq_of_parameters)
+        self._finish()
+        return self
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is None:
+            self._finish()
+        elif self._sql is not None:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(super().fetchmany, self.arraysize if size is None else size)
+        if self._sql is not None:
+            self._rows += len(rows)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        if self._sql is not None:
+            self._rows += len(rows)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        try:
+            row = self._timed(super().__next__)
+        except StopIteration:
+            self._finish()
+            raise
+        if self._sql is not None:
+            self._rows += 1
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        self._finish()
+
+
+class TracedConnection(sqlite3.Connection):
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        started = time.perf_counter()
+        super().commit()
+        record_statement("COMMIT", (time.perf_counter() - started) * 1000, 0, [])
+
+
+# -------------------------
+# Reports
+# -------------------------
+def snapshot():
+    with _lock:
+        return {
+            "enabled": enabled,
+            "slow_ms": SLOW_MS,
+            "actions": {name: h.snapshot() for name, h in actions.items()},
+            "statements": {sql: h.snapshot() for sql, h in statements.items()},
+            "slow_queries": list(slow_queries),
+        }
+
+
+def dump(path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(snapshot(), f, indent=2)
+
+
+def reset():
+    with _lock:
+        actions.clear()
+        statements.clear()
+        slow_queries.clear()
+
+
+if enabled and REPORT_PATH:
+    atexit.register(dump, REPORT_PATH)
@@ -0,0 +1,204 @@
+import collections
+import concurrent.futures
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+
+import tracing
+from database import DB_PATH, get_connection
+
+# -------------------------
+# Write Queue
+# -------------------------
+# Every insert, update and delete in the apps and the API goes through here.
+# Callers hand an operation fn(conn, *args) to the process's one writer
+# thread and get back a Future with its result or its exception. The writer
+# runs the operations it has queued up as one batch:
+#
+#   BEGIN IMMEDIATE                    take the write lock once for the batch
+#   SAVEPOINT op ... RELEASE op        each operation, in the order submitted;
+#   SAVEPOINT op ... ROLLBACK TO op    one that raises is undone on its own
+#   COMMIT                             one commit for all of them
+#
+# so a failed operation only fails its own caller, and concurrent writers
+# share a lock acquisition and a commit instead of queueing for them one by
+# one. An operation must not commit, roll back or BEGIN itself.
+#
+# A lone write on an idle queue commits straight away. Once writes overlap,
+# the writer holds each batch open so that more can join it, up to MAX_BATCH
+# operations: for as long as the last commit took, but never more than
+# GROUP_COMMIT_MS. Waiting longer than a commit costs would lose more than it
+# saves, so with cheap commits (WAL with synchronous=NORMAL does not fsync on
+# commit) the window stays short, and it opens up when commits get slow.
+#
+# Another process (a second app, bulk_import.py) may hold the write lock. The
+# writer connection gives up waiting for it after WRITER_BUSY_TIMEOUT_MS, and
+# the whole batch is retried up to BUSY_RETRIES times with a doubling, jittered
+# backoff before its callers are given the "database is locked" error.
+
+GROUP_COMMIT_MS = 2
+MAX_BATCH = 64
+BUSY_RETRIES = 5
+BUSY_BACKOFF_MS = 20
+WRITER_BUSY_TIMEOUT_MS = 1000
+
+Request = collections.namedtuple("Request", "future action fn args kwargs")
+
+
+def is_busy(error):
+    return (isinstance(error, sqlite3.OperationalError)
+            and getattr(error, "sqlite_errorcode", 0) & 0xFF in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED))
+
+
+class WriteQueue:
+    def __init__(self, path=DB_PATH, window_ms=GROUP_COMMIT_MS, max_batch=MAX_BATCH):
+        self.path = path
+        self.window = window_ms / 1000
+        self.commit_seconds = 0.0  # how long the last COMMIT took
+        self.max_batch = max_batch
+        self.requests = queue.Queue()
+        self.conn = None
+        self.lock = threading.Lock()
+        self.counts = {"writes": 0, "failed": 0, "batches": 0, "largest_batch": 0, "busy_retries": 0}
+        self.thread = threading.Thread(target=self.run, name="db-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, fn, *args, **kwargs):
+        # Queues fn(conn, *args, **kwargs) and returns its Future
+        future = concurrent.futures.Future()
+        self.requests.put(Request(future, tracing.current_action(), fn, args, kwargs))
+        return future
+
+    def call(self, fn, *args, **kwargs):
+        # Submits and waits for the result (or raises the operation's error)
+        if threading.current_thread() is self.thread:
+            # Already inside the writer's transaction
+            return fn(self.conn, *args, **kwargs)
+        return self.submit(fn, *args, **kwargs).result()
+
+    def close(self):
+        # Lets the queued writes finish, then stops the writer thread
+        self.requests.put(None)
+        self.thread.join()
+
+    # -------------------------
+    # Writer Thread
+    # -------------------------
+    def run(self):
+        self.conn = get_connection(self.path)
+        self.conn.execute(f"PRAGMA busy_timeout = {WRITER_BUSY_TIMEOUT_MS}")
+        overlapping = False
+        while True:
+            batch, stopping = self.collect(overlapping)
+            batch = [request for request in batch if request.future.set_running_or_notify_cancel()]
+            if batch:
+                self.commit(batch)
+            overlapping = len(batch) > 1
+            if stopping:
+                return
+
+    def collect(self, wait):
+        # The first request blocks; the rest are whatever arrives in the window
+        first = self.requests.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = time.perf_counter() + min(self.window, self.commit_seconds)
+        while len(batch) < self.max_batch:
+            try:
+                request = self.requests.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.perf_counter()
+                if not (wait or len(batch) > 1) or remaining <= 0:
+                    break
+                try:
+                    request = self.requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if request is None:
+                return batch, True
+            batch.append(request)
+        return batch, False
+
+    def commit(self, batch):
+        for attempt in range(BUSY_RETRIES + 1):
+            try:
+                outcomes = self.transaction(batch)
+                break
+            except Exception as e:
+                if not is_busy(e) or attempt == BUSY_RETRIES:
+                    outcomes = [(None, e)] * len(batch)
+                    break
+                with self.lock:
+                    self.counts["busy_retries"] += 1
+                delay = BUSY_BACKOFF_MS * 2 ** attempt
+                time.sleep(random.uniform(delay / 2, delay) / 1000)
+
+        with self.lock:
+            self.counts["batches"] += 1
+            self.counts["largest_batch"] = max(self.counts["largest_batch"], len(batch))
+            self.counts["writes"] += len(batch)
+            self.counts["failed"] += sum(error is not None for _, error in outcomes)
+        for request, (result, error) in zip(batch, outcomes):
+            if error is not None:
+                request.future.set_exception(error)
+            else:
+                request.future.set_result(result)
+
+    def transaction(self, batch):
+        # Returns [(result, error)] in batch order. Raises, with nothing
+        # committed, if the batch as a whole failed (busy, disk full).
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            outcomes = []
+            for request in batch:
+                conn.execute("SAVEPOINT op")
+                try:
+                    if tracing.enabled:
+                        result = tracing.traced_call(request.action, request.fn, conn,
+                                                     *request.args, **request.kwargs)
+                    else:
+                        result = request.fn(conn, *request.args, **request.kwargs)
+                except Exception as e:
+                    if is_busy(e) or not conn.in_transaction:
+                        raise
+                    conn.execute("ROLLBACK TO op")
+                    conn.execute("RELEASE op")
+                    outcomes.append((None, e))
+                else:
+                    conn.execute("RELEASE op")
+                    outcomes.append((result, None))
+            started = time.perf_counter()
+            conn.commit()
+            self.commit_seconds = time.perf_counter() - started
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        return outcomes
+
+    def stats(self):
+        with self.lock:
+            batches = self.counts["batches"]
+            return {
+                **self.counts,
+                "queued": self.requests.qsize(),
+                "writes_per_batch": round(self.counts["writes"] / batches, 2) if batches else 0,
+            }
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(path=DB_PATH):
+    # One writer per database file and process
+    key = (os.getpid(), path)
+    with _writers_lock:
+        if key not in _writers:
+            _writers[key] = WriteQueue(path)
+        return _writers[key]